@@ -0,0 +1,128 @@
+"""Event-loop lag during knowledge lookups, blocking vs async connector.
+
+Starts a fake `/api/knowledge/` server (fixed latency) in a background
+thread, then runs the same burst of lookups twice while a probe coroutine
+measures how late the loop wakes it up:
+
+* ``blocking``: the previous implementation, `requests.get` called from a
+  coroutine
+* ``async``: `DjangoKnowledgeConnector.fetch_knowledge`
+
+Usage::
+
+    python benchmarks/bench_event_loop_lag.py --lookups 20 --latency 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+import requests
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connector import DjangoKnowledgeConnector
+
+PROBE_INTERVAL = 0.005
+
+
+def start_fake_server(latency: float) -> tuple[str, threading.Event]:
+    ready = threading.Event()
+    stop = threading.Event()
+    address: dict[str, str] = {}
+
+    async def knowledge(request: web.Request) -> web.Response:
+        await asyncio.sleep(latency)
+        return web.json_response(
+            {"summary": f"about {request.query.get('q', '')}", "data": {}}
+        )
+
+    async def serve() -> None:
+        app = web.Application()
+        app.router.add_get("/api/knowledge/", knowledge)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        address["url"] = f"http://127.0.0.1:{port}"
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        await runner.cleanup()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    return address["url"], stop
+
+
+async def probe(lags: list[float], done: asyncio.Event) -> None:
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def blocking_lookups(url: str, lookups: int) -> None:
+    session = requests.Session()
+    for i in range(lookups):
+        session.get(f"{url}/api/knowledge/", params={"q": f"query {i}"}).json()
+        await asyncio.sleep(0)
+
+
+async def async_lookups(url: str, lookups: int) -> None:
+    connector = DjangoKnowledgeConnector(url, timeout=5.0)
+    try:
+        await asyncio.gather(
+            *(connector.fetch_knowledge(f"query {i}") for i in range(lookups))
+        )
+    finally:
+        await connector.aclose()
+
+
+async def measure(workload) -> tuple[float, list[float]]:
+    lags: list[float] = []
+    done = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, done))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    start = time.perf_counter()
+    await workload
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    return elapsed, lags
+
+
+def report(name: str, elapsed: float, lags: list[float]) -> None:
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(
+        f"{name:<9} wall={elapsed * 1000:8.1f}ms  probes={len(lags_ms):5d}  "
+        f"lag mean={statistics.mean(lags_ms):7.2f}ms  "
+        f"p99={p99:7.2f}ms  max={lags_ms[-1]:7.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.15)
+    args = parser.parse_args()
+
+    url, stop = start_fake_server(args.latency)
+    try:
+        report("blocking", *asyncio.run(measure(blocking_lookups(url, args.lookups))))
+        report("async", *asyncio.run(measure(async_lookups(url, args.lookups))))
+    finally:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
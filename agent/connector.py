@@ -1,39 +1,219 @@
-import requests
-from django.core.cache import cache  # If using Django's cache
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any
+
+import aiohttp
+
+logger = logging.getLogger("knowledge-connector")
+
+DEFAULT_DJANGO_URL = "http://127.0.0.1:8000"
+
+
+class DjangoAPIError(Exception):
+    """Raised when a request to the Django API cannot be completed"""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class KnowledgeLookupError(DjangoAPIError):
+    """Raised when a knowledge lookup cannot be completed"""
+
+
+class TranscriptSaveError(DjangoAPIError):
+    """Raised when transcripts cannot be saved"""
+
+
+class KnowledgeLookupTimeout(KnowledgeLookupError):
+    """Raised when a lookup misses its deadline"""
+
+
+class KnowledgeLookupCancelled(KnowledgeLookupError):
+    """Raised when a lookup is dropped because the user barged in"""
+
 
 class DjangoKnowledgeConnector:
-    def fetch_knowledge(self, query: str) -> dict:
+    """Async client for the Django `/api/knowledge/` endpoint.
+
+    All lookups share one keep-alive connection pool, are capped to
+    `max_concurrency` requests in flight and must finish within `timeout`
+    seconds (time spent waiting for a free slot counts against the deadline).
+    `cancel_pending` drops every in-flight lookup, e.g. when the user starts
+    talking over the agent.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        token: str | None = None,
+        *,
+        timeout: float = 2.0,
+        max_concurrency: int = 4,
+        max_connections: int = 8,
+        keepalive_timeout: float = 30.0,
+        http_session: aiohttp.ClientSession | None = None,
+    ):
+        self._base_url = (
+            base_url or os.getenv("DJANGO_API_URL") or DEFAULT_DJANGO_URL
+        ).rstrip("/")
+        self._token = token or os.getenv("DJANGO_API_TOKEN", "")
+        self._timeout = timeout
+        self._max_connections = max_connections
+        self._keepalive_timeout = keepalive_timeout
+        self._session = http_session
+        self._owns_session = http_session is None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: set[asyncio.Task[dict]] = set()
+        self._interrupted: set[asyncio.Task[dict]] = set()
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_connections,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            headers = {}
+            if self._token:
+                headers["Authorization"] = f"Token {self._token}"
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers)
+            self._owns_session = True
+        return self._session
+
+    async def fetch_knowledge(
+        self,
+        query: str,
+        *,
+        session_id: str = "",
+        timeout: float | None = None,
+    ) -> dict:
         """Fetch domain-specific knowledge from Django"""
-        response = requests.get(
-            f"http://127.0.0.1:8000/api/auth/user",
-            params={"q": query},
-            headers={"Authorization": "Bearer YOUR_DJANGO_TOKEN"}
+        deadline = self._timeout if timeout is None else timeout
+        task = asyncio.ensure_future(
+            asyncio.wait_for(self._request(query, session_id), deadline)
         )
-        print(response)
-        return response.json()
+        self._pending.add(task)
+        try:
+            return await task
+        except asyncio.TimeoutError as e:
+            raise KnowledgeLookupTimeout(
+                f"knowledge lookup exceeded {deadline:.2f}s"
+            ) from e
+        except asyncio.CancelledError:
+            if task in self._interrupted:
+                raise KnowledgeLookupCancelled("knowledge lookup cancelled") from None
+            raise
+        finally:
+            self._pending.discard(task)
+            self._interrupted.discard(task)
+
+    async def _request(self, query: str, session_id: str) -> dict:
+        async with self._semaphore:
+            session = self._ensure_session()
+            params = {"q": query}
+            if session_id:
+                params["session_id"] = session_id
+            try:
+                async with session.get(
+                    f"{self._base_url}/api/knowledge/", params=params
+                ) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            except aiohttp.ClientError as e:
+                raise KnowledgeLookupError(f"knowledge lookup failed: {e}") from e
+
+    async def save_transcripts(
+        self, items: list[dict], *, timeout: float = 5.0
+    ) -> dict:
+        """Persist interactions through `/api/save-transcriptions/bulk/`.
+
+        Writes share the connection pool but not the lookup concurrency cap,
+        and are not affected by `cancel_pending`.
+        """
+        session = self._ensure_session()
+        try:
+            async with session.post(
+                f"{self._base_url}/api/save-transcriptions/bulk/",
+                json=items,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+        except asyncio.TimeoutError as e:
+            raise TranscriptSaveError(
+                f"saving transcripts exceeded {timeout:.2f}s"
+            ) from e
+        except aiohttp.ClientResponseError as e:
+            raise TranscriptSaveError(
+                f"saving transcripts failed: {e}", status=e.status
+            ) from e
+        except aiohttp.ClientError as e:
+            raise TranscriptSaveError(f"saving transcripts failed: {e}") from e
+
+    def cancel_pending(self) -> int:
+        """Cancel every in-flight lookup, returns how many were cancelled"""
+        cancelled = 0
+        for task in list(self._pending):
+            if not task.done():
+                self._interrupted.add(task)
+                task.cancel()
+                cancelled += 1
+        if cancelled:
+            logger.debug(f"cancelled {cancelled} in-flight knowledge lookups")
+        return cancelled
+
+    async def aclose(self) -> None:
+        self.cancel_pending()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
 
 class EnhancedMultimodalAgent:
     def __init__(self, django_connector: DjangoKnowledgeConnector):
-        self.django = django_connector
+        self.django_connector = django_connector
         # Rest of your existing LiveKit initialization
-    
+
     async def process_query(self, text: str) -> str:
         """Enhanced processing with Django knowledge"""
-        # 1. Get domain context from Django
-        knowledge = self.django.fetch_knowledge(text)
-        
+        # 1. Get domain context from Django without blocking the event loop
+        try:
+            knowledge: dict[str, Any] = await self.django_connector.fetch_knowledge(
+                text
+            )
+        except KnowledgeLookupError as e:
+            logger.warning(f"continuing without domain knowledge: {e}")
+            knowledge = {"summary": "", "data": {}}
+
         # 2. Augment the prompt
         augmented_prompt = f"""
-        Domain knowledge: {knowledge['summary']}
-        Relevant data: {knowledge['data']}
+        Domain knowledge: {knowledge.get("summary", "")}
+        Relevant data: {knowledge.get("data", {})}
         Original query: {text}
         """
-        
+
         # 3. Process with OpenAI as before
         return await self._call_openai(augmented_prompt)
 
+
 if __name__ == "__main__":
     # Example usage
-    response = DjangoKnowledgeConnector()
-    
-    print(response)
+    async def _main():
+        connector = DjangoKnowledgeConnector()
+        try:
+            print(await connector.fetch_knowledge("photosynthesis"))
+        finally:
+            await connector.aclose()
+
+    asyncio.run(_main())
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from connector import DjangoKnowledgeConnector
+
+logger = logging.getLogger("knowledge-cache")
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_FILLER_WORDS = frozenset({"um", "uh", "erm", "hmm", "like", "please", "so", "well"})
+
+CacheKey = tuple[str, str]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and filler words, collapse whitespace"""
+    words = _PUNCTUATION_RE.sub(" ", query.lower()).split()
+    return " ".join(w for w in words if w not in _FILLER_WORDS)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    size: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "hit_ratio": round(self.hit_ratio, 3)}
+
+
+class KnowledgeCache:
+    """Bounded TTL+LRU cache in front of `DjangoKnowledgeConnector`.
+
+    Entries are keyed by user and normalized query. Concurrent misses for the
+    same key share a single in-flight request (single-flight); failed
+    lookups are never cached.
+    """
+
+    def __init__(
+        self,
+        connector: DjangoKnowledgeConnector,
+        *,
+        maxsize: int = 256,
+        ttl: float = 300.0,
+    ):
+        self._connector = connector
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[CacheKey, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[CacheKey, asyncio.Future[dict]] = {}
+        self._stats = CacheStats()
+
+    @property
+    def connector(self) -> DjangoKnowledgeConnector:
+        return self._connector
+
+    @property
+    def stats(self) -> CacheStats:
+        self._stats.size = len(self._entries)
+        return self._stats
+
+    def _get(self, key: CacheKey) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put(self, key: CacheKey, value: dict) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    async def fetch_knowledge(
+        self,
+        query: str,
+        *,
+        user: str = "",
+        session_id: str = "",
+        timeout: float | None = None,
+    ) -> dict:
+        """Same contract as `DjangoKnowledgeConnector.fetch_knowledge`"""
+        key = (user, normalize_query(query))
+
+        cached = self._get(key)
+        if cached is not None:
+            self._stats.hits += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self._stats.misses += 1
+        task = asyncio.ensure_future(
+            self._connector.fetch_knowledge(
+                query, session_id=session_id, timeout=timeout
+            )
+        )
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._on_fetched(key, t))
+        return await asyncio.shield(task)
+
+    def _on_fetched(self, key: CacheKey, task: asyncio.Future[dict]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self._put(key, task.result())
+
+    def invalidate(self, user: str | None = None) -> None:
+        """Drop every entry, or only the entries of `user`"""
+        if user is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == user]:
+            del self._entries[key]
@@ -23,9 +23,14 @@ from livekit.agents.voice_assistant import VoiceAssistant
 
 from dotenv import load_dotenv
 from connector import DjangoKnowledgeConnector, EnhancedMultimodalAgent
+from knowledge_cache import KnowledgeCache
+from prefetch import KnowledgePrefetcher
+from transcript_writer import TranscriptWriter
 import os
 load_dotenv('.env.local')
 openai_api_key = os.getenv("OPENAI_API_KEY")
+# start knowledge lookups from interim (Deepgram) transcripts while the user speaks
+knowledge_prefetch = os.getenv("KNOWLEDGE_PREFETCH", "0") == "1"
 
 
 logger = logging.getLogger("Bright Hikari-worker")
@@ -94,12 +99,32 @@ async def entrypoint(ctx: JobContext):
 
     participant = await ctx.wait_for_participant()
 
-    run_multimodal_agent(ctx, participant)
+    connector = DjangoKnowledgeConnector()
+    knowledge = KnowledgeCache(connector)
+    transcripts = TranscriptWriter(
+        connector, username=participant.identity, session_id=ctx.room.name
+    )
+    transcripts.start()
+
+    async def close_django_clients():
+        logger.info(f"knowledge cache stats: {knowledge.stats.to_dict()}")
+        # final flush first, it still needs the connection pool
+        await transcripts.aclose()
+        await connector.aclose()
+
+    ctx.add_shutdown_callback(close_django_clients)
+
+    run_multimodal_agent(ctx, participant, knowledge, transcripts)
 
     logger.info("agent started")
 
 
-def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
+def run_multimodal_agent(
+    ctx: JobContext,
+    participant: rtc.Participant,
+    knowledge: KnowledgeCache,
+    transcripts: TranscriptWriter,
+):
     metadata = json.loads(participant.metadata)
     config = parse_session_config(metadata)
 
@@ -121,6 +146,16 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
     assistant.start(ctx.room)
     session = model.sessions[0]
 
+    # persist transcripts from the agent side, write-behind so turns never wait
+    @assistant.on("user_speech_committed")
+    def on_user_speech_committed(msg: llm.ChatMessage):
+        transcripts.add("user", _message_text(msg))
+
+    @assistant.on("agent_speech_committed")
+    @assistant.on("agent_speech_interrupted")
+    def on_agent_speech_committed(msg: llm.ChatMessage):
+        transcripts.add("assistant", _message_text(msg))
+
     if config.modalities == ["text", "audio"]:
         session.conversation.item.create(
             llm.ChatMessage(
@@ -130,6 +165,10 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
         )
         session.response.create()
 
+    prefetcher = KnowledgePrefetcher(knowledge, user=participant.identity)
+    if knowledge_prefetch:
+        start_interim_transcription(ctx, participant, prefetcher)
+
     @ctx.room.local_participant.register_rpc_method("pg.updateConfig")
     async def update_config(
         data: rtc.rpc.RpcInvocationData,
@@ -234,12 +273,41 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
             ),
         )
 
+    def add_knowledge_context(result: dict | None) -> bool:
+        summary = (result or {}).get("summary")
+        if not summary:
+            return False
+        session.conversation.item.create(
+            llm.ChatMessage(
+                role="system",
+                content=f"Relevant domain knowledge for the user's question:\n{summary}",
+            )
+        )
+        return True
+
+    async def resolve_knowledge(transcript: str):
+        # the model is usually answering by now: only wait for a lookup the
+        # prefetch already started, it is context for the follow-up
+        add_knowledge_context(await prefetcher.take(transcript, lookup=False))
+
     last_transcript_id = None
+    knowledge_added = False
+    # from the first input_speech_started of a turn until its transcript arrives
+    turn_open = False
 
     # send three dots when the user starts talking. will be cleared later when a real transcription is sent.
     @session.on("input_speech_started")
     def on_input_speech_started():
-        nonlocal last_transcript_id
+        nonlocal last_transcript_id, knowledge_added, turn_open
+        # a restart within the turn (VAD retriggered mid-utterance) keeps the
+        # prefetch in flight, the user is still asking the same question
+        if not turn_open:
+            # the user barged in, any lookup made for the previous turn is stale
+            knowledge.connector.cancel_pending()
+            prefetcher.reset()
+            knowledge_added = False
+            turn_open = True
+
         remote_participant = next(iter(ctx.room.remote_participants.values()), None)
         if not remote_participant:
             return
@@ -267,11 +335,24 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
             )
         )
 
+    # hand whatever was prefetched to the model before it starts responding
+    @session.on("input_speech_stopped")
+    def on_input_speech_stopped():
+        nonlocal knowledge_added
+        if not knowledge_added:
+            knowledge_added = add_knowledge_context(prefetcher.ready())
+
     @session.on("input_speech_transcription_completed")
     def on_input_speech_transcription_completed(
         event: openai.realtime.InputTranscriptionCompleted,
     ):
-        nonlocal last_transcript_id
+        nonlocal last_transcript_id, turn_open
+        turn_open = False
+        if knowledge_prefetch and not knowledge_added:
+            asyncio.create_task(resolve_knowledge(event.transcript))
+        else:
+            prefetcher.reset()
+
         if last_transcript_id:
             remote_participant = next(iter(ctx.room.remote_participants.values()), None)
             if not remote_participant:
@@ -296,7 +377,9 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
     def on_input_speech_transcription_failed(
         event: openai.realtime.InputTranscriptionFailed,
     ):
-        nonlocal last_transcript_id
+        nonlocal last_transcript_id, turn_open
+        turn_open = False
+        prefetcher.reset()
         if last_transcript_id:
             remote_participant = next(iter(ctx.room.remote_participants.values()), None)
             if not remote_participant:
@@ -324,5 +407,68 @@ def run_multimodal_agent(ctx: JobContext, participant: rtc.Participant):
             last_transcript_id = None
 
 
+def _message_text(msg: llm.ChatMessage) -> str:
+    if isinstance(msg.content, str):
+        return msg.content
+    return " ".join(part for part in msg.content or [] if isinstance(part, str))
+
+
+def start_interim_transcription(
+    ctx: JobContext,
+    participant: rtc.Participant,
+    prefetcher: KnowledgePrefetcher,
+):
+    """Run Deepgram on the participant's mic and feed interim transcripts"""
+    from livekit.agents import stt
+    from livekit.plugins import deepgram
+
+    async def transcribe(track: rtc.Track):
+        stt_stream = deepgram.STT(interim_results=True).stream()
+        audio_stream = rtc.AudioStream(track, sample_rate=16000, num_channels=1)
+
+        async def forward_audio():
+            async for event in audio_stream:
+                stt_stream.push_frame(event.frame)
+            stt_stream.end_input()
+
+        forward_task = asyncio.create_task(forward_audio())
+        utterance: list[str] = []
+        try:
+            async for event in stt_stream:
+                if not event.alternatives:
+                    continue
+                text = event.alternatives[0].text
+                if event.type == stt.SpeechEventType.INTERIM_TRANSCRIPT:
+                    prefetcher.on_interim(" ".join([*utterance, text]))
+                elif event.type == stt.SpeechEventType.FINAL_TRANSCRIPT:
+                    utterance.append(text)
+                    prefetcher.on_interim(" ".join(utterance))
+                if event.type == stt.SpeechEventType.END_OF_SPEECH:
+                    utterance.clear()
+        finally:
+            forward_task.cancel()
+            await audio_stream.aclose()
+            await stt_stream.aclose()
+
+    def maybe_transcribe(track: rtc.Track, remote_participant: rtc.Participant):
+        if (
+            remote_participant.identity == participant.identity
+            and track.kind == rtc.TrackKind.KIND_AUDIO
+        ):
+            asyncio.create_task(transcribe(track))
+
+    @ctx.room.on("track_subscribed")
+    def on_track_subscribed(
+        track: rtc.Track,
+        publication: rtc.RemoteTrackPublication,
+        remote_participant: rtc.RemoteParticipant,
+    ):
+        maybe_transcribe(track, remote_participant)
+
+    for publication in participant.track_publications.values():
+        if publication.track is not None:
+            maybe_transcribe(publication.track, participant)
+
+
 if __name__ == "__main__":
     cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, worker_type=WorkerType.ROOM))
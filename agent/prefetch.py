@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from connector import KnowledgeLookupError
+from knowledge_cache import KnowledgeCache, normalize_query
+
+logger = logging.getLogger("knowledge-prefetch")
+
+
+@dataclass
+class _Candidate:
+    query: str
+    words: list[str]
+    task: asyncio.Task[dict | None]
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class KnowledgePrefetcher:
+    """Starts knowledge lookups from interim transcripts.
+
+    While the user is still speaking, `on_interim` starts a lookup for the
+    transcript so far (throttled to one every `min_interval` seconds). A
+    candidate stays alive only while later transcripts extend it; anything
+    else is cancelled. When the turn ends, `ready` returns what has already
+    arrived for the latest transcript and `take` resolves the final
+    transcript, reusing a relevant candidate or falling back to a lookup.
+
+    Lookups go through `KnowledgeCache`, so a dropped candidate still warms
+    the cache for the final query.
+    """
+
+    def __init__(
+        self,
+        knowledge: KnowledgeCache,
+        *,
+        user: str = "",
+        session_id: str = "",
+        min_words: int = 3,
+        min_interval: float = 0.4,
+        min_coverage: float = 0.6,
+        max_candidates: int = 3,
+    ):
+        self._knowledge = knowledge
+        self._user = user
+        self._session_id = session_id
+        self._min_words = min_words
+        self._min_interval = min_interval
+        self._min_coverage = min_coverage
+        self._max_candidates = max_candidates
+        self._candidates: list[_Candidate] = []
+        self._latest: list[str] = []
+        self._trailing: asyncio.TimerHandle | None = None
+        self._last_started = 0.0
+
+    @property
+    def candidates(self) -> list[str]:
+        return [c.query for c in self._candidates]
+
+    def on_interim(self, text: str) -> None:
+        """Feed the transcript of the current utterance so far"""
+        words = normalize_query(text).split()
+        if words == self._latest:
+            return
+        self._latest = words
+
+        # candidates the user has talked past are no longer relevant
+        for candidate in list(self._candidates):
+            if not _is_prefix(candidate.words, words):
+                self._drop(candidate)
+
+        if len(words) < self._min_words:
+            return
+        if any(c.words == words for c in self._candidates):
+            return
+
+        wait = self._last_started + self._min_interval - time.monotonic()
+        if wait <= 0:
+            self._start(words)
+        elif self._trailing is None:
+            self._trailing = asyncio.get_running_loop().call_later(
+                wait, self._start_latest
+            )
+
+    def _start_latest(self) -> None:
+        self._trailing = None
+        if len(self._latest) >= self._min_words and not any(
+            c.words == self._latest for c in self._candidates
+        ):
+            self._start(self._latest)
+
+    def _start(self, words: list[str]) -> None:
+        query = " ".join(words)
+        task = asyncio.create_task(self._lookup(query))
+        self._candidates.append(_Candidate(query=query, words=list(words), task=task))
+        self._last_started = time.monotonic()
+        while len(self._candidates) > self._max_candidates:
+            self._drop(self._candidates[0])
+        logger.debug(f"prefetching knowledge for '{query}'")
+
+    async def _lookup(self, query: str) -> dict | None:
+        try:
+            return await self._knowledge.fetch_knowledge(
+                query, user=self._user, session_id=self._session_id
+            )
+        except KnowledgeLookupError as e:
+            logger.debug(f"prefetch for '{query}' failed: {e}")
+            return None
+
+    def _drop(self, candidate: _Candidate) -> None:
+        self._candidates.remove(candidate)
+        if not candidate.task.done():
+            candidate.task.cancel()
+
+    def _best(self, words: list[str]) -> _Candidate | None:
+        relevant = [
+            c
+            for c in self._candidates
+            if _is_prefix(c.words, words)
+            and len(c.words) >= self._min_coverage * len(words)
+        ]
+        return max(relevant, key=lambda c: len(c.words), default=None)
+
+    def ready(self) -> dict | None:
+        """Result already available for the latest interim transcript"""
+        done = [
+            c
+            for c in self._candidates
+            if c.task.done() and not c.task.cancelled() and c.task.result()
+        ]
+        relevant = [
+            c
+            for c in done
+            if _is_prefix(c.words, self._latest)
+            and len(c.words) >= self._min_coverage * len(self._latest)
+        ]
+        best = max(relevant, key=lambda c: len(c.words), default=None)
+        return best.task.result() if best else None
+
+    async def take(
+        self, final_text: str, *, timeout: float | None = None, lookup: bool = True
+    ) -> dict | None:
+        """Resolve knowledge for the final transcript and end the turn
+
+        Without `lookup`, only a relevant candidate is waited for; no new
+        lookup is started when there is none.
+        """
+        words = normalize_query(final_text).split()
+        best = self._best(words)
+        self.reset(keep=best)
+        if best is None:
+            if not lookup or len(words) < self._min_words:
+                return None
+            return await self._lookup(" ".join(words))
+
+        logger.debug(
+            f"reusing prefetch '{best.query}' started "
+            f"{time.monotonic() - best.started_at:.2f}s ago"
+        )
+        try:
+            return await asyncio.wait_for(best.task, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._candidates.clear()
+
+    def reset(self, keep: _Candidate | None = None) -> None:
+        """Cancel every outstanding candidate (except `keep`)"""
+        if self._trailing is not None:
+            self._trailing.cancel()
+            self._trailing = None
+        for candidate in list(self._candidates):
+            if candidate is not keep:
+                self._drop(candidate)
+        self._latest = []
+
+
+def _is_prefix(prefix: list[str], words: list[str]) -> bool:
+    """Word-level prefix check; the last word may still be growing"""
+    if not prefix or len(prefix) > len(words):
+        return not prefix
+    *head, last = prefix
+    return words[: len(head)] == head and words[len(head)].startswith(last)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Literal
+
+from connector import DjangoKnowledgeConnector, TranscriptSaveError
+
+logger = logging.getLogger("transcript-writer")
+
+
+@dataclass
+class WriterStats:
+    queued: int = 0
+    saved: int = 0
+    dropped: int = 0
+    rejected: int = 0
+    failed_flushes: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class TranscriptWriter:
+    """Write-behind persistence of session transcripts.
+
+    `add` only appends to a bounded in-memory queue, so voice turns never wait
+    on Django. A background task flushes the queue to
+    `/api/save-transcriptions/bulk/` whenever `batch_size` items are waiting
+    or every `flush_interval` seconds, and `aclose` performs a final flush.
+    When the queue is full the oldest transcripts are dropped; batches that
+    fail to send, for whatever reason, are put back at the front of the queue
+    and retried.
+    """
+
+    def __init__(
+        self,
+        connector: DjangoKnowledgeConnector,
+        *,
+        username: str,
+        session_id: str,
+        max_queue: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        timeout: float = 5.0,
+    ):
+        self._connector = connector
+        self._username = username
+        self._session_id = session_id
+        self._max_queue = max_queue
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._timeout = timeout
+        self._queue: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task[None] | None = None
+        self._stats = WriterStats()
+
+    @property
+    def stats(self) -> WriterStats:
+        self._stats.queued = len(self._queue)
+        return self._stats
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, role: Literal["user", "assistant"], text: str) -> None:
+        """Queue one transcript, never blocks"""
+        text = text.strip()
+        if not text or self._closing:
+            return
+        self._queue.append(
+            {
+                "agent_response": text,
+                "username": self._username,
+                "session_id": self._session_id,
+                "metadata": {
+                    "type": "transcript",
+                    "role": role,
+                    "captured_at": datetime.now(timezone.utc).isoformat(),
+                },
+            }
+        )
+        self._trim()
+        if len(self._queue) >= self._batch_size:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        while len(self._queue) > self._max_queue:
+            self._queue.popleft()
+            self._stats.dropped += 1
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while self._queue and not self._closing:
+                    if not await self._flush_batch():
+                        break
+                    if len(self._queue) < self._batch_size:
+                        break
+            except Exception:
+                # keep flushing in the background whatever happened
+                logger.exception("transcript writer error")
+
+    async def _flush_batch(self) -> bool:
+        batch = [
+            self._queue.popleft()
+            for _ in range(min(self._batch_size, len(self._queue)))
+        ]
+        try:
+            result = await self._connector.save_transcripts(
+                batch, timeout=self._timeout
+            )
+        except TranscriptSaveError as e:
+            if e.status is not None and 400 <= e.status < 500:
+                # the server will never accept this batch, retrying is pointless
+                logger.error(f"dropping {len(batch)} rejected transcripts: {e}")
+                self._stats.rejected += len(batch)
+                return True
+            logger.warning(f"transcript flush failed, will retry: {e}")
+        except Exception:
+            logger.exception("unexpected transcript flush error, will retry")
+        else:
+            self._stats.saved += result.get("created", 0)
+            self._stats.rejected += result.get("failed", 0)
+            return True
+        self._stats.failed_flushes += 1
+        self._queue.extendleft(reversed(batch))
+        self._trim()
+        return False
+
+    async def aclose(self) -> None:
+        """Stop the background task and flush what is left"""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            # the final flush below runs even if the task died
+            await asyncio.wait({self._task})
+            if not self._task.cancelled() and self._task.exception() is not None:
+                logger.error(
+                    f"transcript writer task failed: {self._task.exception()!r}"
+                )
+            self._task = None
+        while self._queue:
+            if not await self._flush_batch():
+                logger.error(f"lost {len(self._queue)} transcripts on shutdown")
+                self._stats.dropped += len(self._queue)
+                self._queue.clear()
+        logger.info(f"transcript writer stats: {self.stats.to_dict()}")
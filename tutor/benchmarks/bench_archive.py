@@ -0,0 +1,102 @@
+"""
+Latency of the hot weekly-history read as the history grows, before and
+after archiving the months older than INTERACTION_ARCHIVE_AFTER_MONTHS.
+
+For each of --months (months of history) it creates --users users with
+--per-day interactions a day each, then times the reads a weekly summary
+request makes for a random user's current week: the content hash (the
+interaction IDs) and the prompt's agent responses. Then runs
+archive_interactions and times the same reads again.
+
+Usage:
+    python benchmarks/bench_archive.py --months 3 12 36
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, time as dtime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from client_user.archive import archive_cutoff, archive_interactions  # noqa: E402
+from client_user.models import InteractionArchive, InteractionHistory, User  # noqa: E402
+from client_user.summarization import period_interactions  # noqa: E402
+from client_user.summary_jobs import current_week  # noqa: E402
+
+
+def populate(users, months, per_day):
+    today = timezone.localdate()
+    for days_ago in range(months * 30, -1, -1):
+        moment = timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), dtime(12)))
+        with patch('django.utils.timezone.now', return_value=moment):
+            InteractionHistory.objects.bulk_create([
+                InteractionHistory(user=user, username=user.username,
+                                   agent_response=f'Answer {n} of {moment:%Y-%m-%d}.')
+                for user in users for n in range(per_day)
+            ])
+
+
+def time_reads(users, runs):
+    samples = []
+    for _ in range(runs):
+        username = random.choice(users).username
+        start = time.perf_counter()
+        for _ in period_interactions(username, *current_week(), fields=['agent_response']):
+            pass
+        samples.append(time.perf_counter() - start)
+    ms = np.array(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--months', type=int, nargs='+', default=[3, 12, 36])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--per-day', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(
+        tempfile.mkdtemp(), 'bench.sqlite3'
+    )
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        for months in args.months:
+            InteractionHistory.objects.all().delete()
+            InteractionArchive.objects.all().delete()
+            User.objects.all().delete()
+            users = [User.objects.create_user(username=f'user{i:03d}', password='bench')
+                     for i in range(args.users)]
+            populate(users, months, args.per_day)
+            rows = InteractionHistory.objects.count()
+            p50, p99 = time_reads(users, args.runs)
+            print(f'{months:3d} months {rows:8d} rows  table   p50 {p50:7.2f}ms  p99 {p99:7.2f}ms')
+
+            stats = archive_interactions(archive_cutoff(settings.INTERACTION_ARCHIVE_AFTER_MONTHS))
+            p50, p99 = time_reads(users, args.runs)
+            print(f'{"":10} {InteractionHistory.objects.count():8d} hot   archived p50 {p50:7.2f}ms  '
+                  f'p99 {p99:7.2f}ms  ({stats.raw_bytes // 1024} KB -> {stats.stored_bytes // 1024} KB)')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Rows per second: /api/save-transcriptions/ (one row per POST) vs the bulk
+endpoint (/api/save-transcriptions/bulk/, JSON array and NDJSON).
+
+Runs against a throwaway test database created from the migrations.
+Pass --db-file to use an on-disk SQLite file instead of the in-memory
+test database, which makes per-transaction commit cost visible.
+
+Usage:
+    python benchmarks/bench_bulk_ingest.py --rows 2000 --batch 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from client_user.models import InteractionHistory, User  # noqa: E402
+
+
+def make_rows(n):
+    return [
+        {'agent_response': f'transcript segment {i} ' * 8, 'username': 'bench'}
+        for i in range(n)
+    ]
+
+
+def bench_single(client, rows):
+    start = time.perf_counter()
+    for row in rows:
+        response = client.post('/api/save-transcriptions/', row, format='json')
+        assert response.status_code == 201, response.content
+    return time.perf_counter() - start
+
+
+def bench_bulk_json(client, rows, batch):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        response = client.post(
+            '/api/save-transcriptions/bulk/', rows[i:i + batch], format='json'
+        )
+        assert response.status_code == 201, response.content
+    return time.perf_counter() - start
+
+
+def bench_bulk_ndjson(client, rows, batch):
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch):
+        body = '\n'.join(json.dumps(row) for row in rows[i:i + batch])
+        response = client.post(
+            '/api/save-transcriptions/bulk/', body,
+            content_type='application/x-ndjson'
+        )
+        assert response.status_code == 201, response.content
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--db-file', action='store_true')
+    args = parser.parse_args()
+
+    if args.db_file:
+        db_file = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        settings.DATABASES['default']['TEST']['NAME'] = db_file
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        user = User.objects.create_user(username='bench', password='bench')
+        token = Token.objects.create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        rows = make_rows(args.rows)
+
+        for name, run in (
+            ('single', lambda: bench_single(client, rows)),
+            ('bulk-json', lambda: bench_bulk_json(client, rows, args.batch)),
+            ('bulk-ndjson', lambda: bench_bulk_ndjson(client, rows, args.batch)),
+        ):
+            InteractionHistory.objects.all().delete()
+            elapsed = run()
+            assert InteractionHistory.objects.count() == args.rows
+            print(f'{name:<12} {args.rows:6d} rows  {elapsed:7.2f}s  '
+                  f'{args.rows / elapsed:10.0f} rows/s')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
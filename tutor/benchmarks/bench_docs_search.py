@@ -0,0 +1,113 @@
+"""
+Query latency of search_internal_docs on a synthetic corpus.
+
+Builds a --docs corpus whose words follow a Zipf distribution (so common
+words have long postings like real prose), then times --queries searches of
+2-4 words against:
+
+* index: the BM25 DocsIndex that search_internal_docs now uses
+* linear: the previous substring scan over every document (timed on a
+  handful of queries only, it takes seconds each at 100k docs)
+
+Exits non-zero when the index p99 misses --p99-target-ms.
+
+Usage:
+    python benchmarks/bench_docs_search.py --docs 100000 --p99-target-ms 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_user.docs_index import DocsIndex  # noqa: E402
+
+
+def make_corpus(n_docs, vocab_size, words_per_doc, rng):
+    vocab = np.array([f'w{i}' for i in range(vocab_size)])
+
+    def words(n):
+        return vocab[np.minimum(rng.zipf(1.2, n), vocab_size) - 1]
+
+    return [
+        {
+            'title': ' '.join(words(5)),
+            'content': ' '.join(words(words_per_doc)),
+            'tags': list(words(3)),
+            'source': 'bench',
+            'url': f'https://docs/{i}',
+            'updated_at': '',
+        }
+        for i in range(n_docs)
+    ], words
+
+
+def linear_search(docs, query):
+    """The substring scan search_internal_docs used before the index"""
+    query_lower = query.lower()
+    results = []
+    for doc in docs:
+        score = 0
+        if query_lower in doc['title'].lower():
+            score += 3
+        if query_lower in doc['content'].lower():
+            score += 1
+        if any(query_lower in tag.lower() for tag in doc.get('tags', [])):
+            score += 2
+        if score > 0:
+            results.append((score, doc['url']))
+    return sorted(results, reverse=True)[:10]
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {p: float(np.percentile(ms, p)) for p in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=100_000)
+    parser.add_argument('--vocab', type=int, default=50_000)
+    parser.add_argument('--words', type=int, default=120)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--linear-queries', type=int, default=5)
+    parser.add_argument('--p99-target-ms', type=float, default=50.0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    docs, words = make_corpus(args.docs, args.vocab, args.words, rng)
+    print(f'corpus   {args.docs} docs generated in {time.perf_counter() - start:.1f}s')
+
+    start = time.perf_counter()
+    index = DocsIndex(docs)
+    print(f'build    {time.perf_counter() - start:.1f}s  '
+          f'{len(index.terms)} terms  {len(index.doc_ids)} postings')
+
+    queries = [' '.join(words(rng.integers(2, 5))) for _ in range(args.queries)]
+    timings = {'index': [], 'linear': []}
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query)
+        timings['index'].append(time.perf_counter() - start)
+    for query in queries[:args.linear_queries]:
+        start = time.perf_counter()
+        linear_search(docs, query)
+        timings['linear'].append(time.perf_counter() - start)
+
+    for name, samples in timings.items():
+        p = percentiles(samples)
+        print(f'{name:<8} {len(samples):5d} queries  p50 {p[50]:8.2f}ms  '
+              f'p95 {p[95]:8.2f}ms  p99 {p[99]:8.2f}ms')
+
+    p99 = percentiles(timings['index'])[99]
+    if p99 > args.p99_target_ms:
+        print(f'FAIL: index p99 {p99:.2f}ms over the {args.p99_target_ms:.0f}ms target')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
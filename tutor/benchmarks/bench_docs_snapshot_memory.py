@@ -0,0 +1,90 @@
+"""
+Memory of N worker processes serving the internal docs index.
+
+Publishes one snapshot, then starts --workers processes that open it and run
+--queries searches each:
+
+* copy: every worker reads the .npy files into its own memory
+* mmap: every worker maps them read-only (what search_internal_docs does)
+
+Reports the total PSS (proportional set size: shared pages are split across
+the processes mapping them) of the workers, i.e. the memory they really add.
+Linux only, reads /proc/self/smaps_rollup.
+
+Usage:
+    python benchmarks/bench_docs_snapshot_memory.py --docs 50000 --workers 1 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_docs_search import make_corpus  # noqa: E402
+from client_user.docs_index import DocsIndex  # noqa: E402
+from client_user.docs_snapshot import DocsSnapshotStore  # noqa: E402
+
+
+def pss_kb():
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+
+
+def worker(path, mmap_mode, queries, start, done, results):
+    index = DocsIndex.load(path, mmap_mode=mmap_mode)
+    for query in queries:
+        index.search(query)
+    results.put(pss_kb())
+    # hold the mapping until every worker has measured
+    start.wait()
+    done.wait()
+
+
+def measure(path, mmap_mode, n, queries):
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    start, done = ctx.Barrier(n + 1), ctx.Event()
+    procs = [ctx.Process(target=worker, args=(path, mmap_mode, queries, start, done, results))
+             for _ in range(n)]
+    for p in procs:
+        p.start()
+    samples = [results.get() for _ in procs]
+    start.wait()
+    done.set()
+    for p in procs:
+        p.join()
+    return sum(samples) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    docs, words = make_corpus(args.docs, 50_000, 120, rng)
+    queries = [' '.join(words(rng.integers(2, 5))) for _ in range(args.queries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DocsSnapshotStore(tmp)
+        version = store.publish(docs)
+        del docs
+        path = os.path.join(tmp, version)
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        print(f'snapshot {size / 2**20:.0f} MiB')
+
+        for n in args.workers:
+            copy = measure(path, None, n, queries)
+            mapped = measure(path, 'r', n, queries)
+            print(f'{n:3d} workers  copy {copy:8.0f} MiB  mmap {mapped:8.0f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Latency of a knowledge_view cache hit, and of the audit write it triggers.
+
+* hit: end-to-end GET /api/knowledge/ for a cached query through Django's
+  async handler (token lookup included, audit row queued write-behind)
+* cache lookup: the knowledge_cache part of a hit
+* audit inline: InteractionHistory.objects.acreate, what each hit used to pay
+* audit queued: audit_writer.add, what each hit pays now
+
+Usage:
+    python benchmarks/bench_knowledge_hit.py --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from client_user.audit import audit_writer  # noqa: E402
+from client_user.cache import knowledge_cache  # noqa: E402
+from client_user.models import InteractionHistory, User  # noqa: E402
+
+
+def report(name, samples):
+    ms = np.array(samples) * 1000
+    print(f'{name:<14} {len(ms):6d}  p50 {np.percentile(ms, 50):7.3f}ms  '
+          f'p99 {np.percentile(ms, 99):7.3f}ms')
+
+
+async def bench(n, user, headers):
+    client = AsyncClient()
+    response = await client.get('/api/knowledge/', {'q': 'gravity'}, headers=headers)
+    assert response.status_code == 200, response.content
+
+    hits = []
+    for _ in range(n):
+        start = time.perf_counter()
+        response = await client.get('/api/knowledge/', {'q': 'gravity'}, headers=headers)
+        hits.append(time.perf_counter() - start)
+    report('hit', hits)
+
+    key = knowledge_cache.make_key('knowledge', user.id, 'gravity')
+    lookups = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await knowledge_cache.aget_or_compute(key, None, 3600)
+        lookups.append(time.perf_counter() - start)
+    report('cache lookup', lookups)
+
+    def record():
+        return InteractionHistory(user=user, username=user.username, agent_response='',
+                                  metadata={'type': 'cached_knowledge', 'query': 'gravity'})
+
+    inline, queued = [], []
+    for _ in range(n):
+        row = record()
+        start = time.perf_counter()
+        await InteractionHistory.objects.acreate(
+            user=row.user, username=row.username, agent_response='', metadata=row.metadata
+        )
+        inline.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        audit_writer.add(record())
+        queued.append(time.perf_counter() - start)
+    report('audit inline', inline)
+    report('audit queued', queued)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    async def fake_wikipedia(query, lang='en'):
+        return f'{query} is a topic.'
+
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(
+        tempfile.mkdtemp(), 'bench.sqlite3'
+    )
+    settings.CACHES['knowledge'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(),
+    }
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        user = User.objects.create_user(username='bench', password='bench')
+        token = Token.objects.create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        knowledge_cache.clear()
+        with patch('client_user.knowledge_sources.aget_wikipedia_summary', fake_wikipedia), \
+                patch('client_user.knowledge_sources.search_internal_docs', return_value=[]), \
+                patch('client_user.utils.get_system_data', return_value={'results': []}):
+            asyncio.run(bench(args.requests, user, headers))
+        audit_writer.close()
+        print(f'audit writer   {audit_writer.stats.to_dict()}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Parallel summaries through the pooled, concurrency-limited LLM client vs
+one unpooled requests.post per call (the previous summarize_with_llama2).
+
+Runs --calls generations from --threads threads against FakeOllama and
+reports latency, the connections opened, the peak number of generations
+running at once on the server and, for the client, the peak queue depth.
+FakeOllama does not slow down under load, so the unbounded calls look
+cheap here; a real server past its parallel slots slows every generation
+down (or swaps the model), which is what the bounded client avoids.
+
+Usage:
+    python benchmarks/bench_llm_client.py --calls 64 --threads 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.fake_ollama import FakeOllama  # noqa: E402
+from client_user.llm import OllamaClient  # noqa: E402
+
+
+def run(name, generate, fake, calls, threads):
+    fake.requests.clear()
+    fake.connections.clear()
+    fake.max_concurrent = 0
+
+    def timed(i):
+        start = time.perf_counter()
+        generate(f'question {i}')
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(threads) as pool:
+        ms = np.array(list(pool.map(timed, range(calls)))) * 1000
+    print(f'{name:<10} p50 {np.percentile(ms, 50):8.1f}ms  p99 {np.percentile(ms, 99):8.1f}ms  '
+          f'connections {len(fake.connections):3d}  peak running {fake.max_concurrent:3d}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--max-concurrency', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with FakeOllama(reply=lambda prompt: 'A summary.', first_token_delay=args.latency,
+                    token_delay=0) as fake:
+        def unpooled(prompt):
+            return requests.post(f'{fake.url}/api/generate',
+                                 json={'model': 'llama2', 'prompt': prompt, 'stream': False}
+                                 ).json()['response']
+
+        client = OllamaClient(base_url=fake.url, max_concurrency=args.max_concurrency,
+                              pool_size=args.threads)
+        run('unpooled', unpooled, fake, args.calls, args.threads)
+        run('client', client.generate, fake, args.calls, args.threads)
+        stats = client.stats.to_dict()
+        print(f"client queue: max waiting {stats['max_waiting']}, "
+              f"total wait {stats['wait_seconds']}s")
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Nightly precompute of every active user's weekly summary, in this process
+vs a process pool, and the rerun once nothing changed.
+
+Creates --users users with --interactions interactions each this week and
+runs precompute_weekly_summaries against FakeOllama answering after
+--latency seconds:
+
+* serial: --processes 0
+* pool: --processes N, LLM requests capped at --rate per second
+* rerun: the pool again with no new interactions, every user is skipped
+  after reading its interaction IDs
+
+Reported: wall time, users summarized, LLM requests and the request rate
+the server saw.
+
+Usage:
+    python benchmarks/bench_precompute.py --users 40 --processes 4 --rate 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from benchmarks.fake_ollama import FakeOllama  # noqa: E402
+from client_user.llm import ollama  # noqa: E402
+from client_user.models import InteractionHistory, SummaryOfHistory, User, WeeklySummary  # noqa: E402
+from client_user.precompute import Checkpoint, precompute_weekly_summaries  # noqa: E402
+from client_user.summary_jobs import current_week  # noqa: E402
+
+
+def run(name, fake, checkpoint, **options):
+    fake.requests.clear()
+    start = time.perf_counter()
+    stats = precompute_weekly_summaries(*current_week(), checkpoint, **options)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<8} {elapsed:7.2f}s  summarized {stats.summarized:4d}  '
+          f'unchanged {stats.unchanged:4d}  LLM requests {len(fake.requests):4d} '
+          f'({len(fake.requests) / elapsed:5.1f}/s)')
+
+
+def forget_summaries():
+    WeeklySummary.objects.all().delete()
+    SummaryOfHistory.objects.update(dirty=True, summary={})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--interactions', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=20.0)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    checkpoint = Checkpoint(Path(directory) / 'weekly.jsonl', current_week()[0])
+    try:
+        with FakeOllama(reply=lambda prompt: 'A summary.', first_token_delay=args.latency,
+                        token_delay=0) as fake:
+            ollama.base_url = fake.url
+            for i in range(args.users):
+                user = User.objects.create_user(username=f'user{i:04d}', password='bench')
+                InteractionHistory.objects.bulk_create([
+                    InteractionHistory(user=user, username=user.username,
+                                       agent_response=f'Answer {j} to user {i}.')
+                    for j in range(args.interactions)
+                ])
+                InteractionHistory.objects.create(user=user, username=user.username,
+                                                  agent_response='Marks the rollups dirty.')
+
+            run('serial', fake, checkpoint, processes=0)
+            forget_summaries()
+            run('pool', fake, checkpoint, processes=args.processes, rate=args.rate)
+            run('rerun', fake, checkpoint, processes=args.processes, rate=args.rate)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
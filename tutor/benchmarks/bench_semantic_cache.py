@@ -0,0 +1,103 @@
+"""
+Hit rate and lookup cost of the semantic query cache.
+
+Simulates learners asking about a set of topics (Zipf popularity) with a
+random phrasing each time, and compares:
+
+* exact: the TieredCache key alone (normalized query string)
+* semantic: exact key, then SemanticCache nearest neighbour above --threshold
+
+A semantic hit on a different topic is counted as a false hit. The topic
+list deliberately contains pairs sharing words (black holes / black death).
+
+Usage:
+    python benchmarks/bench_semantic_cache.py --queries 5000 --threshold 0.85
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from client_user.cache import SemanticCache, normalize_query  # noqa: E402
+
+TOPICS = """gravity; black holes; black death; photosynthesis; cell division;
+cell membrane; the water cycle; plate tectonics; newton's laws of motion;
+the french revolution; the industrial revolution; quadratic equations;
+linear equations; the pythagorean theorem; dna replication; natural selection;
+the periodic table; chemical bonds; electric circuits; magnetic fields;
+climate change; the greenhouse effect; the roman empire; the ottoman empire;
+supply and demand; compound interest; prime numbers; fractions; volcanoes;
+earthquakes; the solar system; the big bang; thermodynamics; kinetic energy;
+potential energy; the immune system; the nervous system; world war one;
+world war two; the cold war; shakespeare's sonnets; poetry meter;
+machine learning; neural networks; sorting algorithms; binary search""".replace('\n', ' ')
+TOPICS = [t.strip() for t in TOPICS.split(';')]
+
+TEMPLATES = [
+    '{}', 'what is {}?', 'what are {}', 'explain {}', 'can you explain {} please',
+    'tell me about {}', 'I want to understand {}', 'help me understand {}',
+    'describe {}', 'how does {} work?', 'give me an overview of {}', '{} explained',
+    'what do you know about {}', 'could you tell me more about {}',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--threshold', type=float, default=0.85)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    semantic = SemanticCache(threshold=args.threshold)
+    exact_only = set()  # keys of the exact-only baseline
+    exact_keys = set()  # (user, normalized query) cached with the semantic layer on
+    topic_of = {}  # key -> topic of the query that created it
+    exact_hits = semantic_hits = false_hits = 0
+    lookup_times = []
+
+    popularity = 1 / np.arange(1, len(TOPICS) + 1)
+    popularity /= popularity.sum()
+    for _ in range(args.queries):
+        user = int(rng.integers(args.users))
+        topic = TOPICS[rng.choice(len(TOPICS), p=popularity)]
+        query = TEMPLATES[rng.integers(len(TEMPLATES))].format(topic)
+        key = (user, normalize_query(query))
+        exact_hits += key in exact_only
+        exact_only.add(key)
+
+        if key in exact_keys:
+            semantic_hits += 1
+            continue
+        start = time.perf_counter()
+        match = semantic.lookup(user, query)
+        lookup_times.append(time.perf_counter() - start)
+        if match:
+            semantic_hits += 1
+            false_hits += topic_of[match[0]] != topic
+            continue
+        exact_keys.add(key)
+        topic_of[str(key)] = topic
+        semantic.add(user, query, str(key))
+
+    n = args.queries
+    ms = np.array(lookup_times) * 1000
+    print(f'topics {len(TOPICS)}  phrasings {len(TEMPLATES)}  users {args.users}  queries {n}')
+    print(f'exact     hit rate {exact_hits / n:6.1%}')
+    print(f'semantic  hit rate {semantic_hits / n:6.1%}  '
+          f'false hits {false_hits} ({false_hits / max(semantic_hits, 1):.2%} of hits)')
+    print(f'lookup    p50 {np.percentile(ms, 50):.3f}ms  p99 {np.percentile(ms, 99):.3f}ms  '
+          f'(embedding included)')
+
+
+if __name__ == '__main__':
+    main()
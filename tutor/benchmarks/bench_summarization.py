@@ -0,0 +1,119 @@
+"""
+Cost of summarizing a week of history as it grows, before and after map-reduce.
+
+Inserts --sizes interactions (about 60 tokens each) for one user and
+summarizes the week against a fake LLM that sleeps --ms-per-ktoken per
+thousand prompt tokens (prefill grows with the prompt) and answers a
+~100 token summary:
+
+* single: the previous single prompt with every response joined
+* map-reduce: summarize_history (bounded chunks, concurrent map, tree merge)
+
+Reported per size: LLM calls, largest prompt in tokens (against the
+model's context window, 4096 for llama2), slowest single LLM call, wall
+time and peak Python memory of the summarization (tracemalloc).
+
+Usage:
+    python benchmarks/bench_summarization.py --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from client_user.models import InteractionHistory, User  # noqa: E402
+from client_user.summarization import (  # noqa: E402
+    count_tokens, period_bounds, summarize_history, weekly_summary_prompt,
+)
+from client_user.summary_jobs import current_week  # noqa: E402
+
+
+class FakeLLM:
+    def __init__(self, ms_per_ktoken):
+        self.ms_per_ktoken = ms_per_ktoken
+        self.calls = 0
+        self.max_tokens = 0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        tokens = count_tokens(prompt)
+        latency = 0.01 + tokens / 1000 * self.ms_per_ktoken / 1000
+        time.sleep(latency)
+        with self._lock:
+            self.calls += 1
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.max_latency = max(self.max_latency, latency)
+        return 'The learner reviewed topics and asked follow-up questions. ' * 6
+
+
+def single_prompt(username, start, end, llm):
+    """What generate_weekly_summary did before map-reduce"""
+    since, until = period_bounds(start, end)
+    responses = "\n".join(InteractionHistory.objects.filter(
+        username=username, timestamp__gte=since, timestamp__lt=until
+    ).order_by('timestamp').values_list('agent_response', flat=True))
+    return llm(weekly_summary_prompt(username, start, end, responses))
+
+
+def measure(name, size, fn, ms_per_ktoken):
+    llm = FakeLLM(ms_per_ktoken)
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(llm)
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:<11} {size:7d} rows  {llm.calls:5d} calls  max prompt {llm.max_tokens:8d} tok  '
+          f'slowest call {llm.max_latency:6.2f}s  wall {wall:6.2f}s  peak {peak / 2 ** 20:7.1f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--ms-per-ktoken', type=float, default=20.0)
+    args = parser.parse_args()
+
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(
+        tempfile.mkdtemp(), 'bench.sqlite3'
+    )
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        user = User.objects.create_user(username='bench', password='bench')
+        week = current_week()
+        total = 0
+        for size in sorted(args.sizes):
+            InteractionHistory.objects.bulk_create([
+                InteractionHistory(
+                    user=user, username='bench',
+                    agent_response=f'Answer {i}: ' + 'the learner practiced vocabulary ' * 7,
+                )
+                for i in range(total, size)
+            ], batch_size=1000)
+            total = size
+            measure('single', size,
+                    lambda llm: single_prompt('bench', *week, llm), args.ms_per_ktoken)
+            measure('map-reduce', size,
+                    lambda llm: summarize_history('bench', *week, llm), args.ms_per_ktoken)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
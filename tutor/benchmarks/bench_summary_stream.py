@@ -0,0 +1,107 @@
+"""
+Time to first token of the weekly summary, blocking vs streamed (SSE).
+
+Runs against FakeOllama with --prompt-eval seconds before the first token
+and --tokens tokens at --tokens-per-second, and measures through Django's
+async handler:
+
+* blocking: summarize_with_llama2 on the week's prompt, what a client
+  waited for before seeing any text
+* sse: GET /api/generate-weekly-summary/<user>/stream/, time to the first
+  token event and to the final done event
+
+Usage:
+    python benchmarks/bench_summary_stream.py --runs 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from benchmarks.fake_ollama import FakeOllama  # noqa: E402
+from client_user.llm import ollama as llm  # noqa: E402
+from client_user.models import InteractionHistory, User, WeeklySummary  # noqa: E402
+from client_user.rollups import mark_dirty  # noqa: E402
+from client_user.summarization import history_prompt  # noqa: E402
+from client_user.summary_jobs import current_week  # noqa: E402
+from client_user.utils import summarize_with_llama2  # noqa: E402
+
+
+def report(name, samples):
+    ms = np.array(samples) * 1000
+    print(f'{name:<16} p50 {np.percentile(ms, 50):8.1f}ms  p99 {np.percentile(ms, 99):8.1f}ms')
+
+
+async def bench(runs, interactions):
+    client = AsyncClient()
+    blocking, first, done = [], [], []
+    for _ in range(runs):
+        await WeeklySummary.objects.all().adelete()
+        # the stream rebuilds the day rollup rather than serving it
+        await sync_to_async(mark_dirty)(interactions)
+        prompt = await sync_to_async(history_prompt)('bench', *current_week(), summarize_with_llama2)
+        start = time.perf_counter()
+        await sync_to_async(summarize_with_llama2)(prompt)
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        response = await client.get('/api/generate-weekly-summary/bench/stream/')
+        seen_token = False
+        async for chunk in response.streaming_content:
+            if not seen_token and chunk.startswith(b'event: token'):
+                first.append(time.perf_counter() - start)
+                seen_token = True
+        done.append(time.perf_counter() - start)
+    report('blocking', blocking)
+    report('sse first token', first)
+    report('sse done', done)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--prompt-eval', type=float, default=0.3)
+    parser.add_argument('--tokens', type=int, default=200)
+    parser.add_argument('--tokens-per-second', type=float, default=25.0)
+    args = parser.parse_args()
+
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(
+        tempfile.mkdtemp(), 'bench.sqlite3'
+    )
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    reply = ' '.join(['word'] * args.tokens)
+    try:
+        with FakeOllama(reply=lambda prompt: reply, first_token_delay=args.prompt_eval,
+                        token_delay=1 / args.tokens_per_second) as ollama:
+            llm.base_url = ollama.url
+            user = User.objects.create_user(username='bench', password='bench')
+            interactions = InteractionHistory.objects.bulk_create([
+                InteractionHistory(user=user, username='bench', agent_response=f'Answer {i}.')
+                for i in range(50)
+            ])
+            asyncio.run(bench(args.runs, interactions))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
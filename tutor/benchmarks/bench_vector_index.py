@@ -0,0 +1,125 @@
+"""
+Recall and latency of VectorIndex top-k.
+
+Generates --chunks unit vectors of --dim dimensions drawn around --clusters
+random centers (real embeddings are clustered by topic, uniform random
+vectors would make every ANN structure look bad), then runs --queries
+nearby queries, one at a time and as one batch, against:
+
+* flat: exact blocked brute force over the float32 matrix
+* ivf: --lists spherical k-means lists, --nprobe probed per query
+* ivf+int8: the same lists over scalar-quantized rows
+
+recall@10 is measured against the flat results. Finally a small text
+corpus is embedded with the HashingEmbedder to check that each document is
+retrieved by a paraphrase of its own chunk.
+
+Usage:
+    python benchmarks/bench_vector_index.py --chunks 200000 --dim 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client_user.embeddings import HashingEmbedder  # noqa: E402
+from client_user.vector_index import VectorIndex  # noqa: E402
+
+
+def clustered(n, dim, centers, rng, noise=0.35):
+    vectors = centers[rng.integers(len(centers), size=n)] + noise * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return {p: float(np.percentile(ms, p)) for p in (50, 99)}
+
+
+def from_vectors(vectors, **options):
+    n = len(vectors)
+    zeros = np.zeros(n, dtype=np.int32)
+    return VectorIndex(vectors, np.arange(n, dtype=np.int32), zeros, zeros, [], **options)
+
+
+def text_check(n_docs, rng):
+    """Fraction of documents ranked first for a shuffled half of their own words"""
+    vocab = [f'term{i}' for i in range(5000)]
+    docs = [
+        {'title': f'doc {i}', 'content': ' '.join(rng.choice(vocab, 60)),
+         'source': 'bench', 'url': f'https://docs/{i}'}
+        for i in range(n_docs)
+    ]
+    embedder = HashingEmbedder()
+    index = VectorIndex.build(docs, embedder)
+    hits = 0
+    for doc in docs:
+        words = doc['content'].split()
+        query = ' '.join(rng.permutation(words)[:len(words) // 2])
+        results = index.search(embedder.embed(query), limit=1)
+        hits += bool(results) and results[0]['url'] == doc['url']
+    return hits / n_docs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--lists', type=int, default=1024)
+    parser.add_argument('--nprobe', type=int, default=16)
+    parser.add_argument('--text-docs', type=int, default=2000)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    centers = rng.normal(size=(args.clusters, args.dim))
+    vectors = clustered(args.chunks, args.dim, centers, rng)
+    queries = clustered(args.queries, args.dim, centers, rng)
+    print(f'data     {args.chunks} x {args.dim} float32 '
+          f'({vectors.nbytes / 2 ** 20:.0f} MiB), {args.queries} queries')
+
+    variants = {
+        'flat': {},
+        'ivf': {'ivf_lists': args.lists, 'nprobe': args.nprobe},
+        'ivf+int8': {'ivf_lists': args.lists, 'nprobe': args.nprobe, 'int8': True},
+    }
+    truth = None
+    for name, options in variants.items():
+        start = time.perf_counter()
+        index = from_vectors(vectors, **options)
+        build = time.perf_counter() - start
+
+        timings = []
+        ids = []
+        for query in queries:
+            start = time.perf_counter()
+            ids.append(index.top_k(query, k=10)[0][0])
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        index.top_k(queries, k=10)
+        batched = (time.perf_counter() - start) / len(queries)
+
+        found = [set(index.chunk_doc[row]) for row in ids]
+        if truth is None:
+            truth = found
+        recall = np.mean([len(f & t) / 10 for f, t in zip(found, truth)])
+        p = percentiles(timings)
+        print(f'{name:<9} build {build:6.1f}s  {index.vectors.nbytes / 2 ** 20:5.0f} MiB  '
+              f'recall@10 {recall:.3f}  p50 {p[50]:7.2f}ms  p99 {p[99]:7.2f}ms  '
+              f'batched {batched * 1000:6.2f}ms/query')
+
+    if args.text_docs:
+        start = time.perf_counter()
+        accuracy = text_check(args.text_docs, rng)
+        print(f'text     {args.text_docs} docs  top-1 self retrieval {accuracy:.3f}  '
+              f'({time.perf_counter() - start:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Concurrent-request throughput of /api/knowledge/ under WSGI and ASGI.
+
+The outbound Wikipedia lookup is replaced by a fixed-latency fake so the
+numbers measure how well each server model overlaps upstream waits:
+
+* wsgi: a pool of --threads worker threads, each running requests through
+  Django's synchronous handler (like gunicorn --threads)
+* asgi: up to --concurrency requests in flight on one event loop through
+  Django's async handler (like uvicorn)
+
+Every request uses a fresh query, so each one misses the cache and does the
+upstream call and the audit insert.
+
+Usage:
+    python benchmarks/bench_wsgi_vs_asgi.py --requests 200 --latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tutor.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import CacheKeyWarning  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient, Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+
+from client_user.models import User  # noqa: E402
+
+
+def run_wsgi(n, threads, headers):
+    def one(i):
+        response = Client().get('/api/knowledge/', {'q': f'wsgi {i}'}, headers=headers)
+        assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n)))
+    return time.perf_counter() - start
+
+
+def run_asgi(n, concurrency, headers):
+    async def main():
+        client = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(i):
+            async with slots:
+                response = await client.get(
+                    '/api/knowledge/', {'q': f'asgi {i}'}, headers=headers
+                )
+                assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        return time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore', CacheKeyWarning)
+
+    async def fake_wikipedia(query, lang='en'):
+        await asyncio.sleep(args.latency)
+        return f'{query} is a topic.'
+
+    # a file database, the in-memory one does not tolerate concurrent threads
+    settings.DATABASES['default']['TEST']['NAME'] = os.path.join(
+        tempfile.mkdtemp(), 'bench.sqlite3'
+    )
+    settings.DEBUG = False
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, serialize=False)
+    try:
+        user = User.objects.create_user(username='bench', password='bench')
+        token = Token.objects.create(user=user)
+        headers = {'Authorization': f'Token {token.key}'}
+        connection.close()
+
+        with patch('client_user.knowledge_sources.aget_wikipedia_summary', fake_wikipedia), \
+                patch('client_user.utils.get_system_data', return_value={'results': []}):
+            for name, run in (
+                (f'wsgi x{args.threads}', lambda: run_wsgi(args.requests, args.threads, headers)),
+                (f'asgi c{args.concurrency}', lambda: run_asgi(args.requests, args.concurrency, headers)),
+            ):
+                elapsed = run()
+                print(f'{name:<10} {args.requests:5d} requests  {elapsed:6.2f}s  '
+                      f'{args.requests / elapsed:8.1f} req/s')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
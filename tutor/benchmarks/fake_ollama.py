@@ -0,0 +1,136 @@
+# Local stand-in for the Ollama HTTP API, for tests and benchmarks
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+
+class FakeOllama:
+    """
+    Serves POST /api/generate like Ollama on 127.0.0.1, in a background thread
+
+    The completion of a prompt is `reply(prompt)` split into word tokens.
+    The first token takes `first_token_delay` seconds (prompt evaluation),
+    every following one `token_delay`. With "stream": true each token is
+    sent as its own NDJSON line as soon as it is "generated", then a final
+    {"done": true} line; otherwise a single JSON object is returned at the
+    end. An empty prompt only "loads the model" like Ollama does. The next
+    `fail_next` requests are answered with HTTP `fail_status`. Received
+    request bodies are kept in `requests`, the highest number of
+    generations running at once in `max_concurrent` and the client ports
+    of the connections they came over in `connections`.
+
+    Usage:
+        with FakeOllama() as ollama:
+            settings.OLLAMA_URL = ollama.url
+    """
+
+    def __init__(self, reply: Optional[Callable[[str], str]] = None,
+                 first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.reply = reply or (lambda prompt: "This is a summary.")
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.requests: List[dict] = []
+        self.fail_next = 0
+        self.fail_status = 503
+        self.max_concurrent = 0
+        self.connections = set()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def tokens(self, prompt: str) -> List[str]:
+        words = self.reply(prompt).split(' ')
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    def start(self) -> 'FakeOllama':
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='fake-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeOllama':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with fake._lock:
+                    fake.requests.append(body)
+                    fake.connections.add(self.client_address[1])
+                    failing = fake.fail_next > 0
+                    fake.fail_next -= failing
+                if self.path != '/api/generate':
+                    return self._json(404, {"error": "not found"})
+                if failing:
+                    return self._json(fake.fail_status, {"error": "model is busy"})
+                model = body.get('model', '')
+                if not body.get('prompt'):
+                    return self._json(200, {"model": model, "response": "", "done": True})
+
+                with fake._lock:
+                    fake._running += 1
+                    fake.max_concurrent = max(fake.max_concurrent, fake._running)
+                try:
+                    self._generate(body, model)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # the client hung up mid-stream
+                finally:
+                    with fake._lock:
+                        fake._running -= 1
+
+            def _generate(self, body, model):
+                tokens = fake.tokens(body['prompt'])
+                if not body.get('stream', True):
+                    time.sleep(fake.first_token_delay + fake.token_delay * (len(tokens) - 1))
+                    return self._json(200, {"model": model, "response": ''.join(tokens),
+                                            "done": True})
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def send(obj):
+                    line = json.dumps(obj).encode() + b'\n'
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                    self.wfile.flush()
+
+                for i, token in enumerate(tokens):
+                    time.sleep(fake.first_token_delay if i == 0 else fake.token_delay)
+                    send({"model": model, "response": token, "done": False})
+                send({"model": model, "response": "", "done": True})
+                self.wfile.write(b'0\r\n\r\n')
+                self.wfile.flush()
+
+        return Handler
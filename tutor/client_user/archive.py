@@ -0,0 +1,81 @@
+# Archival of old InteractionHistory months into compressed InteractionArchive blobs
+import logging
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional
+
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import InteractionArchive, InteractionHistory
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ArchiveStats:
+    months: int = 0  # user-months archived
+    interactions: int = 0
+    raw_bytes: int = 0  # JSON size of the archived rows
+    stored_bytes: int = 0  # after compression
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _month_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day.replace(day=1), time.min))
+
+
+def archive_cutoff(keep_months: int, today: Optional[date] = None) -> datetime:
+    """Start of the month `keep_months` months before the current one"""
+    month = (today or timezone.localdate()).replace(day=1)
+    for _ in range(keep_months):
+        month = (month - timedelta(days=1)).replace(day=1)
+    return _month_start(month)
+
+
+def archive_interactions(before: datetime, batch_size: int = 5000) -> ArchiveStats:
+    """
+    Moves the interactions older than `before` into InteractionArchive, a
+    blob per user and month (several for months over `batch_size` rows)
+
+    Each blob is written and its rows deleted in one transaction, so an
+    interrupted run loses nothing and the next one carries on. Readers go
+    through InteractionHistory.objects.between, which merges the archive
+    back in, so summaries of archived periods are unchanged.
+    """
+    stats = ArchiveStats()
+    groups = list(
+        InteractionHistory.objects.filter(timestamp__lt=before)
+        .annotate(month=TruncMonth('timestamp'))
+        .values_list('user_id', 'username', 'month')
+        .distinct().order_by('month', 'user_id', 'username')
+    )
+    for user_id, username, month in groups:
+        month = timezone.localdate(month)
+        start = _month_start(month)
+        end = min(_month_start(month + timedelta(days=31)), before)
+        rows = InteractionHistory.objects.filter(
+            user_id=user_id, username=username, timestamp__gte=start, timestamp__lt=end
+        ).order_by('timestamp', 'id')
+        while True:
+            with transaction.atomic():
+                batch = list(rows[:batch_size])
+                if not batch:
+                    break
+                data = InteractionArchive.pack(batch)
+                InteractionArchive.objects.create(
+                    user_id=user_id, username=username, month=month,
+                    first_timestamp=batch[0].timestamp, last_timestamp=batch[-1].timestamp,
+                    count=len(batch), data=data,
+                )
+                InteractionHistory.objects.filter(id__in=[row.id for row in batch]).delete()
+            stats.interactions += len(batch)
+            stats.raw_bytes += len(zlib.decompress(data))
+            stats.stored_bytes += len(data)
+        stats.months += 1
+        logger.info(f"Archived the interactions of {username} of {month:%Y-%m}")
+    return stats
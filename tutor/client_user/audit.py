@@ -0,0 +1,179 @@
+# Write-behind persistence of the knowledge_view audit records
+import atexit
+import logging
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+
+from .models import InteractionHistory
+from .rollups import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AuditStats:
+    queued: int = 0
+    written: int = 0
+    dropped: int = 0
+    rejected: int = 0  # rows the database refused, e.g. of a deleted user
+    failed_flushes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class AuditWriter:
+    """
+    Queues InteractionHistory rows and inserts them in batches off the request path
+
+    `add` only appends to a bounded in-memory deque, so a request never waits
+    on the database. A daemon thread flushes the queue with bulk_create
+    whenever `batch_size` rows are waiting or every `flush_interval` seconds.
+    When the queue is full the oldest rows are dropped. A batch hitting an
+    IntegrityError is split until the rows the database refuses are isolated,
+    and those are dropped; a batch failing otherwise is put back at the front
+    and retried on the next flushes, up to `max_retries` times, then dropped.
+    The queue is drained at interpreter exit.
+
+    The thread starts on the first `add` of each process (after the server
+    forked its workers); with `background=False` nothing is written until
+    `flush` is called, which is what the tests use.
+    """
+
+    def __init__(self, max_queue: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_retries: int = 5,
+                 background: bool = True):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.background = background
+        self._queue = deque()
+        self._queue_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._thread = None
+        self._failures = 0  # failed flushes in a row of the batch at the front
+        self._stats = AuditStats()
+
+    @property
+    def stats(self) -> AuditStats:
+        self._stats.queued = len(self._queue)
+        return self._stats
+
+    def add(self, record: InteractionHistory):
+        """Queues one unsaved InteractionHistory, never blocks on the database"""
+        with self._queue_lock:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self._stats.dropped += 1
+            self._queue.append(record)
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.set()
+        if self.background and self._thread is None and not self._closing:
+            self.start()
+
+    def start(self):
+        with self._queue_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closing:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            close_old_connections()
+
+    def flush(self) -> int:
+        """
+        Writes everything queued so far, in batches
+        Returns:
+            int: Number of rows written
+        """
+        written = []
+        with self._flush_lock:
+            while True:
+                with self._queue_lock:
+                    batch = [self._queue.popleft()
+                             for _ in range(min(self.batch_size, len(self._queue)))]
+                if not batch:
+                    break
+                try:
+                    inserted = self._insert(batch)
+                except Exception as e:
+                    self._stats.failed_flushes += 1
+                    self._failures += 1
+                    if self._failures >= self.max_retries:
+                        logger.error(f"Dropping {len(batch)} audit rows after "
+                                     f"{self._failures} failed flushes: {str(e)}")
+                        self._stats.dropped += len(batch)
+                        self._failures = 0
+                        break
+                    logger.error(f"Audit flush of {len(batch)} rows failed: {str(e)}")
+                    with self._queue_lock:
+                        self._queue.extendleft(reversed(batch))
+                        while len(self._queue) > self.max_queue:
+                            self._queue.popleft()
+                            self._stats.dropped += 1
+                    break
+                self._failures = 0
+                written.extend(inserted)
+                self._stats.written += len(inserted)
+        try:
+            # bulk_create sends no post_save
+            mark_dirty(written)
+        except Exception as e:
+            logger.error(f"Marking the rollups of {len(written)} audit rows failed: {str(e)}")
+        return len(written)
+
+    def _insert(self, batch: List[InteractionHistory]) -> List[InteractionHistory]:
+        """
+        bulk_create of the batch. On an IntegrityError the halves are
+        inserted separately, down to single rows, which are dropped: one
+        row the database refuses does not hold back the others.
+        Returns:
+            list: The rows written
+        """
+        try:
+            InteractionHistory.objects.bulk_create(batch)
+            return batch
+        except Exception as e:
+            # The insert was rolled back, the ids it assigned are not in the table
+            for row in batch:
+                row.pk = None
+            if not isinstance(e, IntegrityError):
+                raise
+            if len(batch) == 1:
+                logger.error(f"Dropping an audit row the database refused: {str(e)}")
+                self._stats.rejected += 1
+                return []
+        middle = len(batch) // 2
+        return self._insert(batch[:middle]) + self._insert(batch[middle:])
+
+    def close(self, timeout: float = 5.0):
+        """Stops the thread and drains the queue"""
+        self._closing = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush()
+        if self._queue:
+            logger.warning(f"{len(self._queue)} audit rows lost at shutdown")
+
+
+audit_writer = AuditWriter(
+    max_queue=getattr(settings, 'AUDIT_QUEUE_SIZE', 10000),
+    batch_size=getattr(settings, 'AUDIT_BATCH_SIZE', 200),
+    flush_interval=getattr(settings, 'AUDIT_FLUSH_INTERVAL', 1.0),
+    max_retries=getattr(settings, 'AUDIT_MAX_RETRIES', 5),
+)
@@ -0,0 +1,38 @@
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authtoken.models import Token
+
+
+def _unauthorized(detail):
+    response = JsonResponse({"detail": detail}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+def async_token_required(view_func):
+    """
+    TokenAuthentication + IsAuthenticated for plain async Django views.
+
+    DRF's APIView is synchronous, so the async endpoints check the
+    "Authorization: Token <key>" header themselves with the async ORM and
+    set request.user / request.auth the way DRF would.
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+        if keyword != 'Token' or not key.strip():
+            return _unauthorized("Authentication credentials were not provided.")
+        try:
+            token = await Token.objects.select_related('user').aget(key=key.strip())
+        except Token.DoesNotExist:
+            return _unauthorized("Invalid token.")
+        if not token.user.is_active:
+            return _unauthorized("User inactive or deleted.")
+
+        request.user = token.user
+        request.auth = token
+        return await view_func(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
@@ -0,0 +1,438 @@
+# Two-tier cache for knowledge_view results
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from .embeddings import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+_SPACE_RE = re.compile(r"\s+")
+
+# Bumped when the stored payload format changes
+KEY_VERSION = 2
+
+# First byte of the payloads stored in L2
+_RAW = b'j'
+_ZLIB = b'z'
+
+
+def normalize_query(query: str) -> str:
+    """Case-folded query with collapsed whitespace and no trailing punctuation"""
+    return _SPACE_RE.sub(' ', query.casefold()).strip().rstrip('?!.').strip()
+
+
+@dataclass
+class TierStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), hit_ratio=round(self.hit_ratio, 4))
+
+
+@dataclass
+class RecomputeStats:
+    computed: int = 0  # upstream computations run by this process
+    early: int = 0  # of which were early refreshes of a still valid entry
+    waited: int = 0  # misses that waited for another request's computation
+    lease_expired: int = 0  # waits that gave up and computed themselves
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class Entry(NamedTuple):
+    value: Any
+    delta: float  # seconds the value took to compute
+    expires_at: float  # wall-clock time the entry expires
+
+
+def _should_refresh_early(entry: Entry, beta: float) -> bool:
+    """
+    XFetch: recompute before expiry with a probability rising as it nears
+
+    Expensive values (large delta) start being refreshed earlier, so a
+    single request refreshes a hot key before everyone misses it at once.
+    """
+    if beta <= 0 or entry.delta <= 0:
+        return False
+    return time.time() - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expires_at
+
+
+class TieredCache:
+    """
+    Small in-process LRU (L1) in front of a shared Django cache alias (L2)
+
+    L1 holds decoded values for `l1_ttl` seconds, so a hot key is served
+    without touching L2 at all; it is per process and never invalidated,
+    keep its TTL short. L2 is shared by every worker (file-based by default,
+    Redis when configured) and stores JSON, zlib-compressed above
+    `compress_min` bytes. Values must be JSON-serializable.
+
+    `aget_or_compute` adds stampede protection: a miss takes a lease of
+    `lease` seconds (cache.add of a lock key, an O_EXCL file for the
+    file-based backend whose add is not atomic) and only the holder runs the
+    computation, while the others wait for its result. Entries are also
+    refreshed early, XFetch style (`beta`, 0 disables it), while the stale
+    value keeps being served.
+
+    Stats are per process: the L2 figures count only the L1 misses of this
+    process.
+    """
+
+    def __init__(self, alias: str = 'knowledge', l1_size: int = 256,
+                 l1_ttl: float = 60, compress_min: int = 1024,
+                 lease: float = 10, beta: float = 1.0, poll_interval: float = 0.05):
+        self.alias = alias
+        self.l1_size = l1_size
+        self.l1_ttl = l1_ttl
+        self.compress_min = compress_min
+        self.lease = lease
+        self.beta = beta
+        self.poll_interval = poll_interval
+        self.stats = {'l1': TierStats(), 'l2': TierStats()}
+        self.recompute_stats = RecomputeStats()
+        self._l1 = OrderedDict()  # key -> (l1 expiry, Entry)
+        self._lock = threading.Lock()
+        self._inflight = {}  # (event loop, key) -> Future of this process' computation
+
+    @property
+    def l2(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(prefix: str, user_id: Any, query: str) -> str:
+        """Fixed-length key from the normalized query, safe for every backend"""
+        digest = hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()
+        return f"{prefix}:v{KEY_VERSION}:{user_id}:{digest}"
+
+    def _encode(self, entry: Entry) -> bytes:
+        data = json.dumps(
+            {'v': entry.value, 'd': entry.delta, 'x': entry.expires_at},
+            separators=(',', ':'),
+        ).encode('utf-8')
+        if len(data) >= self.compress_min:
+            return _ZLIB + zlib.compress(data)
+        return _RAW + data
+
+    @staticmethod
+    def _decode(payload: bytes) -> Entry:
+        data = payload[1:]
+        if payload[:1] == _ZLIB:
+            data = zlib.decompress(data)
+        data = json.loads(data)
+        return Entry(data['v'], data['d'], data['x'])
+
+    def _l1_get(self, key: str) -> Optional[Entry]:
+        with self._lock:
+            item = self._l1.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self._l1.move_to_end(key)
+                self.stats['l1'].hits += 1
+                return item[1]
+            if item is not None:
+                del self._l1[key]
+            self.stats['l1'].misses += 1
+            return None
+
+    def _l1_set(self, key: str, entry: Entry):
+        ttl = min(self.l1_ttl, entry.expires_at - time.time())
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, entry)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_size:
+                self._l1.popitem(last=False)
+
+    async def _l2_get(self, key: str) -> Optional[Entry]:
+        payload = await self.l2.aget(key)
+        if payload is None:
+            return None
+        entry = self._decode(payload)
+        self._l1_set(key, entry)
+        return entry
+
+    async def aget_entry(self, key: str) -> Optional[Entry]:
+        entry = self._l1_get(key)
+        if entry is not None:
+            return entry
+        entry = await self._l2_get(key)
+        self.stats['l2'].hits += entry is not None
+        self.stats['l2'].misses += entry is None
+        return entry
+
+    async def aget(self, key: str) -> Optional[Any]:
+        entry = await self.aget_entry(key)
+        return entry.value if entry is not None else None
+
+    async def aset(self, key: str, value: Any, timeout: float, delta: float = 0.0):
+        entry = Entry(value, delta, time.time() + timeout)
+        await self.l2.aset(key, self._encode(entry), timeout)
+        self._l1_set(key, entry)
+
+    async def aget_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Any]], timeout: float
+    ) -> Tuple[Any, bool]:
+        """
+        Returns the cached value, computing it once across all workers on a miss
+        Args:
+            key: Cache key
+            compute: Coroutine function producing the value
+            timeout: Seconds the computed value stays cached
+        Returns:
+            tuple: (value, True if it came from the cache)
+        """
+        entry = await self.aget_entry(key)
+        if entry is not None and not _should_refresh_early(entry, self.beta):
+            return entry.value, True
+
+        # Coroutines of this process share one computation
+        flight = (asyncio.get_running_loop(), key)
+        if flight in self._inflight:
+            if entry is not None:
+                return entry.value, True
+            self.recompute_stats.waited += 1
+            return await asyncio.shield(self._inflight[flight]), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight] = future
+        try:
+            value, cached = await self._compute_once(key, compute, timeout, entry)
+            future.set_result(value)
+            return value, cached
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, nobody may be waiting
+            raise
+        finally:
+            del self._inflight[flight]
+
+    async def _compute_once(self, key, compute, timeout, entry):
+        lock_key = f"{key}:lease"
+        token = uuid.uuid4().hex
+        if not await self._acquire_lease(lock_key, token):
+            if entry is not None:
+                # Early refresh already under way elsewhere, keep serving this one
+                return entry.value, True
+            self.recompute_stats.waited += 1
+            deadline = time.monotonic() + self.lease
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                if (entry := await self._l2_get(key)) is not None:
+                    return entry.value, True
+            # The holder died or is too slow; compute ourselves
+            self.recompute_stats.lease_expired += 1
+            logger.warning(f"Cache lease for {key} expired, recomputing")
+
+        try:
+            start = time.monotonic()
+            value = await compute()
+            await self.aset(key, value, timeout, delta=time.monotonic() - start)
+            self.recompute_stats.computed += 1
+            self.recompute_stats.early += entry is not None
+            return value, False
+        finally:
+            await self._release_lease(lock_key, token)
+
+    def _lease_path(self, lock_key: str) -> str:
+        return self.l2._key_to_file(lock_key) + '.lease'
+
+    async def _acquire_lease(self, lock_key: str, token: str) -> bool:
+        if isinstance(self.l2, FileBasedCache):
+            return await sync_to_async(self._acquire_file_lease, thread_sensitive=False)(
+                lock_key, token
+            )
+        return await self.l2.aadd(lock_key, token, self.lease)
+
+    def _acquire_file_lease(self, lock_key: str, token: str) -> bool:
+        path = self._lease_path(lock_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                try:
+                    os.write(fd, token.encode())
+                finally:
+                    os.close(fd)
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(path).st_mtime < self.lease:
+                        return False
+                    # Expired: only the process whose rename succeeds breaks it
+                    stale = f"{path}.{uuid.uuid4().hex}"
+                    os.rename(path, stale)
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
+        return False
+
+    async def _release_lease(self, lock_key: str, token: str):
+        if isinstance(self.l2, FileBasedCache):
+            await sync_to_async(self._release_file_lease, thread_sensitive=False)(lock_key, token)
+        elif await self.l2.aget(lock_key) == token:
+            await self.l2.adelete(lock_key)
+
+    def _release_file_lease(self, lock_key: str, token: str):
+        # Only our own lease: once it expired another worker may hold a new one
+        path = self._lease_path(lock_key)
+        try:
+            with open(path) as f:
+                if f.read() != token:
+                    return
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Empties L1 and the whole L2 alias, and resets the stats"""
+        with self._lock:
+            self._l1.clear()
+            self.stats = {'l1': TierStats(), 'l2': TierStats()}
+            self.recompute_stats = RecomputeStats()
+        self.l2.clear()
+
+    def stats_dict(self) -> Dict[str, Any]:
+        l1, l2 = self.stats['l1'], self.stats['l2']
+        lookups = l1.hits + l1.misses
+        return {
+            'l1': dict(l1.to_dict(), size=len(self._l1), maxsize=self.l1_size),
+            'l2': dict(l2.to_dict(), alias=self.alias,
+                       backend=type(self.l2).__name__),
+            'hit_ratio': round((l1.hits + l2.hits) / lookups, 4) if lookups else 0.0,
+            'recompute': self.recompute_stats.to_dict(),
+        }
+
+
+class SemanticCache:
+    """
+    Maps a query to the cache key of a similar query asked before by the same user
+
+    Keeps the embeddings of the last `max_per_user` distinct queries of each
+    of the last `max_users` users in a per-user float32 ring buffer; a
+    lookup is one matrix-vector product and returns the key of the nearest
+    one when its cosine similarity reaches `threshold`. Only keys are kept
+    here, the results stay in the TieredCache. Per process.
+
+    Hits and misses are counted by the caller through `record`, once it
+    knows whether the neighbour's results were still cached and served.
+    """
+
+    def __init__(self, embedder: Optional[HashingEmbedder] = None, threshold: float = 0.85,
+                 max_per_user: int = 256, max_users: int = 1024):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_per_user = max_per_user
+        self.max_users = max_users
+        self.stats = TierStats()
+        self._users = OrderedDict()  # user id -> _UserQueries
+        self._lock = threading.Lock()
+
+    def lookup(self, user_id: Any, query: str,
+               exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        Args:
+            exclude: Cache key never returned (the query's own exact key)
+        Returns:
+            tuple|None: (cache key, similarity) of the nearest earlier query
+            above the threshold
+        """
+        vector = self.embedder.embed(query)
+        with self._lock:
+            queries = self._users.get(user_id)
+            if queries is not None and queries.size and vector.any():
+                similarities = queries.vectors[:queries.size] @ vector
+                if exclude in queries.rows:
+                    similarities[queries.rows[exclude]] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._users.move_to_end(user_id)
+                    return queries.keys[best], float(similarities[best])
+            return None
+
+    def record(self, hit: bool):
+        """Counts a lookup; a hit only when the neighbour's results were served"""
+        with self._lock:
+            if hit:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+
+    def add(self, user_id: Any, query: str, key: str):
+        vector = self.embedder.embed(query)
+        if not vector.any():
+            return
+        with self._lock:
+            queries = self._users.get(user_id)
+            if queries is None:
+                queries = self._users[user_id] = _UserQueries(self.max_per_user, self.embedder.dim)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            queries.add(vector, key)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self.stats = TierStats()
+
+
+class _UserQueries:
+    """Ring buffer of one user's query embeddings and their cache keys"""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.keys = [None] * capacity
+        self.rows = {}  # key -> row
+        self.size = 0
+        self.next = 0
+
+    def add(self, vector: np.ndarray, key: str):
+        if key in self.rows:
+            return
+        row = self.next
+        if self.keys[row] is not None:
+            del self.rows[self.keys[row]]
+        self.vectors[row] = vector
+        self.keys[row] = key
+        self.rows[key] = row
+        self.next = (row + 1) % len(self.keys)
+        self.size = min(self.size + 1, len(self.keys))
+
+
+knowledge_cache = TieredCache(
+    alias='knowledge',
+    l1_size=getattr(settings, 'KNOWLEDGE_CACHE_L1_SIZE', 256),
+    l1_ttl=getattr(settings, 'KNOWLEDGE_CACHE_L1_TTL', 60),
+    compress_min=getattr(settings, 'KNOWLEDGE_CACHE_COMPRESS_MIN', 1024),
+    lease=getattr(settings, 'KNOWLEDGE_CACHE_LEASE', 10),
+    beta=getattr(settings, 'KNOWLEDGE_CACHE_EARLY_BETA', 1.0),
+)
+
+semantic_cache = SemanticCache(
+    threshold=getattr(settings, 'KNOWLEDGE_SEMANTIC_THRESHOLD', 0.85),
+    max_per_user=getattr(settings, 'KNOWLEDGE_SEMANTIC_MAX_PER_USER', 256),
+)
@@ -0,0 +1,260 @@
+# Inverted index over the internal docs corpus used by search_internal_docs
+import json
+import math
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Longer tokens (hashes, base64 blobs) are not indexed; this also bounds the
+# width of the fixed-size term array
+MAX_TOKEN_LEN = 40
+
+# Arrays written to / memory-mapped from a saved index
+_ARRAYS = (
+    'terms', 'ptr', 'doc_ids', 'tfs', 'offsets',
+    'title_ptr', 'title_docs', 'tag_ptr', 'tag_docs',
+    'idf', 'len_norm', 'doc_blob', 'doc_starts',
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of `text`"""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) <= MAX_TOKEN_LEN]
+
+
+class _DocStore(Sequence):
+    """Read-only documents stored as JSON records in one byte array"""
+
+    def __init__(self, blob: np.ndarray, starts: np.ndarray):
+        self.blob = blob
+        self.starts = starts
+
+    @classmethod
+    def pack(cls, docs: List[Dict]) -> '_DocStore':
+        records = [json.dumps(doc, default=str).encode('utf-8') for doc in docs]
+        starts = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in records], out=starts[1:])
+        return cls(np.frombuffer(b''.join(records), dtype=np.uint8), starts)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        return json.loads(self.blob[self.starts[i]:self.starts[i + 1]].tobytes())
+
+
+class DocsIndex:
+    """
+    BM25 inverted index over internal documents
+
+    Built once per corpus refresh. Terms are kept in one sorted array and
+    looked up by binary search. Postings are stored CSR-style in flat
+    numpy arrays (one slice of doc ids / term frequencies / first character
+    offsets per term), so a query only touches the postings of its own
+    terms. Scores are BM25 over the content plus `title_boost` / `tag_boost`
+    times the term IDF when the term appears in the title / tags. The
+    excerpt is cut around the precomputed first offset of the rarest
+    matching term instead of rescanning the content.
+
+    Every field is a flat numpy array, so `save` / `load` round-trip the
+    index through .npy files and `load` can memory-map them read-only.
+    """
+
+    def __init__(self, docs: List[Dict], k1: float = 1.2, b: float = 0.75,
+                 title_boost: float = 3.0, tag_boost: float = 2.0):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self.tag_boost = tag_boost
+        self._vocab: Dict[str, int] = {}
+
+        term_ids, doc_ids, tfs, offsets = array('i'), array('i'), array('i'), array('i')
+        title_terms, title_docs = array('i'), array('i')
+        tag_terms, tag_docs = array('i'), array('i')
+        doc_len = np.zeros(len(docs), dtype=np.float32)
+
+        for doc_id, doc in enumerate(docs):
+            counts: Dict[int, List[int]] = {}
+            length = 0
+            for match in _TOKEN_RE.finditer(doc.get('content', '')):
+                if match.end() - match.start() > MAX_TOKEN_LEN:
+                    continue
+                term_id = self._term_id(match.group().lower())
+                entry = counts.get(term_id)
+                if entry is None:
+                    counts[term_id] = [1, match.start()]
+                else:
+                    entry[0] += 1
+                length += 1
+            doc_len[doc_id] = length
+            for term_id, (tf, offset) in counts.items():
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+                offsets.append(offset)
+
+            for term_id in {self._term_id(t) for t in tokenize(doc.get('title', ''))}:
+                title_terms.append(term_id)
+                title_docs.append(doc_id)
+            tags = ' '.join(doc.get('tags', []))
+            for term_id in {self._term_id(t) for t in tokenize(tags)}:
+                tag_terms.append(term_id)
+                tag_docs.append(doc_id)
+
+        # Renumber terms in sorted order so lookups can binary search
+        terms = sorted(self._vocab)
+        remap = np.zeros(len(terms), dtype=np.int32)
+        remap[[self._vocab[t] for t in terms]] = np.arange(len(terms), dtype=np.int32)
+        width = max((len(t) for t in terms), default=1)
+        self.terms = np.array(terms, dtype=f'U{width}')
+        del self._vocab
+
+        self.ptr, order = self._csr(remap, term_ids)
+        self.doc_ids = np.frombuffer(doc_ids, dtype=np.int32)[order]
+        self.tfs = np.frombuffer(tfs, dtype=np.int32)[order].astype(np.float32)
+        self.offsets = np.frombuffer(offsets, dtype=np.int32)[order]
+        self.title_ptr, order = self._csr(remap, title_terms)
+        self.title_docs = np.frombuffer(title_docs, dtype=np.int32)[order]
+        self.tag_ptr, order = self._csr(remap, tag_terms)
+        self.tag_docs = np.frombuffer(tag_docs, dtype=np.int32)[order]
+
+        n_docs = max(len(docs), 1)
+        doc_freq = np.diff(self.ptr).astype(np.float64)
+        self.idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avg_len = float(doc_len.mean()) if len(docs) else 0.0
+        # k1 * (1 - b + b * dl / avgdl), the per-document part of the BM25 denominator
+        self.len_norm = (k1 * (1 - b + b * doc_len / (avg_len or 1.0))).astype(np.float32)
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._vocab.get(term)
+        if term_id is None:
+            term_id = self._vocab[term] = len(self._vocab)
+        return term_id
+
+    @staticmethod
+    def _csr(remap: np.ndarray, term_ids: array):
+        """Row pointers and the stable order grouping postings by term"""
+        terms = remap[np.frombuffer(term_ids, dtype=np.int32)]
+        order = np.argsort(terms, kind='stable')
+        ptr = np.zeros(len(remap) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(remap)), out=ptr[1:])
+        return ptr, order
+
+    def __len__(self):
+        return len(self.docs)
+
+    def save(self, directory: str):
+        """Writes the index (documents included) as .npy files plus meta.json"""
+        docs = self.docs if isinstance(self.docs, _DocStore) else _DocStore.pack(self.docs)
+        arrays = dict(vars(self), doc_blob=docs.blob, doc_starts=docs.starts)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), arrays[name])
+        meta = {
+            'k1': self.k1, 'b': self.b,
+            'title_boost': self.title_boost, 'tag_boost': self.tag_boost,
+            'docs': len(docs), 'terms': len(self.terms),
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'DocsIndex':
+        """
+        Opens an index written by `save`
+        Args:
+            directory: Directory holding the .npy files
+            mmap_mode: numpy mmap mode; 'r' shares the pages with every other
+                process mapping the same files, None reads them into memory
+        Returns:
+            DocsIndex: Index whose documents are decoded on access
+        """
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        for key in ('k1', 'b', 'title_boost', 'tag_boost'):
+            setattr(index, key, meta[key])
+        arrays = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in _ARRAYS
+        }
+        index.docs = _DocStore(arrays.pop('doc_blob'), arrays.pop('doc_starts'))
+        for name, value in arrays.items():
+            setattr(index, name, value)
+        return index
+
+    def _lookup(self, term: str) -> Optional[int]:
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            return i
+        return None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Ranks documents for `query`
+        Args:
+            query: Free-text search query
+            limit: Maximum number of results
+        Returns:
+            list: Results with title, excerpt, score and doc metadata, best first
+        """
+        term_ids = {self._lookup(t) for t in tokenize(query)} - {None}
+        if not term_ids or not len(self.docs):
+            return []
+
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.ptr[term_id], self.ptr[term_id + 1]
+            docs, tfs = self.doc_ids[start:end], self.tfs[start:end]
+            scores[docs] += self.idf[term_id] * tfs * (self.k1 + 1) / (tfs + self.len_norm[docs])
+            start, end = self.title_ptr[term_id], self.title_ptr[term_id + 1]
+            scores[self.title_docs[start:end]] += self.title_boost * self.idf[term_id]
+            start, end = self.tag_ptr[term_id], self.tag_ptr[term_id + 1]
+            scores[self.tag_docs[start:end]] += self.tag_boost * self.idf[term_id]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(scores[matched], -limit)[-limit:]]
+        ranked = matched[np.argsort(-scores[matched], kind='stable')]
+
+        rare_first = sorted(term_ids, key=lambda t: -self.idf[t])
+        return [self._result(int(doc_id), float(scores[doc_id]), rare_first)
+                for doc_id in ranked]
+
+    def _first_offset(self, term_id: int, doc_id: int) -> int:
+        start, end = self.ptr[term_id], self.ptr[term_id + 1]
+        i = start + np.searchsorted(self.doc_ids[start:end], doc_id)
+        if i < end and self.doc_ids[i] == doc_id:
+            return int(self.offsets[i])
+        return -1
+
+    def _result(self, doc_id: int, score: float, rare_first: List[int]) -> Dict:
+        doc = self.docs[doc_id]
+        content = doc.get('content', '')
+        pos, term_len = 0, 0
+        for term_id in rare_first:
+            offset = self._first_offset(term_id, doc_id)
+            if offset >= 0:
+                pos = offset
+                term_len = len(_TOKEN_RE.match(content, offset).group())
+                break
+        excerpt_start = max(0, pos - 50)
+        excerpt_end = min(len(content), pos + term_len + 50)
+        excerpt = (
+            ("..." if excerpt_start > 0 else "") +
+            content[excerpt_start:excerpt_end] +
+            ("..." if excerpt_end < len(content) else "")
+        )
+        return {
+            'title': doc['title'],
+            'excerpt': excerpt,
+            'score': round(score, 4) if math.isfinite(score) else 0.0,
+            'source': doc['source'],
+            'url': doc['url'],
+            'last_updated': doc.get('updated_at', '')
+        }
@@ -0,0 +1,287 @@
+# Versioned on-disk snapshots of the internal docs index, shared by workers
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .docs_index import DocsIndex
+from .vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+
+class DocsSnapshotStore:
+    """
+    Directory of versioned DocsIndex snapshots
+
+    Layout:
+        CURRENT         name of the live version, swapped with os.replace;
+                        its mtime is the time of the last sync
+        .lock           flock held by the process rebuilding the snapshot
+        v<ns>-<pid>/    one saved DocsIndex per version, the sync state it
+                        was built with in state.json and, when
+                        `vector_options` is given, a VectorIndex in vectors/
+
+    Every worker memory-maps the live version read-only, so the page cache
+    holds a single copy of the corpus and index however many workers run.
+    Workers pick up a newly published version on their next lookup after
+    `check_interval` seconds. Readers still mapping a pruned version keep
+    working, the unlinked files stay readable until they are unmapped.
+    """
+
+    def __init__(self, directory: str, keep: int = 2, check_interval: float = 1.0,
+                 vector_options: Optional[Dict] = None):
+        self.directory = str(directory)
+        self.keep = keep
+        self.check_interval = check_interval
+        self.vector_options = vector_options
+        self._version = None
+        self._index = None
+        self._vectors = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(self._path('CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def age(self) -> float:
+        """Seconds since the last sync (inf before the first publish)"""
+        try:
+            return time.time() - os.stat(self._path('CURRENT')).st_mtime
+        except FileNotFoundError:
+            return float('inf')
+
+    def current(self, force: bool = False) -> Optional[DocsIndex]:
+        """
+        Returns the live index, mapping a new version if one was published
+        Args:
+            force: Check CURRENT now instead of after `check_interval`
+        Returns:
+            DocsIndex|None: The memory-mapped index, None before the first publish
+        """
+        now = time.monotonic()
+        if not force and self._index is not None and now - self._checked < self.check_interval:
+            return self._index
+
+        with self._lock:
+            self._checked = now
+            version = self.current_version()
+            if version is not None and version != self._version:
+                try:
+                    index = DocsIndex.load(self._path(version))
+                    vectors = self._path(os.path.join(version, 'vectors'))
+                    self._vectors = (
+                        VectorIndex.load(vectors, index.docs) if os.path.isdir(vectors) else None
+                    )
+                    self._index = index
+                    self._version = version
+                    logger.info(f"Mapped internal docs snapshot {version}")
+                except OSError as e:
+                    # Pruned between reading CURRENT and opening it; keep the old one
+                    logger.warning(f"Could not map docs snapshot {version}: {str(e)}")
+        return self._index
+
+    def current_vectors(self) -> Optional[VectorIndex]:
+        """Returns the VectorIndex of the live version, if it has one"""
+        self.current()
+        return self._vectors
+
+    def state(self) -> Dict:
+        """Sync state stored with the live version ({} when there is none)"""
+        version = self.current_version()
+        try:
+            with open(self._path(os.path.join(version, 'state.json'))) as f:
+                return json.load(f)
+        except (TypeError, FileNotFoundError):
+            return {}
+
+    def publish(self, docs: List[Dict], state: Optional[Dict] = None) -> str:
+        """
+        Builds an index over `docs` and makes it the live version
+        Args:
+            docs: The full corpus
+            state: JSON-serializable sync state kept with the version
+        Returns:
+            str: The new version name
+        """
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        staging = self._path(f".tmp-{version}")
+        os.makedirs(staging)
+        try:
+            DocsIndex(docs).save(staging)
+            if self.vector_options is not None:
+                VectorIndex.build(docs, **self.vector_options).save(
+                    os.path.join(staging, 'vectors')
+                )
+            with open(os.path.join(staging, 'state.json'), 'w') as f:
+                json.dump(state or {}, f)
+            os.rename(staging, self._path(version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = self._path(f".CURRENT-{version}")
+        with open(pointer, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, self._path('CURRENT'))
+        logger.info(f"Published internal docs snapshot {version} ({len(docs)} docs)")
+        self._prune(version)
+        return version
+
+    def _prune(self, live: str):
+        versions = sorted(d for d in os.listdir(self.directory) if d.startswith('v'))
+        for version in versions[:-self.keep]:
+            if version != live:
+                shutil.rmtree(self._path(version), ignore_errors=True)
+
+    def rebuild(self, build: Callable[[], Tuple[Optional[List[Dict]], Dict]],
+                max_age: float = 0.0, block: bool = False) -> bool:
+        """
+        Publishes the corpus returned by build() unless another process is already doing it
+        Args:
+            build: Returns (docs, state); docs None means nothing changed, the
+                live version is kept and only its sync time is bumped
+            max_age: Skip the rebuild if the last sync is younger than this
+                (another process synced while we waited for the lock)
+            block: Wait for a concurrent rebuild instead of returning
+        Returns:
+            bool: False if another process holds the rebuild lock
+        """
+        with open(self._path('.lock'), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            try:
+                if self.current_version() is None or self.age() >= max_age:
+                    docs, state = build()
+                    if docs is not None:
+                        self.publish(docs, state)
+                    elif self.current_version() is not None:
+                        os.utime(self._path('CURRENT'))
+                return True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _updated_at(doc: Dict) -> Optional[str]:
+    """
+    `updated_at` as an ISO string, so fetched docs (datetimes) compare
+    equal to the stored corpus (serialized with str())
+    """
+    value = doc.get('updated_at')
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.isoformat() if value is not None else None
+
+
+class DocsRefresher:
+    """
+    Keeps a DocsSnapshotStore fresh from a background thread
+
+    Requests only ever read the live snapshot, stale or not
+    (stale-while-revalidate); the thread re-syncs it every `interval`
+    seconds. Every worker runs a refresher, the store's rebuild lock makes
+    sure a single one does the work.
+
+    Syncs are incremental: `fetch(since)` is asked for the documents updated
+    since the previous sync, and they replace (by url) or extend the current
+    corpus. Docs whose `updated_at` did not change are ignored, and nothing
+    is rebuilt when no doc changed. Deletions are only seen by the full sync
+    (`fetch(None)`) done every `full_interval` seconds.
+    """
+
+    def __init__(self, store: DocsSnapshotStore,
+                 fetch: Callable[[Optional[datetime]], List[Dict]],
+                 interval: float = 900, full_interval: float = 86400):
+        self.store = store
+        self.fetch = fetch
+        self.interval = interval
+        self.full_interval = full_interval
+        self.synced = threading.Event()  # set after each sync attempt
+        self._wake = threading.Event()
+        self._full_requested = False
+        self._stopped = False
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='docs-refresher', daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def request_full_sync(self):
+        """Asks the thread for a full sync now, without waiting for it"""
+        self._full_requested = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.clear()
+            full, self._full_requested = self._full_requested, False
+            age = self.store.age()
+            if full or age >= self.interval:
+                try:
+                    self.refresh(full=full)
+                except Exception as e:
+                    logger.error(f"Internal docs refresh failed: {str(e)}", exc_info=True)
+                self.synced.set()
+                age = self.store.age()
+            # Wake up when the snapshot is due (another process may sync it first)
+            self._wake.wait(timeout=min(self.interval, max(1.0, self.interval - age)))
+
+    def refresh(self, full: bool = False) -> bool:
+        """Syncs the snapshot now; False if another process is already syncing"""
+        return self.store.rebuild(
+            lambda: self._build(full), max_age=0 if full else self.interval
+        )
+
+    def _build(self, full: bool) -> Tuple[Optional[List[Dict]], Dict]:
+        now = datetime.now(timezone.utc)
+        state = self.store.state()
+        index = self.store.current(force=True)
+        last_full = datetime.fromisoformat(state.get('full_sync_at', '1970-01-01T00:00:00+00:00'))
+
+        if full or index is None or now - last_full >= timedelta(seconds=self.full_interval):
+            docs = self.fetch(None)
+            logger.info(f"Full internal docs sync: {len(docs)} docs")
+            return docs, {'synced_at': now.isoformat(), 'full_sync_at': now.isoformat()}
+
+        # `since` only advances when a new version is published, so a sync
+        # that found nothing keeps asking from the same point
+        corpus = {doc['url']: doc for doc in index.docs}
+        changed = [
+            doc for doc in self.fetch(datetime.fromisoformat(state['synced_at']))
+            if doc['url'] not in corpus
+            or _updated_at(corpus[doc['url']]) != _updated_at(doc)
+        ]
+        logger.info(f"Incremental internal docs sync: {len(changed)} changed docs")
+        if not changed:
+            return None, state
+        corpus.update((doc['url'], doc) for doc in changed)
+        return list(corpus.values()), dict(state, synced_at=now.isoformat())
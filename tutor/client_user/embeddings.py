@@ -0,0 +1,75 @@
+# Local, offline text embeddings (no model download, no network)
+import re
+import zlib
+from typing import Iterable, List
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+# Function words and the ways learners phrase a question; dropped so that
+# "what is gravity?" and "can you explain gravity" embed the same
+STOP_WORDS = frozenset("""
+a an the and or of to in on at for with by from as is are was were be been
+being it its this that these those i me my you your we our do does did can
+could would should will shall may might must please tell explain describe
+define definition meaning mean means what whats what's which who whom how
+why when where about give show help understand know want need like some any
+just really more also there here so work works happen happens
+""".split())
+
+
+def _stem(word: str) -> str:
+    """Very light suffix stripping so plurals and -ing forms share features"""
+    for suffix in ('ing', 'ies', 'es', 's'):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[:-len(suffix)] + ('y' if suffix == 'ies' else '')
+    return word
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing text embedder
+
+    Each content word (stop words removed, lightly stemmed) and each of its
+    character n-grams is hashed with crc32, which is stable across processes,
+    into a signed `dim`-dimensional bag; the vector is L2-normalized so a dot
+    product is the cosine similarity. The n-grams give partial credit to
+    spelling variants and compounds.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 3, ngram_weight: float = 0.3,
+                 stop_words: Iterable[str] = STOP_WORDS):
+        self.dim = dim
+        self.ngram = ngram
+        self.ngram_weight = ngram_weight
+        self.stop_words = frozenset(stop_words)
+
+    def features(self, text: str) -> List[tuple]:
+        """(feature, weight) pairs of `text`"""
+        features = []
+        for word in _WORD_RE.findall(text.lower()):
+            if len(word) < 2 or word in self.stop_words:
+                continue
+            word = _stem(word)
+            features.append((word, 1.0))
+            padded = f"<{word}>"
+            for i in range(len(padded) - self.ngram + 1):
+                features.append((f"#{padded[i:i + self.ngram]}", self.ngram_weight))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        """Unit-length float32 vector of `text` (all zeros if it has no content words)"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_batch(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self.embed(text)
+        return matrix
@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# One small pool per source name, shared by every request of the process.
+# A timed out call keeps its thread until it returns, so a hung source can
+# only use up its own threads; its later calls queue and time out while the
+# other sources keep running.
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(name: str) -> ThreadPoolExecutor:
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'KNOWLEDGE_FANOUT_WORKERS_PER_SOURCE', 4),
+                thread_name_prefix=f'knowledge-fanout-{name}',
+            )
+        return _executors[name]
+
+OK = 'ok'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+SKIPPED = 'skipped'
+
+
+@dataclass
+class SourceResult:
+    """Outcome of one source call in a fan-out"""
+    name: str
+    status: str
+    value: Any = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+def fan_out(
+    calls: Dict[str, Callable[[], Any]],
+    deadline: float,
+    source_deadlines: Optional[Dict[str, float]] = None,
+    stop_when: Optional[Callable[[Dict[str, SourceResult]], bool]] = None,
+) -> Dict[str, SourceResult]:
+    """
+    Runs every call concurrently and waits at most `deadline` seconds
+    Args:
+        calls: Source name -> zero-argument callable
+        deadline: Global deadline in seconds
+        source_deadlines: Optional tighter deadline per source name
+        stop_when: Optional predicate over the results collected so far (in
+            completion order); once it returns True the remaining sources
+            are reported as 'skipped'
+    Returns:
+        dict: Source name -> SourceResult, in the order of `calls`. Sources
+        still running at their deadline are reported as 'timeout' and their
+        late results are discarded.
+    """
+    source_deadlines = source_deadlines or {}
+    start = time.monotonic()
+    futures = {_executor(name).submit(call): name for name, call in calls.items()}
+    limits = {
+        name: start + min(deadline, source_deadlines.get(name, deadline))
+        for name in calls
+    }
+    results = {}
+
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        for future in [f for f in pending if limits[futures[f]] <= now]:
+            name = futures[future]
+            future.cancel()
+            pending.discard(future)
+            results[name] = SourceResult(name, TIMEOUT, elapsed=now - start)
+            logger.warning(f"Knowledge source '{name}' timed out")
+        if not pending:
+            break
+
+        next_limit = min(limits[futures[f]] for f in pending)
+        done, pending = wait(
+            pending, timeout=max(0.0, next_limit - now), return_when=FIRST_COMPLETED
+        )
+        for future in done:
+            name = futures[future]
+            elapsed = time.monotonic() - start
+            try:
+                results[name] = SourceResult(name, OK, future.result(), elapsed=elapsed)
+            except Exception as e:
+                logger.error(f"Knowledge source '{name}' failed: {str(e)}")
+                results[name] = SourceResult(name, ERROR, error=str(e), elapsed=elapsed)
+
+        if pending and stop_when is not None and stop_when(results):
+            for future in pending:
+                future.cancel()
+                results[futures[future]] = SourceResult(futures[future], SKIPPED)
+            break
+
+    return {name: results[name] for name in calls}
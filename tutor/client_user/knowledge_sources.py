@@ -1,18 +1,67 @@
 # django_app/knowledge_sources.py
+import asyncio
+import weakref
+import httpx
 import requests
 import logging
 from django.conf import settings
 from typing import List, Dict, Optional
 from urllib.parse import quote
-import time
+from datetime import datetime
+import threading
+
+from .docs_snapshot import DocsRefresher, DocsSnapshotStore
+from .embeddings import HashingEmbedder
 
 logger = logging.getLogger(__name__)
 
-# Cache structure for internal docs
-_internal_docs_cache = {
-    'last_updated': 0,
-    'docs': []
-}
+# Must match the embedder the snapshot's VectorIndex was built with
+_embedder = HashingEmbedder()
+
+# Background refreshers of the internal docs snapshot, by snapshot directory
+_docs_refreshers = {}
+_docs_refreshers_lock = threading.Lock()
+
+def _docs_refresher() -> DocsRefresher:
+    """Returns this process' refresher for the configured snapshot, starting it if needed"""
+    directory = str(settings.INTERNAL_DOCS_SNAPSHOT_DIR)
+    with _docs_refreshers_lock:
+        refresher = _docs_refreshers.get(directory)
+        if refresher is None:
+            vector_options = None
+            if getattr(settings, 'INTERNAL_DOCS_VECTORS', True):
+                vector_options = {
+                    'ivf_lists': getattr(settings, 'INTERNAL_DOCS_IVF_LISTS', 0),
+                    'nprobe': getattr(settings, 'INTERNAL_DOCS_IVF_PROBES', 8),
+                    'int8': getattr(settings, 'INTERNAL_DOCS_INT8_VECTORS', False),
+                }
+            refresher = _docs_refreshers[directory] = DocsRefresher(
+                DocsSnapshotStore(directory, vector_options=vector_options),
+                lambda since: _fetch_all_internal_docs(since),
+                interval=getattr(settings, 'INTERNAL_DOCS_REFRESH_INTERVAL', 900),
+                full_interval=getattr(settings, 'INTERNAL_DOCS_FULL_SYNC_INTERVAL', 86400),
+            )
+            refresher.start()
+    return refresher
+
+# Pooled client of aget_wikipedia_summary, configured once. Its connections
+# belong to the event loop that opened them, so there is one per loop (a
+# single one under the ASGI server).
+_wikipedia_clients = weakref.WeakKeyDictionary()
+
+def _wikipedia_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _wikipedia_clients.get(loop)
+    if client is None:
+        client = _wikipedia_clients[loop] = httpx.AsyncClient(
+            headers={"User-Agent": f"{settings.APP_NAME}/1.0"},
+            timeout=2,  # Fail fast
+            limits=httpx.Limits(
+                max_connections=getattr(settings, 'WIKIPEDIA_MAX_CONNECTIONS', 20),
+                max_keepalive_connections=getattr(settings, 'WIKIPEDIA_MAX_KEEPALIVE', 10),
+            ),
+        )
+    return client
 
 def get_wikipedia_summary(query: str, lang: str = "en") -> Optional[str]:
     """
@@ -50,71 +99,81 @@ def get_wikipedia_summary(query: str, lang: str = "en") -> Optional[str]:
         logger.error(f"Unexpected Wikipedia error: {str(e)}", exc_info=True)
         return None
 
+async def aget_wikipedia_summary(query: str, lang: str = "en") -> Optional[str]:
+    """
+    Async variant of get_wikipedia_summary for async views
+    Args:
+        query: Search term
+        lang: Language code (default 'en')
+    Returns:
+        str|None: Extracted summary or None if not found
+    """
+    try:
+        url = f"https://{lang}.wikipedia.org/api/rest_v1/page/summary/{quote(query)}"
+
+        response = await _wikipedia_client().get(url)
+
+        if response.status_code == 200:
+            return response.json().get('extract')
+
+        # Handle disambiguation pages
+        if response.status_code == 404 and 'may refer to' in response.text:
+            return f"Multiple topics match '{query}'. Please be more specific."
+
+        return None
+
+    except httpx.HTTPError as e:
+        logger.warning(f"Wikipedia query failed: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected Wikipedia error: {str(e)}", exc_info=True)
+        return None
+
 def search_internal_docs(query: str, refresh_cache: bool = False) -> List[Dict]:
     """
     Searches internal documentation systems
     Args:
         query: Search term
-        refresh_cache: Force cache refresh
+        refresh_cache: Ask for a full resync in the background
     Returns:
         list: Matching documents with title, excerpt, and metadata
     """
     try:
-        # Check cache first (refresh every 15 minutes)
-        if not refresh_cache and time.time() - _internal_docs_cache['last_updated'] < 900:
-            docs = _internal_docs_cache['docs']
-        else:
-            docs = _fetch_all_internal_docs()
-            _internal_docs_cache.update({
-                'docs': docs,
-                'last_updated': time.time()
-            })
-        
-        # Simple case-insensitive search (replace with proper search backend)
-        query_lower = query.lower()
-        results = []
-        
-        for doc in docs:
-            # Basic relevance scoring
-            score = 0
-            if query_lower in doc['title'].lower():
-                score += 3
-            if query_lower in doc['content'].lower():
-                score += 1
-            if any(query_lower in tag.lower() for tag in doc.get('tags', [])):
-                score += 2
-                
-            if score > 0:
-                # Generate excerpt
-                content = doc['content']
-                pos = content.lower().find(query_lower)
-                excerpt_start = max(0, pos - 50)
-                excerpt_end = min(len(content), pos + len(query) + 50)
-                excerpt = (
-                    ("..." if excerpt_start > 0 else "") +
-                    content[excerpt_start:excerpt_end] +
-                    ("..." if excerpt_end < len(content) else "")
-                )
-                
-                results.append({
-                    'title': doc['title'],
-                    'excerpt': excerpt,
-                    'score': score,
-                    'source': doc['source'],
-                    'url': doc['url'],
-                    'last_updated': doc.get('updated_at', '')
-                })
-        
-        # Sort by relevance
-        return sorted(results, key=lambda x: x['score'], reverse=True)[:10]
+        # The corpus and its index live in a snapshot memory-mapped by every
+        # worker. It is kept fresh by a background thread, so requests
+        # always answer from the current (possibly stale) version and
+        # find nothing until the first sync has finished.
+        refresher = _docs_refresher()
+        if refresh_cache:
+            refresher.request_full_sync()
+        index = refresher.store.current()
+
+        return index.search(query, limit=10) if index is not None else []
         
     except Exception as e:
         logger.error(f"Internal docs search failed: {str(e)}", exc_info=True)
         return []
 
-def _fetch_all_internal_docs() -> List[Dict]:
+def search_internal_vectors(query: str, limit: int = 10) -> Dict:
+    """
+    Dense retrieval over the internal docs, a knowledge source of get_system_data
+    Args:
+        query: Search query
+        limit: Maximum number of documents
+    Returns:
+        dict: {"results": [...]} best matching chunk per document, shaped like
+        search_internal_docs results
+    """
+    vectors = _docs_refresher().store.current_vectors()
+    if vectors is None:
+        return {'results': []}
+    return {'results': vectors.search(_embedder.embed(query), limit=limit)}
+
+def _fetch_all_internal_docs(since: Optional[datetime] = None) -> List[Dict]:
     """
     Fetches documents from all configured internal sources
+    Args:
+        since: Only documents updated after this time (None for all of them)
     Returns:
         list: Combined documents from all sources
     """
@@ -123,7 +182,7 @@ def _fetch_all_internal_docs() -> List[Dict]:
     # Example source 1: Confluence
     if hasattr(settings, 'CONFLUENCE_API_URL'):
         try:
-            confluence_docs = _get_confluence_docs()
+            confluence_docs = _get_confluence_docs(since)
             sources.extend(confluence_docs)
         except Exception as e:
             logger.error(f"Confluence fetch failed: {str(e)}")
@@ -131,8 +190,8 @@ def _fetch_all_internal_docs() -> List[Dict]:
     # Example source 2: Google Drive
     if hasattr(settings, 'GOOGLE_DRIVE_FOLDER_ID'):
         try:
-            drive_docs = _get_google_drive_docs()
-            sources.extend(drive_drive_docs)
+            drive_docs = _get_google_drive_docs(since)
+            sources.extend(drive_docs)
         except Exception as e:
             logger.error(f"Google Drive fetch failed: {str(e)}")
     
@@ -140,18 +199,22 @@ def _fetch_all_internal_docs() -> List[Dict]:
     return sources
 
 # Example source-specific functions (implement according to your needs)
-def _get_confluence_docs() -> List[Dict]:
-    """Fetch documents from Confluence API"""
+def _get_confluence_docs(since: Optional[datetime] = None) -> List[Dict]:
+    """Fetch documents from Confluence API, only those updated after `since` if given"""
     # Implementation example:
+    # cql = 'type=page'
+    # if since:
+    #     cql += f' and lastmodified >= "{since:%Y-%m-%d %H:%M}"'
     # response = requests.get(
     #     f"{settings.CONFLUENCE_API_URL}/rest/api/content/search",
-    #     params={'cql': 'type=page'},
+    #     params={'cql': cql},
     #     auth=(settings.CONFLUENCE_USER, settings.CONFLUENCE_API_KEY)
     # )
     # ... parse response ...
     return []  # Return actual docs in your implementation
 
-def _get_google_drive_docs() -> List[Dict]:
-    """Fetch documents from Google Drive API"""
-    # Implementation would use Google Drive API
+def _get_google_drive_docs(since: Optional[datetime] = None) -> List[Dict]:
+    """Fetch documents from Google Drive API, only those updated after `since` if given"""
+    # Implementation would use Google Drive API, with
+    # q=f"modifiedTime > '{since.isoformat()}'" for incremental syncs
     return []
\ No newline at end of file
@@ -0,0 +1,276 @@
+# Pooled, concurrency-limited client of the Ollama server
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Worth another attempt: the server is busy, restarting or loading the model
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class LLMError(Exception):
+    """The LLM server failed or rejected the request"""
+
+
+class LLMTimeout(LLMError):
+    """No answer (or no free slot) before the deadline"""
+
+
+@dataclass
+class LLMStats:
+    requests: int = 0
+    retries: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    in_flight: int = 0
+    waiting: int = 0  # requests queued for a slot right now
+    max_waiting: int = 0
+    wait_seconds: float = 0.0  # total time spent queued for a slot
+    keepalive_pings: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), wait_seconds=round(self.wait_seconds, 3))
+
+
+class OllamaClient:
+    """
+    Client of Ollama's /api/generate shared by every caller of a process
+
+    * Connections are pooled in one requests.Session, no TCP/HTTP setup
+      per call.
+    * At most `max_concurrency` generations run at a time; the others
+      queue for a slot (a bounded semaphore), so parallel summaries don't
+      thrash the model. Queue depth and wait times are in `stats`.
+    * Every request asks Ollama to keep the model loaded for `keep_alive`,
+      `warm_up` loads it ahead of the first request and, with
+      `keepalive_interval`, a daemon thread re-sends that ping so an idle
+      server does not unload it.
+    * Connection errors, timeouts and 429/5xx answers are retried with
+      exponential backoff until `deadline` seconds after the call, queueing
+      included. A stream is only retried before its first token.
+    """
+
+    def __init__(self, base_url: str = 'http://localhost:11434', model: str = 'llama2',
+                 max_concurrency: int = 2, keep_alive: str = '30m',
+                 keepalive_interval: float = 0, timeout: float = 300,
+                 connect_timeout: float = 5, deadline: float = 600,
+                 retries: int = 3, backoff: float = 0.5, pool_size: int = 10):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.keep_alive = keep_alive
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._reset()
+        # A forked process (precompute_weekly_summaries' pool) gets its own
+        # connections, slots and stats instead of sharing the parent's sockets
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._reset())
+
+    def _reset(self):
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = requests.Session()
+        for prefix in ('http://', 'https://'):
+            self._session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        self._lock = threading.Lock()
+        self._pinger = None
+        self._stopped = threading.Event()
+        self._stats = LLMStats()
+
+    @property
+    def stats(self) -> LLMStats:
+        return self._stats
+
+    def _payload(self, prompt: str, stream: bool) -> Dict:
+        return {"model": self.model, "prompt": prompt, "stream": stream,
+                "keep_alive": self.keep_alive}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self._stats, name, getattr(self._stats, name) + delta)
+            self._stats.max_waiting = max(self._stats.max_waiting, self._stats.waiting)
+
+    def _acquire(self, deadline: float):
+        self._count(waiting=1)
+        start = time.monotonic()
+        acquired = self._slots.acquire(timeout=max(0.0, deadline - start))
+        self._count(waiting=-1, wait_seconds=time.monotonic() - start)
+        if not acquired:
+            self._count(timeouts=1)
+            raise LLMTimeout("No free LLM slot before the deadline")
+        self._count(in_flight=1)
+
+    def _release(self):
+        self._count(in_flight=-1)
+        self._slots.release()
+
+    def _post(self, payload: Dict, deadline: float, stream: bool = False) -> requests.Response:
+        """POSTs to /api/generate, retrying until `deadline`"""
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._count(timeouts=1)
+                raise LLMTimeout("LLM request deadline exceeded")
+            error = None
+            try:
+                response = self._session.post(
+                    f"{self.base_url}/api/generate", json=payload, stream=stream,
+                    timeout=(min(self.connect_timeout, remaining), min(self.timeout, remaining)),
+                )
+                if response.status_code < 400:
+                    return response
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    self._count(failures=1)
+                    raise LLMError(error)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+
+            attempt += 1
+            delay = self.backoff * 2 ** (attempt - 1)
+            if attempt > self.retries or time.monotonic() + delay >= deadline:
+                self._count(failures=1)
+                raise LLMError(f"LLM request failed after {attempt} attempts: {error}")
+            logger.warning(f"LLM request failed ({error}), retrying in {delay:.1f}s")
+            self._count(retries=1)
+            time.sleep(delay)
+
+    def generate(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        Completion of `prompt`
+        Args:
+            deadline: Seconds allowed, queueing and retries included
+                (default `self.deadline`)
+        Raises:
+            LLMError: The server failed, LLMTimeout past the deadline
+        """
+        self._start_pinger()
+        deadline = time.monotonic() + (deadline or self.deadline)
+        self._acquire(deadline)
+        try:
+            self._count(requests=1)
+            response = self._post(self._payload(prompt, False), deadline)
+            return response.json()['response']
+        finally:
+            self._release()
+
+    def stream(self, prompt: str, deadline: Optional[float] = None) -> Iterator[str]:
+        """Streamed variant of `generate`, yields the completion piece by piece"""
+        self._start_pinger()
+        deadline = time.monotonic() + (deadline or self.deadline)
+        self._acquire(deadline)
+        try:
+            self._count(requests=1)
+            with self._post(self._payload(prompt, True), deadline, stream=True) as response:
+                # One JSON object per line, the last one has "done": true
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        self._count(failures=1)
+                        raise LLMError(f"Ollama error: {chunk['error']}")
+                    if chunk.get('response'):
+                        yield chunk['response']
+                    if chunk.get('done'):
+                        return
+        except requests.RequestException as e:
+            self._count(failures=1)
+            raise LLMError(f"LLM stream interrupted: {str(e)}") from e
+        finally:
+            self._release()
+
+    async def agenerate(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """`generate` for async callers (runs in a worker thread)"""
+        return await sync_to_async(self.generate, thread_sensitive=False)(prompt, deadline)
+
+    async def astream(self, prompt: str, deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """`stream` for async callers; closing or cancelling it early frees the slot"""
+        tokens = self.stream(prompt, deadline)
+        next_token = sync_to_async(next, thread_sensitive=False)
+        pending = None
+        try:
+            while True:
+                # Shielded: a cancelled caller must not abandon the next() still
+                # running in its thread
+                pending = asyncio.ensure_future(next_token(tokens, None))
+                token = await asyncio.shield(pending)
+                pending = None
+                if token is None:
+                    return
+                yield token
+        finally:
+            if pending is not None:
+                # A generator cannot be closed while next() is executing it
+                with contextlib.suppress(Exception):
+                    await asyncio.shield(pending)
+            await sync_to_async(tokens.close, thread_sensitive=False)()
+
+    def warm_up(self) -> bool:
+        """
+        Loads the model (an empty prompt generates nothing) and resets its
+        keep-alive timer; does not take a slot
+        Returns:
+            bool: False if the server could not be reached
+        """
+        try:
+            self._session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "prompt": "", "keep_alive": self.keep_alive},
+                timeout=(self.connect_timeout, self.timeout),
+            ).raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"LLM warm-up of {self.model} failed: {str(e)}")
+            return False
+        self._count(keepalive_pings=1)
+        return True
+
+    def _start_pinger(self):
+        if not self.keepalive_interval or self._pinger is not None:
+            return
+        with self._lock:
+            if self._pinger is not None:
+                return
+            self._pinger = threading.Thread(target=self._ping, name='llm-keepalive', daemon=True)
+        self._pinger.start()
+
+    def _ping(self):
+        while not self._stopped.wait(self.keepalive_interval):
+            self.warm_up()
+
+    def close(self):
+        self._stopped.set()
+        self._session.close()
+
+
+ollama = OllamaClient(
+    base_url=getattr(settings, 'OLLAMA_URL', 'http://localhost:11434'),
+    model=getattr(settings, 'OLLAMA_MODEL', 'llama2'),
+    max_concurrency=getattr(settings, 'OLLAMA_MAX_CONCURRENCY', 2),
+    keep_alive=getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m'),
+    keepalive_interval=getattr(settings, 'OLLAMA_KEEPALIVE_INTERVAL', 0),
+    timeout=getattr(settings, 'OLLAMA_TIMEOUT', 300),
+    deadline=getattr(settings, 'OLLAMA_DEADLINE', 600),
+    retries=getattr(settings, 'OLLAMA_RETRIES', 3),
+)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from client_user.archive import archive_cutoff, archive_interactions
+
+
+class Command(BaseCommand):
+    help = ("Moves the interactions of months past INTERACTION_ARCHIVE_AFTER_MONTHS into "
+            "compressed archive blobs (run monthly)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=None,
+                            help="Months kept in the table besides the current one")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Max interactions per archive blob")
+
+    def handle(self, *args, **options):
+        keep = options['keep_months']
+        if keep is None:
+            keep = getattr(settings, 'INTERACTION_ARCHIVE_AFTER_MONTHS', 3)
+        before = archive_cutoff(keep)
+        stats = archive_interactions(
+            before, options['batch_size'] or getattr(settings, 'INTERACTION_ARCHIVE_BATCH', 5000)
+        )
+        self.stdout.write(
+            f"Archived {stats.interactions} interactions before {before:%Y-%m-%d} "
+            f"({stats.months} user-months, {stats.raw_bytes // 1024} KB -> "
+            f"{stats.stored_bytes // 1024} KB)"
+        )
@@ -0,0 +1,70 @@
+import signal
+import threading
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from client_user.llm import ollama
+from client_user.precompute import Checkpoint, precompute_weekly_summaries
+from client_user.summary_jobs import current_week
+
+
+class Command(BaseCommand):
+    help = ("Precomputes the weekly summary of every user with interactions in the week, "
+            "so generate-weekly-summary requests are plain lookups (run nightly)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--week', default=None,
+                            help="Any day (YYYY-MM-DD) of the week to summarize, default this week")
+        parser.add_argument('--processes', type=int, default=None,
+                            help="Size of the process pool, 0 to run in this process")
+        parser.add_argument('--rate', type=float, default=None,
+                            help="Max LLM requests per second over all processes, 0 for no limit")
+        parser.add_argument('--checkpoint', default=None,
+                            help="Progress file, default one per week in SUMMARY_PRECOMPUTE_DIR")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the progress of an interrupted run")
+
+    def handle(self, *args, **options):
+        try:
+            day = date.fromisoformat(options['week']) if options['week'] else None
+        except ValueError:
+            raise CommandError("--week must be a date (YYYY-MM-DD)")
+        start, end = current_week(day)
+        directory = getattr(settings, 'SUMMARY_PRECOMPUTE_DIR',
+                            settings.BASE_DIR / 'var' / 'precompute')
+        checkpoint = Checkpoint(
+            options['checkpoint'] or Path(directory) / f'weekly-{start}.jsonl', start
+        )
+        stop = threading.Event()
+
+        def interrupt(signum, frame):
+            self.stderr.write("Stopping after the running users, rerun to resume")
+            stop.set()
+
+        previous = {sig: signal.signal(sig, interrupt) for sig in (signal.SIGTERM, signal.SIGINT)}
+        ollama.warm_up()
+        try:
+            stats = precompute_weekly_summaries(
+                start, end, checkpoint,
+                processes=self._option(options, 'processes', 'SUMMARY_PRECOMPUTE_PROCESSES', 4),
+                rate=self._option(options, 'rate', 'SUMMARY_PRECOMPUTE_RATE', 0),
+                resume=not options['restart'],
+                stop=stop,
+            )
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(
+            f"Week {start} - {end}: summarized {stats.summarized} users, "
+            f"{stats.unchanged} unchanged, {stats.resumed} done by an earlier run, "
+            f"{stats.failed} failed"
+        )
+        if stats.failed or stop.is_set():
+            self.stdout.write(f"Progress saved to {checkpoint.path}, rerun to resume")
+
+    @staticmethod
+    def _option(options, name, setting, default):
+        return options[name] if options[name] is not None else getattr(settings, setting, default)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from client_user.rollups import RollupSummarizer
+from client_user.utils import summarize_with_llama2
+
+
+class Command(BaseCommand):
+    help = "Regenerates the dirty day/week/month rollup summaries (run after midnight)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default=None, help="Only this username")
+        parser.add_argument('--include-open', action='store_true',
+                            help="Also periods that have not ended yet (today, this week...)")
+
+    def handle(self, *args, **options):
+        before = None if options['include_open'] else timezone.localdate()
+        rebuilt = RollupSummarizer(summarize_with_llama2).refresh_dirty(
+            before=before, username=options['user']
+        )
+        self.stdout.write(f"Rebuilt {rebuilt} rollup summaries")
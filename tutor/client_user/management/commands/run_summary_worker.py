@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from client_user.llm import ollama
+from client_user.summary_jobs import summary_worker
+
+
+class Command(BaseCommand):
+    help = "Runs queued summary generation jobs (run one or more next to the web server)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when the queue is empty")
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help="Exit after running this many jobs")
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help="Seconds between checks of an empty queue")
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options['poll_interval'] is not None:
+            overrides['poll_interval'] = options['poll_interval']
+        worker = summary_worker(**overrides)
+
+        def stop(signum, frame):
+            self.stderr.write("Stopping after the current job")
+            worker.stop()
+
+        previous = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+        self.stdout.write(f"Summary worker {worker.name} started")
+        # Load the model now rather than on the first job
+        ollama.warm_up()
+        try:
+            processed = worker.run(once=options['once'], max_jobs=options['max_jobs'])
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(f"Ran {processed} summary jobs")
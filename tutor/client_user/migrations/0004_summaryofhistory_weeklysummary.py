@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_user', '0003_rename_input_text_interactionhistory_username'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryOfHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('summary', models.JSONField(default=dict)),
+                ('create_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeeklySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('summary', models.JSONField(default=dict)),
+                ('create_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 18:41
+
+import calendar
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def create_dirty_rollups(apps, schema_editor):
+    """Rollup nodes, all dirty, for every day that already has interactions"""
+    InteractionHistory = apps.get_model('client_user', 'InteractionHistory')
+    SummaryOfHistory = apps.get_model('client_user', 'SummaryOfHistory')
+    days = (InteractionHistory.objects.exclude(username__isnull=True).exclude(username='')
+            .annotate(day=TruncDate('timestamp')).values_list('username', 'day').distinct())
+    periods = set()
+    for username, day in days.iterator():
+        week = day - timedelta(days=day.weekday())
+        month_end = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+        periods.update([
+            (username, 'day', day, day),
+            (username, 'week', week, week + timedelta(days=6)),
+            (username, 'month', day.replace(day=1), month_end),
+        ])
+    SummaryOfHistory.objects.bulk_create([
+        SummaryOfHistory(username=username, granularity=granularity,
+                         period_start=start, period_end=end, dirty=True)
+        for username, granularity, start, end in periods
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_user', '0005_summaryjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summaryofhistory',
+            name='dirty',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='summaryofhistory',
+            name='granularity',
+            field=models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], default='day', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='summaryofhistory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='summaryofhistory',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='summaryofhistory',
+            index=models.Index(fields=['dirty', 'granularity'], name='client_user_dirty_65ab4a_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='summaryofhistory',
+            constraint=models.UniqueConstraint(fields=('username', 'granularity', 'period_start'), name='unique_rollup_period'),
+        ),
+        migrations.RunPython(create_dirty_rollups, migrations.RunPython.noop),
+    ]
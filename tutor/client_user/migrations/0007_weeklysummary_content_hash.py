@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_user', '0006_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklysummary',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 19:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_user', '0007_weeklysummary_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.TextField(blank=True, null=True)),
+                ('month', models.DateField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interaction_archives', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['username', 'last_timestamp'], name='client_user_usernam_e53a0e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 19:11
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicate_summaries(apps, schema_editor):
+    """Keeps the latest WeeklySummary of each user and period, so the unique constraint applies"""
+    WeeklySummary = apps.get_model('client_user', 'WeeklySummary')
+    duplicated = (WeeklySummary.objects.values('username', 'period_start', 'period_end')
+                  .annotate(rows=Count('id'), latest=Max('id')).filter(rows__gt=1))
+    for period in duplicated.iterator():
+        WeeklySummary.objects.filter(
+            username=period['username'], period_start=period['period_start'],
+            period_end=period['period_end'],
+        ).exclude(id=period['latest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('client_user', '0008_interactionarchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interactionhistory',
+            index=models.Index(fields=['username', 'timestamp'], name='client_user_usernam_4b0523_idx'),
+        ),
+        migrations.RunPython(drop_duplicate_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='weeklysummary',
+            constraint=models.UniqueConstraint(fields=('username', 'period_start', 'period_end'), name='unique_weekly_summary_period'),
+        ),
+    ]
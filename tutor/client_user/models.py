@@ -1,6 +1,14 @@
+import heapq
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import JSONField
+from django.utils.dateparse import parse_datetime
 
 class WeeklySummary(models.Model):
     """Stores weekly summary data"""
@@ -10,6 +18,17 @@ class WeeklySummary(models.Model):
     period_end = models.DateField()
     summary = models.JSONField(default=dict)
     create_at = models.DateTimeField(auto_now_add=True)
+    # rollups.summary_content_hash of the interactions it was built from
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['username', 'period_start', 'period_end'],
+                name='unique_weekly_summary_period',
+            ),
+        ]
+
 class User(AbstractUser):
     """Extended user model with persona data"""
     persona_data = JSONField(default=dict, blank=True)  # Stores user preferences, characteristics
@@ -20,21 +39,87 @@ class User(AbstractUser):
     
     def get_latest_achievement(self):
         """Get most recent unlocked achievement"""
-        return self.achievements.filter(is_new=True).first()
+        return self.user_achievements.order_by('-created_at').first()
     
     def get_persona_context(self):
         """Formats user data for LLM context"""
+        achievement = self.get_latest_achievement()
         return {
             "preferences": self.persona_data,
             "recent_interactions": [i.agent_response for i in self.get_recent_interactions()],
-            "current_achievement": self.get_latest_achievement().details if self.get_latest_achievement() else None
+            "current_achievement": {
+                "title": achievement.title,
+                "description": achievement.description,
+            } if achievement else None
         }
     
     class Meta:
         verbose_name = "Voice Assistant User"
         verbose_name_plural = "Voice Assistant Users"
+class InteractionHistoryManager(models.Manager):
+    """
+    Reads of the history that also cover the months moved to
+    InteractionArchive by `manage.py archive_interactions`
+
+    The table only keeps recent months, so queries of recent interactions
+    stay as fast however long the history grows; a time range reaching
+    into archived months is routed to their compressed blobs as well.
+    """
+
+    def between(self, start: datetime, end: datetime, username: Optional[str] = None,
+                fields: Optional[Iterable[str]] = None, exclude_types: Iterable[str] = (),
+                chunk_size: int = 2000) -> Iterator['InteractionHistory']:
+        """
+        Interactions with start <= timestamp < end, by timestamp
+        Args:
+            username: Only this user's interactions
+            fields: Only load these fields of the rows still in the table
+                (archived blobs are always decoded whole)
+            exclude_types: Leave out rows with these metadata "type"s
+        """
+        exclude_types = list(exclude_types)
+        live = self.filter(timestamp__gte=start, timestamp__lt=end)
+        if username is not None:
+            live = live.filter(username=username)
+        if exclude_types:
+            # has_key: NOT (NULL IN ...) would drop the rows without a type
+            live = live.exclude(metadata__has_key='type', metadata__type__in=exclude_types)
+        if fields:
+            live = live.only('timestamp', *fields)
+
+        def wanted(row):
+            return (start <= row.timestamp < end
+                    and not (isinstance(row.metadata, dict)
+                             and row.metadata.get('type') in exclude_types))
+
+        archived = [
+            sorted(filter(wanted, archive.rows()), key=lambda row: (row.timestamp, row.id))
+            for archive in InteractionArchive.objects.overlapping(start, end, username)
+        ]
+        return heapq.merge(
+            live.order_by('timestamp', 'id').iterator(chunk_size=chunk_size),
+            *archived,
+            key=lambda row: (row.timestamp, row.id),
+        )
+
+    def usernames_between(self, start: datetime, end: datetime) -> List[str]:
+        """Usernames with interactions in start <= timestamp < end, sorted"""
+        # order_by(): the default ordering would make DISTINCT per row
+        usernames = set(self.filter(timestamp__gte=start, timestamp__lt=end).order_by()
+                        .values_list('username', flat=True).distinct())
+        usernames.update(InteractionArchive.objects.overlapping(start, end).order_by()
+                         .values_list('username', flat=True).distinct())
+        usernames.discard(None)
+        return sorted(usernames)
+
+
 class InteractionHistory(models.Model):
     """Stores all user-agent interactions"""
+
+    # metadata "type" of the knowledge view's audit rows: not part of the
+    # conversation, so never summarized
+    AUDIT_TYPES = ('cached_knowledge', 'knowledge_query')
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interactions')
     session_id = models.CharField(max_length=255)  # Matches LiveKit session
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -43,13 +128,68 @@ class InteractionHistory(models.Model):
     agent_response = models.TextField()
     response_audio_url = models.URLField(blank=True, null=True)
     metadata = JSONField(default=dict)  # Additional context
+
+    objects = InteractionHistoryManager()
     
     class Meta:
         indexes = [
             models.Index(fields=['user', 'timestamp']),
+            # history of a user over a timestamp range (InteractionHistoryManager.between)
+            models.Index(fields=['username', 'timestamp']),
         ]
         ordering = ['-timestamp']
 
+
+class InteractionArchiveQuerySet(models.QuerySet):
+    def overlapping(self, start: datetime, end: datetime, username: Optional[str] = None):
+        """Archives holding interactions of start <= timestamp < end"""
+        archives = self.filter(first_timestamp__lt=end, last_timestamp__gte=start)
+        if username is not None:
+            archives = archives.filter(username=username)
+        return archives
+
+
+class InteractionArchive(models.Model):
+    """
+    Interactions of one user and month moved out of InteractionHistory
+    (see archive_interactions), as one zlib-compressed JSON blob
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interaction_archives')
+    username = models.TextField(blank=True, null=True)
+    month = models.DateField()  # first day of the month
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = InteractionArchiveQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['username', 'last_timestamp']),
+        ]
+
+    @staticmethod
+    def pack(interactions: List[InteractionHistory]) -> bytes:
+        """Compressed blob of the interactions (every column, ids included)"""
+        fields = [field.attname for field in InteractionHistory._meta.concrete_fields]
+        rows = [
+            # isoformat() keeps the microseconds DjangoJSONEncoder would drop
+            dict({name: getattr(interaction, name) for name in fields},
+                 timestamp=interaction.timestamp.isoformat())
+            for interaction in interactions
+        ]
+        return zlib.compress(json.dumps(rows, cls=DjangoJSONEncoder).encode(), 9)
+
+    def rows(self) -> List[InteractionHistory]:
+        """The archived interactions, as InteractionHistory instances"""
+        return [
+            InteractionHistory(**dict(row, timestamp=parse_datetime(row['timestamp'])))
+            for row in json.loads(zlib.decompress(bytes(self.data)))
+        ]
+
 class UserAchievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_achievements')
     title = models.CharField(max_length=255,blank=True, null=True)
@@ -61,8 +201,75 @@ class UserAchievement(models.Model):
         return self.title
 
 class SummaryOfHistory(models.Model):
+    """Rollup summary of one user's interactions over a day, week or month (see rollups.py)"""
+
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    GRANULARITY_CHOICES = [
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    ]
+
     username = models.CharField(max_length=255)
+    granularity = models.CharField(max_length=8, choices=GRANULARITY_CHOICES, default=DAY)
     period_start = models.DateField()
     period_end = models.DateField()
     summary = models.JSONField(default=dict)
-    create_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    dirty = models.BooleanField(default=True)  # interactions changed since the summary was built
+    version = models.PositiveIntegerField(default=0)  # bumped on every change of the period
+    create_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['username', 'granularity', 'period_start'],
+                name='unique_rollup_period',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['dirty', 'granularity']),
+        ]
+
+class SummaryJob(models.Model):
+    """Queued generation of one user's summary for a period, run by run_summary_worker"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = (PENDING, RUNNING)
+
+    username = models.CharField(max_length=255)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(auto_now_add=True)  # not picked up before (retry backoff)
+    lease_expires_at = models.DateTimeField(blank=True, null=True)  # running job is reclaimed after
+    worker = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    result = models.ForeignKey(WeeklySummary, on_delete=models.SET_NULL, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            # at most one pending or running job per user and period
+            models.UniqueConstraint(
+                fields=['username', 'period_start', 'period_end'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_summary_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
@@ -0,0 +1,226 @@
+# Batch precomputation of every active user's weekly summary
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from django.db import connections
+
+from .models import InteractionHistory
+from .summarization import period_bounds
+from .summary_jobs import cached_summary, generate_summary
+from .utils import summarize_with_llama2
+
+logger = logging.getLogger(__name__)
+
+SUMMARIZED, UNCHANGED, EMPTY, FAILED = 'summarized', 'unchanged', 'empty', 'failed'
+
+
+class RateLimiter:
+    """
+    Spaces calls to at most `rate` per second, across all the processes
+    forked after it was created (the schedule lives in shared memory)
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = multiprocessing.get_context('fork').Value('d', 0.0)
+
+    def wait(self):
+        with self._next.get_lock():
+            now = time.monotonic()
+            at = max(now, self._next.value)
+            self._next.value = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+class Checkpoint:
+    """
+    Progress of a precompute run, one JSON line per finished user
+
+    Lines are only appended, so a killed run loses at most the line being
+    written. Users that failed are not recorded as done and are retried
+    when the run is resumed.
+    """
+
+    def __init__(self, path: Path, start: date):
+        self.path = Path(path)
+        self.start = start
+        self.done: Set[str] = set()
+
+    def load(self) -> Set[str]:
+        """Usernames finished by an earlier run of the same week"""
+        self.done = set()
+        if not self.path.exists():
+            return self.done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a killed run
+                if entry.get('week') != str(self.start):
+                    return set()  # another week's run, start over
+                if entry.get('outcome') not in (None, FAILED):
+                    self.done.add(entry['username'])
+        return self.done
+
+    def start_run(self, resume: bool):
+        if not resume or not self.load():
+            self.done = set()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w') as f:
+                f.write(json.dumps({'week': str(self.start)}) + '\n')
+
+    def record(self, username: str, outcome: str):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'week': str(self.start), 'username': username,
+                                'outcome': outcome}) + '\n')
+        if outcome != FAILED:
+            self.done.add(username)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+@dataclass
+class PrecomputeStats:
+    summarized: int = 0
+    unchanged: int = 0  # summary already built from the same interactions
+    empty: int = 0
+    resumed: int = 0  # done by an earlier, interrupted run
+    failed: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def active_users(start: date, end: date) -> List[str]:
+    """Usernames with interactions in the period, in a stable order"""
+    return InteractionHistory.objects.usernames_between(*period_bounds(start, end))
+
+
+# Set in each pool process by _init_process
+_limiter: Optional[RateLimiter] = None
+
+
+def _init_process(limiter: Optional[RateLimiter]):
+    global _limiter
+    _limiter = limiter
+    # Ctrl-C is handled by the parent, which lets running users finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _rate_limited(prompt: str) -> str:
+    if _limiter is not None:
+        _limiter.wait()
+    return summarize_with_llama2(prompt)
+
+
+def precompute_user(username: str, start: date, end: date) -> str:
+    """
+    Builds the user's summary of the period unless one of the same
+    interactions exists
+    Returns:
+        str: SUMMARIZED, UNCHANGED or EMPTY
+    """
+    existing, content_hash = cached_summary(username, start, end)
+    if existing:
+        return UNCHANGED
+    if content_hash is None:
+        return EMPTY
+    summary = generate_summary(username, start, end, summarize=_rate_limited)
+    return SUMMARIZED if summary else EMPTY
+
+
+def _run_user(username: str, start: date, end: date) -> str:
+    try:
+        return precompute_user(username, start, end)
+    except Exception as e:
+        logger.error(f"Precomputing the summary of {username} failed: {str(e)}",
+                     exc_info=True)
+        return FAILED
+
+
+def precompute_weekly_summaries(start: date, end: date, checkpoint: Checkpoint,
+                                processes: int = 4, rate: float = 0,
+                                resume: bool = True,
+                                stop: Optional[threading.Event] = None,
+                                on_progress: Optional[Callable[[str, str], None]] = None
+                                ) -> PrecomputeStats:
+    """
+    Precomputes the period's summary of every user with interactions in it
+
+    Users are run in a pool of `processes` processes (0: in this process),
+    their LLM calls spaced to `rate` per second overall (0: unlimited).
+    Users whose summary was built from their current interactions are
+    skipped after reading only their rollup versions. Every finished user
+    is appended to `checkpoint`; with `resume`, users finished by an
+    earlier run of the same period are skipped. The checkpoint is removed
+    once every user is done.
+
+    Args:
+        stop: Once set, no new user is started; running ones finish
+        on_progress: Called with (username, outcome) as users finish
+    Returns:
+        PrecomputeStats: What happened to each user
+    """
+    global _limiter
+    stats = PrecomputeStats()
+    stop = stop or threading.Event()
+    checkpoint.start_run(resume)
+    limiter = RateLimiter(rate) if rate else None
+
+    def finished(username: str, outcome: str):
+        setattr(stats, outcome, getattr(stats, outcome) + 1)
+        checkpoint.record(username, outcome)
+        if on_progress:
+            on_progress(username, outcome)
+
+    users = active_users(start, end)
+
+    def pending() -> Iterable[str]:
+        for username in users:
+            if stop.is_set():
+                return
+            if username in checkpoint.done:
+                stats.resumed += 1
+                continue
+            yield username
+
+    if processes <= 0:
+        previous, _limiter = _limiter, limiter
+        try:
+            for username in pending():
+                finished(username, _run_user(username, start, end))
+        finally:
+            _limiter = previous
+    else:
+        # A connection open at fork time would be shared with the pool
+        # processes; the parent does not query again until they are done
+        connections.close_all()
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_process, initargs=(limiter,)) as pool:
+            running: Dict[Future, str] = {}
+            for username in pending():
+                running[pool.submit(_run_user, username, start, end)] = username
+                # A bounded window, so a stop request is honoured promptly
+                while len(running) >= processes * 2:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(running.pop(future), future.result())
+            for future in wait(running).done:
+                finished(running.pop(future), future.result())
+
+    if not stop.is_set() and not stats.failed:
+        checkpoint.clear()
+    logger.info(f"Precomputed weekly summaries {start} - {end}: {stats.to_dict()}")
+    return stats
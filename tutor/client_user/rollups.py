@@ -0,0 +1,270 @@
+# Incremental day -> week -> month rollup summaries of the interaction history
+import calendar
+import hashlib
+import logging
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import InteractionHistory, SummaryOfHistory
+from .summarization import (
+    MapReduceSummarizer, history_prompt, merge_summaries_prompt, weekly_summary_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY, WEEK, MONTH = SummaryOfHistory.DAY, SummaryOfHistory.WEEK, SummaryOfHistory.MONTH
+
+
+def period_of(granularity: str, day: date) -> Tuple[date, date]:
+    """First and last day of the day, week (Monday to Sunday) or month containing `day`"""
+    if granularity == DAY:
+        return day, day
+    if granularity == WEEK:
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    return start, day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def cover(start: date, end: date, granularities: Iterable[str] = (MONTH, WEEK, DAY)
+          ) -> List[Tuple[str, date, date]]:
+    """
+    Splits [start, end] into rollup periods, taking the coarsest one that
+    starts on each day and fits in the range
+    Returns:
+        list: (granularity, period_start, period_end) in date order
+    """
+    granularities = list(granularities)
+    periods = []
+    day = start
+    while day <= end:
+        for granularity in granularities:
+            period_start, period_end = period_of(granularity, day)
+            if period_start == day and period_end <= end or granularity == DAY:
+                periods.append((granularity, period_start, period_end))
+                day = period_end + timedelta(days=1)
+                break
+    return periods
+
+
+def mark_dirty(interactions: Iterable[InteractionHistory]):
+    """
+    Flags the day, week and month rollups of the interactions for regeneration
+
+    Called for every saved interaction (post_save) and by the bulk insert
+    paths, which bypass signals. Only the nodes containing the interactions
+    are touched, so a late interaction regenerates just those.
+    """
+    periods = set()
+    for interaction in interactions:
+        if not interaction.username or interaction.timestamp is None:
+            continue
+        if (isinstance(interaction.metadata, dict)
+                and interaction.metadata.get('type') in InteractionHistory.AUDIT_TYPES):
+            continue  # not summarized
+        day = timezone.localdate(interaction.timestamp)
+        for granularity in (DAY, WEEK, MONTH):
+            periods.add((interaction.username, granularity) + period_of(granularity, day))
+    if not periods:
+        return
+
+    SummaryOfHistory.objects.bulk_create([
+        SummaryOfHistory(username=username, granularity=granularity,
+                         period_start=start, period_end=end)
+        for username, granularity, start, end in periods
+    ], ignore_conflicts=True)
+    condition = Q()
+    for username, granularity, start, _ in periods:
+        condition |= Q(username=username, granularity=granularity, period_start=start)
+    SummaryOfHistory.objects.filter(condition).update(dirty=True, version=F('version') + 1)
+
+
+def summary_content_hash(username: str, start: date, end: date, model: str) -> Optional[str]:
+    """
+    Content address of the summary of the period: a hash of the versions
+    of the rollup nodes covering it, the prompt templates, the chunk budget
+    and the model. mark_dirty bumps a node's version whenever a
+    conversation row of its period is saved, so a summary stored under the
+    hash never goes stale; audit rows are not summarized and do not change
+    it, nor does archiving.
+
+    Only the covering nodes are read (one indexed query), never the history.
+    Returns:
+        str|None: Hex digest, None when no node covers the period (no
+        interactions)
+    """
+    covering = cover(start, end)
+    condition = Q()
+    for granularity, period_start, _ in covering:
+        condition |= Q(granularity=granularity, period_start=period_start)
+    versions = {
+        (granularity, period_start): version
+        for granularity, period_start, version in SummaryOfHistory.objects.filter(
+            condition, username=username
+        ).values_list('granularity', 'period_start', 'version')
+    }
+    if not versions:
+        return None
+
+    digest = hashlib.sha256()
+    # Templates rendered with placeholders: editing a prompt changes the hash
+    for part in (username, str(start), str(end), model,
+                 str(getattr(settings, 'SUMMARY_CHUNK_TOKENS', 2000)),
+                 weekly_summary_prompt('{username}', '{start}', '{end}', '{responses}'),
+                 merge_summaries_prompt('{username}', '{start}', '{end}', '{summaries}')):
+        digest.update(part.encode() + b'\0')
+    for granularity, period_start, _ in covering:
+        version = versions.get((granularity, period_start))
+        if version is not None:
+            digest.update(f'{granularity}:{period_start}:{version},'.encode())
+    return digest.hexdigest()
+
+
+def _completion(completion: Optional[str]) -> Optional[str]:
+    """finish of a final prompt whose completion is the summary as is"""
+    return completion
+
+
+class RollupSummarizer:
+    """
+    Builds and serves the rollup tree of a user's history
+
+    Day nodes summarize that day's raw interactions; week nodes are composed
+    from their day nodes and month nodes from the weeks and days covering
+    them, so raw rows are only read once per day. A node is rebuilt only
+    when it is dirty, and a range summary is composed from the coarsest
+    clean nodes covering it. Periods without interactions have no node.
+    """
+
+    def __init__(self, summarize: Callable[[str], str]):
+        self.summarize = summarize
+
+    def _summarizer(self) -> MapReduceSummarizer:
+        return MapReduceSummarizer(
+            self.summarize,
+            chunk_tokens=getattr(settings, 'SUMMARY_CHUNK_TOKENS', 2000),
+            concurrency=getattr(settings, 'SUMMARY_MAP_CONCURRENCY', 4),
+        )
+
+    def _nodes(self, username: str, start: date, end: date) -> Dict[Tuple[str, date], SummaryOfHistory]:
+        return {
+            (node.granularity, node.period_start): node
+            for node in SummaryOfHistory.objects.filter(
+                username=username, period_start__gte=start, period_start__lte=end
+            )
+        }
+
+    def compose(self, username: str, start: date, end: date,
+                granularities: Iterable[str] = (MONTH, WEEK, DAY)) -> Optional[str]:
+        """
+        Summary of [start, end] from the rollup nodes covering it
+        Returns:
+            str|None: None when there were no interactions in the range
+        """
+        prompt, finish = self.final_prompt(username, start, end, granularities)
+        return finish(None if prompt is None else self.summarize(prompt))
+
+    def final_prompt(self, username: str, start: date, end: date,
+                     granularities: Iterable[str] = (MONTH, WEEK, DAY)
+                     ) -> Tuple[Optional[str], Callable[[Optional[str]], Optional[str]]]:
+        """
+        Makes every LLM call of `compose` but the last and returns its prompt,
+        so the caller can send it itself (e.g. streamed)
+        Returns:
+            tuple: (prompt, finish); prompt is None when no LLM call is left.
+            finish takes the completion of the prompt (None without a
+            prompt), saves the node it completes, if any, and returns the
+            summary of the range, None when there were no interactions in it
+        """
+        nodes = self._nodes(username, start, end)
+        covering = [nodes[(granularity, period_start)]
+                    for granularity, period_start, _ in cover(start, end, granularities)
+                    if (granularity, period_start) in nodes]
+        if len(covering) == 1:
+            # The range is a single node: its last call is the range's
+            return self._node_prompt(covering[0])
+
+        texts = [text for text in map(self.refresh, covering) if text]
+        if len(texts) <= 1:
+            text = texts[0] if texts else None
+            return None, lambda _: text
+        prompt = self._summarizer().final_prompt(
+            texts,
+            lambda chunk: merge_summaries_prompt(username, start, end, chunk),
+            lambda summaries: merge_summaries_prompt(username, start, end, summaries),
+        )
+        return prompt, _completion
+
+    def refresh(self, node: SummaryOfHistory) -> str:
+        """Text of the node, rebuilt first if it is dirty"""
+        prompt, finish = self._node_prompt(node)
+        return finish(None if prompt is None else self.summarize(prompt)) or ''
+
+    def _node_prompt(self, node: SummaryOfHistory
+                     ) -> Tuple[Optional[str], Callable[[Optional[str]], Optional[str]]]:
+        """`final_prompt` of the node; finish stores its text if it was dirty"""
+        if not node.dirty:
+            text = node.summary.get('text') or None
+            return None, lambda _: text
+
+        version = node.version
+        if node.granularity == DAY:
+            prompt = history_prompt(node.username, node.period_start, node.period_end,
+                                    self.summarize)
+            finish = _completion
+        else:
+            # a node is composed from the next finer levels only
+            finer = (WEEK, DAY) if node.granularity == MONTH else (DAY,)
+            prompt, finish = self.final_prompt(node.username, node.period_start,
+                                               node.period_end, finer)
+
+        def store(completion: Optional[str]) -> Optional[str]:
+            node.summary = {"text": finish(completion) or ''}
+            # Stays dirty if an interaction arrived while it was being built
+            nodes = SummaryOfHistory.objects.filter(pk=node.pk)
+            node.dirty = not nodes.filter(version=version).update(
+                summary=node.summary, dirty=False, updated_at=timezone.now()
+            )
+            if node.dirty:
+                nodes.update(summary=node.summary, updated_at=timezone.now())
+            logger.info(f"Rebuilt {node.granularity} rollup {node.period_start} of {node.username}")
+            return node.summary['text'] or None
+
+        return prompt, store
+
+    def refresh_dirty(self, before: Optional[date] = None, username: Optional[str] = None) -> int:
+        """
+        Rebuilds dirty nodes, finest first, so coarser ones reuse them
+        Args:
+            before: Only periods ending before this day (closed periods)
+            username: Only this user's nodes
+        Returns:
+            int: Number of nodes rebuilt
+        """
+        rebuilt = 0
+        for granularity in (DAY, WEEK, MONTH):
+            nodes = SummaryOfHistory.objects.filter(dirty=True, granularity=granularity)
+            if before is not None:
+                nodes = nodes.filter(period_end__lt=before)
+            if username is not None:
+                nodes = nodes.filter(username=username)
+            for node in list(nodes.order_by('period_start')):
+                self.refresh(node)
+                rebuilt += 1
+        return rebuilt
+
+
+def summarize_range(username: str, start: date, end: date,
+                    summarize: Callable[[str], str]) -> Optional[str]:
+    """Summary of the user's interactions between `start` and `end` (inclusive)"""
+    return RollupSummarizer(summarize).compose(username, start, end)
+
+
+def range_prompt(username: str, start: date, end: date, summarize: Callable[[str], str]
+                 ) -> Tuple[Optional[str], Callable[[Optional[str]], Optional[str]]]:
+    """`summarize_range` but for its last LLM call, see RollupSummarizer.final_prompt"""
+    return RollupSummarizer(summarize).final_prompt(username, start, end)
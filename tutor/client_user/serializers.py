@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import UserAchievement, User
+from .models import UserAchievement, User, WeeklySummary, SummaryJob
 # serializers.py
 
 from .models import InteractionHistory
@@ -12,6 +12,16 @@ class InteractionHistorySerializer(serializers.ModelSerializer):
         model = InteractionHistory
         fields = ['agent_response','username']  # Only allow this field from the request
 
+class InteractionHistoryBulkSerializer(serializers.ModelSerializer):
+    """One item of a bulk transcript upload"""
+    class Meta:
+        model = InteractionHistory
+        fields = ['agent_response', 'username', 'session_id', 'metadata']
+        extra_kwargs = {
+            'session_id': {'required': False, 'allow_blank': True},
+            'metadata': {'required': False},
+        }
+
 class UserAchievementSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserAchievement
@@ -25,5 +35,14 @@ class UserAchievementSerializer(serializers.ModelSerializer):
 
 class WeeklySummarySerializer(serializers.ModelSerializer):
     class Meta:
-        model = InteractionHistory
-        fields = ['username','timestamp','agent_response']
\ No newline at end of file
+        model = WeeklySummary
+        fields = ['username', 'period_start', 'period_end', 'summary', 'create_at']
+
+class SummaryJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source='id')
+    result = WeeklySummarySerializer(allow_null=True)
+
+    class Meta:
+        model = SummaryJob
+        fields = ['job_id', 'username', 'period_start', 'period_end', 'status',
+                  'attempts', 'error', 'result', 'created_at', 'finished_at']
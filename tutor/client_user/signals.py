@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import InteractionHistory
+from .rollups import mark_dirty
+
+
+@receiver(post_save, sender=InteractionHistory)
+def mark_rollups_dirty(sender, instance, created, raw=False, **kwargs):
+    """Queues the rollup summaries of the interaction's day, week and month for regeneration"""
+    if not raw:
+        mark_dirty([instance])
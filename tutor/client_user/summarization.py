@@ -0,0 +1,221 @@
+# Map-reduce summarization of arbitrarily long interaction histories
+import logging
+from collections import deque
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import InteractionHistory
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip by the server-side history iterator
+HISTORY_FETCH_SIZE = 500
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+def weekly_summary_prompt(username: str, start: date, end: date, responses: str) -> str:
+    return f"""
+    Summarize the following agent responses from the user '{username}' between {start} and {end}:
+
+    {responses}
+
+    Provide a concise summary of the key points and topics discussed.
+    """
+
+
+def merge_summaries_prompt(username: str, start: date, end: date, summaries: str) -> str:
+    return f"""
+    The following are summaries of consecutive parts of the agent responses from the user '{username}' between {start} and {end}:
+
+    {summaries}
+
+    Combine them into one concise summary of the key points and topics discussed.
+    """
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes a stream of texts of any length with bounded LLM calls
+
+    Map: the texts are packed, in order, into chunks of at most
+    `chunk_tokens` tokens (a single longer text is split) and each chunk is
+    summarized; up to `concurrency` chunk summaries run at a time.
+
+    Reduce: partial summaries are merged as they arrive, in a tree. A level
+    collects summaries until the next one would overflow `chunk_tokens`,
+    merges them into one summary of the level above and starts over, so
+    only O(log n) partial summaries are held and every LLM prompt stays
+    within the budget however long the history is. Order is preserved.
+    """
+
+    def __init__(self, summarize: Callable[[str], str], chunk_tokens: int = 2000,
+                 concurrency: int = 4):
+        self.summarize = summarize
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+
+    def chunks(self, texts: Iterable[str]) -> Iterator[str]:
+        """Packs `texts` into newline-joined chunks of at most `chunk_tokens` tokens"""
+        chunk, tokens = [], 0
+        for text in texts:
+            if not text:
+                continue
+            # A text over the budget on its own is cut into budget-sized pieces
+            max_chars = self.chunk_tokens * 4
+            for i in range(0, len(text), max_chars):
+                piece = text[i:i + max_chars]
+                piece_tokens = count_tokens(piece)
+                if chunk and tokens + piece_tokens > self.chunk_tokens:
+                    yield "\n".join(chunk)
+                    chunk, tokens = [], 0
+                chunk.append(piece)
+                tokens += piece_tokens
+        if chunk:
+            yield "\n".join(chunk)
+
+    def run(self, texts: Iterable[str], map_prompt: Callable[[str], str],
+            reduce_prompt: Callable[[str], str]) -> Optional[str]:
+        """
+        Summarizes `texts`
+        Args:
+            texts: The texts in order, consumed lazily
+            map_prompt: Builds the prompt summarizing one chunk of texts
+            reduce_prompt: Builds the prompt merging newline-joined summaries
+        Returns:
+            str|None: The summary, None when there was no text
+        """
+        prompt = self.final_prompt(texts, map_prompt, reduce_prompt)
+        return None if prompt is None else self.summarize(prompt)
+
+    def final_prompt(self, texts: Iterable[str], map_prompt: Callable[[str], str],
+                     reduce_prompt: Callable[[str], str]) -> Optional[str]:
+        """
+        Makes every LLM call of `run` but the last and returns its prompt,
+        so the caller can send it itself (e.g. streamed)
+        Returns:
+            str|None: The prompt of the final summary, None when there was no text
+        """
+        chunks = self.chunks(texts)
+        first = next(chunks, None)
+        if first is None:
+            return None
+        second = next(chunks, None)
+        if second is None:
+            return map_prompt(first)
+
+        levels: List[List[str]] = []
+        merges = 0
+
+        def merge(summaries: List[str]) -> str:
+            nonlocal merges
+            merges += 1
+            return self.summarize(reduce_prompt("\n\n".join(summaries)))
+
+        def fits(summaries: List[str]) -> bool:
+            return count_tokens("\n\n".join(summaries)) <= self.chunk_tokens
+
+        def add(level: int, summary: str):
+            if level == len(levels):
+                levels.append([])
+            pending = levels[level]
+            # A merge always takes at least two summaries, so the tree is
+            # at most log2(chunks) levels deep even if the LLM is verbose
+            if len(pending) > 1 and not fits(pending + [summary]):
+                levels[level] = []
+                add(level + 1, merge(pending))
+            levels[level].append(summary)
+
+        mapped = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='summarize') as pool:
+            # A bounded window of in-flight chunks, so neither chunks nor
+            # summaries pile up when the history is long
+            window = deque()
+            for chunk in chain([first, second], chunks):
+                if len(window) >= self.concurrency:
+                    add(0, window.popleft().result())
+                window.append(pool.submit(self.summarize, map_prompt(chunk)))
+                mapped += 1
+            while window:
+                add(0, window.popleft().result())
+
+        # Levels above hold older material; merge what is left, oldest first,
+        # until a single merge remains
+        summaries = [summary for level in reversed(levels) for summary in level]
+        while True:
+            groups = [[]]
+            for summary in summaries:
+                if len(groups[-1]) > 1 and not fits(groups[-1] + [summary]):
+                    groups.append([])
+                groups[-1].append(summary)
+            if len(groups) == 1:
+                break
+            summaries = [group[0] if len(group) == 1 else merge(group) for group in groups]
+        logger.info(f"Summarized {mapped} chunks with {merges + 1} merges")
+        return reduce_prompt("\n\n".join(summaries))
+
+
+def period_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """The days `start` to `end` (inclusive) as a half-open range of aware datetimes"""
+    return (timezone.make_aware(datetime.combine(start, time.min)),
+            timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+
+
+def period_interactions(username: str, start: date, end: date,
+                        fields: Iterable[str] = ()) -> Iterator[InteractionHistory]:
+    """
+    The user's interactions between `start` and `end` (inclusive), by
+    timestamp, archived months included; audit rows, which are not part
+    of the conversation, are left out
+    Args:
+        fields: Only load these fields (of the rows not archived)
+    """
+    return InteractionHistory.objects.between(
+        *period_bounds(start, end), username=username, fields=fields,
+        exclude_types=InteractionHistory.AUDIT_TYPES, chunk_size=HISTORY_FETCH_SIZE,
+    )
+
+
+def history_prompt(username: str, start: date, end: date,
+                   summarize: Callable[[str], str]) -> Optional[str]:
+    """
+    Prompt of the final LLM call summarizing the user's agent responses of
+    the period; chunks of a long history are summarized on the way
+    Returns:
+        str|None: The prompt, None when there are no interactions
+    """
+    summarizer = MapReduceSummarizer(
+        summarize,
+        chunk_tokens=getattr(settings, 'SUMMARY_CHUNK_TOKENS', 2000),
+        concurrency=getattr(settings, 'SUMMARY_MAP_CONCURRENCY', 4),
+    )
+    # Rows of the table are streamed from a server-side cursor, never loaded as a whole
+    responses = (interaction.agent_response for interaction in
+                 period_interactions(username, start, end, fields=['agent_response']))
+    return summarizer.final_prompt(
+        responses,
+        lambda chunk: weekly_summary_prompt(username, start, end, chunk),
+        lambda summaries: merge_summaries_prompt(username, start, end, summaries),
+    )
+
+
+def summarize_history(username: str, start: date, end: date,
+                      summarize: Callable[[str], str]) -> Optional[str]:
+    """
+    Summarizes the user's agent responses of the period
+    Args:
+        summarize: Sends a prompt to the LLM, returns its completion
+    Returns:
+        str|None: The summary, None when there are no interactions
+    """
+    prompt = history_prompt(username, start, end, summarize)
+    return None if prompt is None else summarize(prompt)
@@ -0,0 +1,203 @@
+# DB-backed queue of summary generations, worked off by run_summary_worker
+import logging
+import os
+import socket
+import threading
+from datetime import date, timedelta
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .llm import ollama
+from .models import SummaryJob, WeeklySummary
+from .rollups import summarize_range, summary_content_hash
+from .utils import summarize_with_llama2
+
+logger = logging.getLogger(__name__)
+
+
+def current_week(today: Optional[date] = None) -> Tuple[date, date]:
+    """Monday and Sunday of the week of `today` (default: now)"""
+    today = today or timezone.now().date()
+    start = today - timedelta(days=today.weekday())  # Monday = 0, Sunday = 6
+    return start, start + timedelta(days=6)
+
+
+def cached_summary(username: str, start: date, end: date
+                   ) -> Tuple[Optional[WeeklySummary], Optional[str]]:
+    """
+    Looks the period's summary up by the content hash of its interactions,
+    built from their rollup versions without reading the history
+    Returns:
+        tuple: (summary, content_hash); summary is None on a miss, both are
+        None when the user has no interactions in the period
+    """
+    content_hash = summary_content_hash(username, start, end, ollama.model)
+    if content_hash is None:
+        return None, None
+    return WeeklySummary.objects.filter(content_hash=content_hash).first(), content_hash
+
+
+def generate_summary(username: str, start: date, end: date,
+                     summarize: Optional[Callable[[str], str]] = None) -> Optional[WeeklySummary]:
+    """
+    Summarizes the user's interactions of the period with the LLM and saves it
+    Args:
+        summarize: Sends a prompt to the LLM (default summarize_with_llama2)
+    Returns:
+        WeeklySummary|None: The saved summary (returned as is when one was
+        built from the same interactions), None when the user has no
+        interactions in the period
+    """
+    existing, content_hash = cached_summary(username, start, end)
+    if existing or content_hash is None:
+        return existing
+
+    # Composed from the day rollups, only days with new interactions are re-summarized.
+    # An interaction added meanwhile is not covered by content_hash, so the
+    # next request regenerates rather than serving a summary missing it.
+    summary_text = summarize_range(username, start, end, summarize or summarize_with_llama2)
+    if summary_text is None:
+        return None
+
+    summary, _ = WeeklySummary.objects.update_or_create(
+        username=username,
+        period_start=start,
+        period_end=end,
+        defaults={"summary": {"text": summary_text}, "content_hash": content_hash},
+    )
+    return summary
+
+
+def enqueue_summary(username: str, start: date, end: date) -> Tuple[SummaryJob, bool]:
+    """
+    Queues a summary generation unless one is already pending or running
+    Returns:
+        tuple: (job, created); concurrent callers for the same user and
+        period all get the same job
+    """
+    while True:
+        job = SummaryJob.objects.filter(
+            username=username, period_start=start, period_end=end,
+            status__in=SummaryJob.ACTIVE,
+        ).first()
+        if job:
+            return job, False
+        try:
+            with transaction.atomic():
+                return SummaryJob.objects.create(
+                    username=username, period_start=start, period_end=end
+                ), True
+        except IntegrityError:
+            # Lost the race to another request; its job is returned on the next pass
+            continue
+
+
+class SummaryWorker:
+    """
+    Claims SummaryJobs from the database and runs them one at a time
+
+    Any number of workers (processes or hosts) can share the table: a job
+    is claimed with a conditional UPDATE, so exactly one worker gets it. A
+    claimed job holds a lease of `lease` seconds; a job whose worker died
+    is claimed again once its lease ran out. A failed job is retried after
+    an exponential backoff starting at `retry_delay`, up to `max_attempts`
+    runs in total.
+    """
+
+    def __init__(self, name: Optional[str] = None, lease: float = 600,
+                 max_attempts: int = 3, retry_delay: float = 30,
+                 poll_interval: float = 1.0):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """Makes `run` return after the current job"""
+        self._stopped.set()
+
+    def claim(self) -> Optional[SummaryJob]:
+        """Takes the oldest runnable job, None when there is none"""
+        now = timezone.now()
+        runnable = (Q(status=SummaryJob.PENDING, run_after__lte=now)
+                    | Q(status=SummaryJob.RUNNING, lease_expires_at__lt=now))
+        for job_id in SummaryJob.objects.filter(runnable).order_by(
+                'run_after', 'id').values_list('id', flat=True)[:10]:
+            claimed = SummaryJob.objects.filter(runnable, id=job_id).update(
+                status=SummaryJob.RUNNING,
+                worker=self.name,
+                lease_expires_at=now + timedelta(seconds=self.lease),
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return SummaryJob.objects.get(id=job_id)
+        return None
+
+    def _finish(self, job: SummaryJob, **fields) -> bool:
+        # Only while we still hold the lease, another worker may own it by now
+        return bool(SummaryJob.objects.filter(
+            id=job.id, status=SummaryJob.RUNNING, worker=self.name
+        ).update(**fields))
+
+    def run_job(self, job: SummaryJob):
+        if job.attempts > self.max_attempts:
+            # Its worker died (lease expired) on the last attempt
+            self._finish(job, status=SummaryJob.FAILED, finished_at=timezone.now(),
+                         error=job.error or "Worker lost the job")
+            return
+        try:
+            summary = generate_summary(job.username, job.period_start, job.period_end)
+        except Exception as e:
+            logger.error(f"Summary job {job.id} failed (attempt {job.attempts}): {str(e)}",
+                         exc_info=True)
+            if job.attempts >= self.max_attempts:
+                self._finish(job, status=SummaryJob.FAILED, error=str(e),
+                             finished_at=timezone.now())
+            else:
+                delay = self.retry_delay * 2 ** (job.attempts - 1)
+                self._finish(job, status=SummaryJob.PENDING, error=str(e),
+                             run_after=timezone.now() + timedelta(seconds=delay))
+            return
+        self._finish(job, status=SummaryJob.DONE, result=summary, error='',
+                     finished_at=timezone.now())
+        logger.info(f"Summary job {job.id} for {job.username} done")
+
+    def run(self, once: bool = False, max_jobs: Optional[int] = None) -> int:
+        """
+        Runs jobs until stopped
+        Args:
+            once: Return as soon as the queue is empty
+            max_jobs: Return after this many jobs
+        Returns:
+            int: Number of jobs run
+        """
+        processed = 0
+        while not self._stopped.is_set():
+            job = self.claim()
+            if job is None:
+                if once:
+                    break
+                close_old_connections()
+                self._stopped.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+            processed += 1
+            if max_jobs and processed >= max_jobs:
+                break
+        return processed
+
+
+def summary_worker(**options) -> SummaryWorker:
+    """SummaryWorker configured from settings, `options` override them"""
+    return SummaryWorker(**dict({
+        'lease': getattr(settings, 'SUMMARY_JOB_LEASE', 600),
+        'max_attempts': getattr(settings, 'SUMMARY_JOB_MAX_ATTEMPTS', 3),
+        'retry_delay': getattr(settings, 'SUMMARY_JOB_RETRY_DELAY', 30),
+        'poll_interval': getattr(settings, 'SUMMARY_JOB_POLL_INTERVAL', 1.0),
+    }, **options))
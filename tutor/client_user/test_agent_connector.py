@@ -0,0 +1,115 @@
+import asyncio
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+agent_dir = os.path.join(os.path.dirname(os.path.dirname(current_dir)), "agent")
+sys.path.insert(0, agent_dir)  # Add agent directory to Python path
+
+from connector import (
+    DjangoKnowledgeConnector,
+    KnowledgeLookupCancelled,
+    KnowledgeLookupError,
+    KnowledgeLookupTimeout,
+    TranscriptSaveError,
+)
+
+TEST_TOKEN = "your-test-token-here"
+
+
+@pytest_asyncio.fixture
+async def fake_django():
+    """Fake /api/knowledge/ endpoint that records what it received"""
+    state = {"delay": 0.0, "active": 0, "max_active": 0, "auth": []}
+
+    async def knowledge(request):
+        state["auth"].append(request.headers.get("Authorization"))
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            await asyncio.sleep(state["delay"])
+        finally:
+            state["active"] -= 1
+        return web.json_response({"summary": request.query["q"], "data": {}})
+
+    async def save(request):
+        return web.json_response({"error": "invalid"}, status=400)
+
+    app = web.Application()
+    app.router.add_get("/api/knowledge/", knowledge)
+    app.router.add_post("/api/save-transcriptions/bulk/", save)
+    server = TestServer(app)
+    await server.start_server()
+    state["url"] = str(server.make_url("")).rstrip("/")
+    yield state
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_knowledge(fake_django):
+    connector = DjangoKnowledgeConnector(fake_django["url"], TEST_TOKEN)
+    try:
+        result = await connector.fetch_knowledge("photosynthesis")
+    finally:
+        await connector.aclose()
+
+    assert result == {"summary": "photosynthesis", "data": {}}
+    assert fake_django["auth"] == [f"Token {TEST_TOKEN}"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_knowledge_deadline(fake_django):
+    fake_django["delay"] = 1.0
+    connector = DjangoKnowledgeConnector(fake_django["url"], TEST_TOKEN)
+    try:
+        with pytest.raises(KnowledgeLookupTimeout):
+            await connector.fetch_knowledge("slow", timeout=0.05)
+        assert connector.pending == 0
+    finally:
+        await connector.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancel_pending_on_barge_in(fake_django):
+    fake_django["delay"] = 1.0
+    connector = DjangoKnowledgeConnector(fake_django["url"], TEST_TOKEN)
+    try:
+        lookup = asyncio.create_task(connector.fetch_knowledge("interrupted"))
+        await asyncio.sleep(0.05)
+        assert connector.cancel_pending() == 1
+        with pytest.raises(KnowledgeLookupCancelled):
+            await lookup
+    finally:
+        await connector.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap(fake_django):
+    fake_django["delay"] = 0.05
+    connector = DjangoKnowledgeConnector(
+        fake_django["url"], TEST_TOKEN, max_concurrency=2
+    )
+    try:
+        await asyncio.gather(*(connector.fetch_knowledge(f"q{i}") for i in range(6)))
+    finally:
+        await connector.aclose()
+
+    assert fake_django["max_active"] == 2
+
+
+@pytest.mark.asyncio
+async def test_save_transcripts_error(fake_django):
+    connector = DjangoKnowledgeConnector(fake_django["url"], TEST_TOKEN)
+    try:
+        with pytest.raises(TranscriptSaveError) as excinfo:
+            await connector.save_transcripts([{"agent_response": ""}])
+    finally:
+        await connector.aclose()
+
+    assert excinfo.value.status == 400
+    assert not isinstance(excinfo.value, KnowledgeLookupError)
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+agent_dir = os.path.join(os.path.dirname(os.path.dirname(current_dir)), "agent")
+sys.path.insert(0, agent_dir)  # Add agent directory to Python path
+
+from connector import KnowledgeLookupError
+from knowledge_cache import KnowledgeCache, normalize_query
+
+
+class FakeConnector:
+    """Stands in for DjangoKnowledgeConnector and counts upstream calls"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = []
+
+    async def fetch_knowledge(self, query, *, session_id="", timeout=None):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise KnowledgeLookupError("upstream down")
+        return {"summary": query, "data": {}}
+
+
+def test_normalize_query():
+    assert normalize_query("  What is   Photosynthesis?? ") == "what is photosynthesis"
+    assert normalize_query("Um, what is photosynthesis") == "what is photosynthesis"
+
+
+@pytest.mark.asyncio
+async def test_hits_are_keyed_by_user_and_normalized_query():
+    connector = FakeConnector()
+    cache = KnowledgeCache(connector)
+
+    await cache.fetch_knowledge("What is gravity?", user="alice")
+    await cache.fetch_knowledge("what is gravity", user="alice")
+    await cache.fetch_knowledge("what is gravity", user="bob")
+
+    assert len(connector.calls) == 2
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_request():
+    connector = FakeConnector(delay=0.05)
+    cache = KnowledgeCache(connector)
+
+    results = await asyncio.gather(
+        *(cache.fetch_knowledge("what is gravity", user="alice") for _ in range(5))
+    )
+
+    assert len(connector.calls) == 1
+    assert all(r == results[0] for r in results)
+    assert cache.stats.misses == 1
+    assert cache.stats.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_lru_bounds():
+    connector = FakeConnector()
+    cache = KnowledgeCache(connector, maxsize=2, ttl=0.05)
+
+    for query in ("a", "b", "c"):
+        await cache.fetch_knowledge(query)
+    assert cache.stats.evictions == 1
+    assert cache.stats.size == 2
+
+    await asyncio.sleep(0.06)
+    await cache.fetch_knowledge("c")
+    assert cache.stats.expirations == 1
+    assert connector.calls == ["a", "b", "c", "c"]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    connector = FakeConnector(fail=True)
+    cache = KnowledgeCache(connector)
+
+    for _ in range(2):
+        with pytest.raises(KnowledgeLookupError):
+            await cache.fetch_knowledge("what is gravity")
+
+    assert len(connector.calls) == 2
+    assert cache.stats.size == 0
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+agent_dir = os.path.join(os.path.dirname(os.path.dirname(current_dir)), "agent")
+sys.path.insert(0, agent_dir)  # Add agent directory to Python path
+
+from knowledge_cache import KnowledgeCache
+from prefetch import KnowledgePrefetcher
+
+
+class FakeConnector:
+    """Stands in for DjangoKnowledgeConnector and counts upstream calls"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def fetch_knowledge(self, query, *, session_id="", timeout=None):
+        self.calls.append(query)
+        await asyncio.sleep(self.delay)
+        return {"summary": f"about {query}", "data": {}}
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_reused_for_final_transcript():
+    connector = FakeConnector(delay=0.05)
+    prefetcher = KnowledgePrefetcher(KnowledgeCache(connector), min_interval=0)
+
+    prefetcher.on_interim("what is")
+    prefetcher.on_interim("what is photosynth")
+    prefetcher.on_interim("what is photosynthesis in plants")
+    await asyncio.sleep(0.06)
+
+    assert prefetcher.ready() == {
+        "summary": "about what is photosynthesis in plants",
+        "data": {},
+    }
+    result = await prefetcher.take("What is photosynthesis in plants?")
+    assert result["summary"] == "about what is photosynthesis in plants"
+    assert connector.calls == ["what is photosynth", "what is photosynthesis in plants"]
+
+
+@pytest.mark.asyncio
+async def test_stale_candidates_are_cancelled():
+    connector = FakeConnector(delay=0.05)
+    prefetcher = KnowledgePrefetcher(KnowledgeCache(connector), min_interval=0)
+
+    prefetcher.on_interim("tell me about mars")
+    assert prefetcher.candidates == ["tell me about mars"]
+
+    # the recognizer revised its hypothesis, the old candidate is dropped
+    prefetcher.on_interim("tell me about march")
+    assert prefetcher.candidates == ["tell me about march"]
+
+    result = await prefetcher.take("tell me about march")
+    assert result["summary"] == "about tell me about march"
+
+
+@pytest.mark.asyncio
+async def test_take_falls_back_to_lookup_without_relevant_candidate():
+    connector = FakeConnector()
+    prefetcher = KnowledgePrefetcher(KnowledgeCache(connector), min_interval=0)
+
+    prefetcher.on_interim("what is gravity")
+    await asyncio.sleep(0)
+    result = await prefetcher.take("how do volcanoes erupt")
+
+    assert result["summary"] == "about how do volcanoes erupt"
+    assert prefetcher.candidates == []
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_throttled_while_speaking():
+    connector = FakeConnector()
+    prefetcher = KnowledgePrefetcher(KnowledgeCache(connector), min_interval=0.05)
+
+    prefetcher.on_interim("how do black")
+    prefetcher.on_interim("how do black holes")
+    prefetcher.on_interim("how do black holes form")
+    await asyncio.sleep(0.08)
+
+    assert connector.calls == ["how do black", "how do black holes form"]
+
+
+@pytest.mark.asyncio
+async def test_take_without_lookup_only_waits_for_candidates():
+    connector = FakeConnector(delay=0.02)
+    prefetcher = KnowledgePrefetcher(KnowledgeCache(connector), min_interval=0)
+
+    prefetcher.on_interim("what is gravity")
+    result = await prefetcher.take("what is gravity", lookup=False)
+    assert result["summary"] == "about what is gravity"
+
+    prefetcher.on_interim("what is gravity")
+    assert await prefetcher.take("how do volcanoes erupt", lookup=False) is None
+    assert connector.calls == ["what is gravity"]
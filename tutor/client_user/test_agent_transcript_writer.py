@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+agent_dir = os.path.join(os.path.dirname(os.path.dirname(current_dir)), "agent")
+sys.path.insert(0, agent_dir)  # Add agent directory to Python path
+
+from connector import TranscriptSaveError
+from transcript_writer import TranscriptWriter
+
+
+class FakeConnector:
+    """Records bulk uploads instead of posting them to Django"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+        self.errors = []
+
+    async def save_transcripts(self, items, *, timeout=5.0):
+        await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(items)
+        return {"created": len(items), "failed": 0}
+
+
+def make_writer(connector, **kwargs):
+    return TranscriptWriter(
+        connector, username="learner", session_id="room-1", **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_never_waits_on_the_database():
+    connector = FakeConnector(delay=1.0)
+    writer = make_writer(connector, batch_size=1)
+    writer.start()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(10):
+        writer.add("user", f"turn {i}")
+    assert loop.time() - start < 0.01
+
+    connector.delay = 0
+    await writer.aclose()
+    assert writer.stats.saved == 10
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_size_and_by_time():
+    connector = FakeConnector()
+    writer = make_writer(connector, batch_size=3, flush_interval=0.05)
+    writer.start()
+
+    for i in range(3):
+        writer.add("user", f"turn {i}")
+    await asyncio.sleep(0.01)
+    assert [len(b) for b in connector.batches] == [3]
+
+    writer.add("assistant", "answer")
+    await asyncio.sleep(0.08)
+    assert [len(b) for b in connector.batches] == [3, 1]
+    assert connector.batches[1][0]["metadata"]["role"] == "assistant"
+    assert connector.batches[1][0]["session_id"] == "room-1"
+
+    await writer.aclose()
+
+
+@pytest.mark.asyncio
+async def test_final_flush_on_shutdown():
+    connector = FakeConnector()
+    writer = make_writer(connector, batch_size=2, flush_interval=60)
+    writer.start()
+
+    for i in range(5):
+        writer.add("user", f"turn {i}")
+    await writer.aclose()
+
+    assert sum(len(b) for b in connector.batches) == 5
+    assert writer.stats.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded_and_failed_batches_are_retried():
+    connector = FakeConnector()
+    connector.errors.append(TranscriptSaveError("django is down"))
+    writer = make_writer(connector, max_queue=3, batch_size=10, flush_interval=0.02)
+    writer.start()
+
+    for i in range(5):
+        writer.add("user", f"turn {i}")
+    assert writer.stats.dropped == 2
+
+    await asyncio.sleep(0.08)
+    await writer.aclose()
+
+    texts = [item["agent_response"] for b in connector.batches for item in b]
+    assert texts == ["turn 2", "turn 3", "turn 4"]
+    assert writer.stats.failed_flushes == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_batches_are_not_retried():
+    connector = FakeConnector()
+    connector.errors.append(TranscriptSaveError("bad request", status=400))
+    writer = make_writer(connector, flush_interval=60)
+    writer.start()
+
+    writer.add("user", "turn")
+    await writer.aclose()
+
+    assert connector.batches == []
+    assert writer.stats.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_unexpected_errors_keep_the_writer_running():
+    connector = FakeConnector()
+    connector.errors.append(ValueError("not JSON"))
+    writer = make_writer(connector, batch_size=10, flush_interval=0.02)
+    writer.start()
+
+    writer.add("user", "turn 0")
+    await asyncio.sleep(0.05)
+    assert not writer._task.done()
+    writer.add("user", "turn 1")
+    await asyncio.sleep(0.05)
+    await writer.aclose()
+
+    texts = [item["agent_response"] for b in connector.batches for item in b]
+    assert texts == ["turn 0", "turn 1"]
+    assert writer.stats.failed_flushes == 1
+
+
+@pytest.mark.asyncio
+async def test_final_flush_runs_even_if_the_task_died():
+    connector = FakeConnector()
+    writer = make_writer(connector, flush_interval=60)
+    writer.start()
+    writer._task.cancel()
+    await asyncio.sleep(0)
+
+    writer.add("user", "turn")
+    await writer.aclose()
+
+    assert [len(b) for b in connector.batches] == [1]
@@ -0,0 +1,124 @@
+from datetime import date, datetime, time as dtime, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .archive import archive_cutoff, archive_interactions
+from .models import InteractionArchive, InteractionHistory, User
+from .rollups import summary_content_hash
+from .summarization import history_prompt, period_bounds
+
+JULY = datetime(2026, 7, 1, tzinfo=dt_timezone.utc)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        for month in (5, 6, 7):
+            for day in (3, 15, 28):
+                self.add(date(2026, month, day), f'Lesson of {month}/{day}.')
+
+    def add(self, day, text, user=None):
+        user = user or self.user
+        moment = datetime.combine(day, dtime(12), tzinfo=dt_timezone.utc)
+        with patch('django.utils.timezone.now', return_value=moment):
+            return InteractionHistory.objects.create(
+                user=user, username=user.username, agent_response=text,
+                metadata={'topic': 'physics'},
+            )
+
+    def snapshot(self, start=date(2026, 5, 1), end=date(2026, 7, 31), username='learner'):
+        return [(row.id, row.timestamp, row.agent_response, row.metadata, row.user_id)
+                for row in InteractionHistory.objects.between(*period_bounds(start, end), username)]
+
+    def test_archive_cutoff(self):
+        self.assertEqual(archive_cutoff(3, date(2026, 10, 18)), JULY)
+        self.assertEqual(archive_cutoff(0, date(2026, 1, 9)),
+                         datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(archive_cutoff(1, date(2026, 1, 9)),
+                         datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+
+    def test_archived_months_leave_the_table_but_not_the_reads(self):
+        before = self.snapshot()
+        content_hash = summary_content_hash('learner', date(2026, 5, 1), date(2026, 7, 31), 'llama2')
+
+        stats = archive_interactions(JULY)
+        self.assertEqual((stats.months, stats.interactions), (2, 6))
+        self.assertLess(stats.stored_bytes, stats.raw_bytes)
+        self.assertEqual(
+            list(InteractionArchive.objects.order_by('month').values_list('month', 'count')),
+            [(date(2026, 5, 1), 3), (date(2026, 6, 1), 3)],
+        )
+        self.assertEqual(InteractionHistory.objects.count(), 3)  # July stays hot
+
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(self.snapshot(date(2026, 6, 10), date(2026, 7, 5)), before[4:7])
+        self.assertEqual(
+            summary_content_hash('learner', date(2026, 5, 1), date(2026, 7, 31), 'llama2'),
+            content_hash,
+        )
+        prompt = history_prompt('learner', date(2026, 6, 1), date(2026, 6, 30), None)
+        self.assertIn('Lesson of 6/15.', prompt)
+        self.assertNotIn('Lesson of 5/28.', prompt)
+
+    def test_audit_rows_are_not_summarized(self):
+        content_hash = summary_content_hash('learner', date(2026, 5, 1), date(2026, 7, 31), 'llama2')
+        # Knowledge audit rows written with a username, live and archived
+        for day in (date(2026, 6, 10), date(2026, 7, 10)):
+            moment = datetime.combine(day, dtime(12), tzinfo=dt_timezone.utc)
+            with patch('django.utils.timezone.now', return_value=moment):
+                InteractionHistory.objects.create(
+                    user=self.user, username='learner', agent_response='Gravity is a force.',
+                    metadata={'type': 'knowledge_query', 'query': 'gravity'},
+                )
+
+        for _ in range(2):
+            self.assertEqual(
+                summary_content_hash('learner', date(2026, 5, 1), date(2026, 7, 31), 'llama2'),
+                content_hash,
+            )
+            prompt = history_prompt('learner', date(2026, 5, 1), date(2026, 7, 31), None)
+            self.assertIn('Lesson of 6/15.', prompt)
+            self.assertNotIn('Gravity', prompt)
+            archive_interactions(JULY)
+
+    def test_rerun_and_late_rows(self):
+        archive_interactions(JULY)
+        self.assertEqual(archive_interactions(JULY).interactions, 0)
+
+        late = self.add(date(2026, 6, 20), 'Imported late.')
+        archive_interactions(JULY)
+        self.assertEqual(InteractionArchive.objects.filter(month=date(2026, 6, 1)).count(), 2)
+        june = self.snapshot(date(2026, 6, 1), date(2026, 6, 30))
+        self.assertEqual([row[2] for row in june],
+                         ['Lesson of 6/3.', 'Lesson of 6/15.', 'Imported late.', 'Lesson of 6/28.'])
+        self.assertEqual(june[2][0], late.id)
+
+    def test_large_months_are_split(self):
+        stats = archive_interactions(JULY, batch_size=2)
+        self.assertEqual(stats.interactions, 6)
+        self.assertEqual(InteractionArchive.objects.count(), 4)
+        self.assertEqual(len(self.snapshot()), 9)
+
+    def test_users_are_kept_apart(self):
+        other = User.objects.create_user(username='other', password='pw')
+        self.add(date(2026, 6, 9), 'Someone else.', user=other)
+        archive_interactions(JULY)
+
+        self.assertEqual([row[2] for row in self.snapshot(username='other')], ['Someone else.'])
+        self.assertEqual(InteractionHistory.objects.usernames_between(*period_bounds(
+            date(2026, 6, 1), date(2026, 6, 30))), ['learner', 'other'])
+
+        other.delete()
+        self.assertEqual(self.snapshot(username='other'), [])
+        self.assertEqual(len(self.snapshot()), 9)
+
+    def test_command(self):
+        out = StringIO()
+        today = timezone.localdate()
+        keep = (today.year - 2026) * 12 + today.month - 7  # July 2026 onwards
+        call_command('archive_interactions', '--keep-months', str(keep), stdout=out)
+        self.assertIn('Archived 6 interactions before 2026-07-01', out.getvalue())
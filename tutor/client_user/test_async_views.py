@@ -0,0 +1,172 @@
+from collections import deque
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from . import knowledge_sources
+from .audit import audit_writer
+from .cache import knowledge_cache
+from .models import InteractionHistory, User, WeeklySummary
+from .rollups import summary_content_hash
+from .summarization import history_prompt
+from .summary_jobs import current_week, summary_worker
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'knowledge': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        knowledge_cache.clear()
+        # keep the internal docs refresher from starting on the real snapshot dir
+        docs = patch('client_user.knowledge_sources.search_internal_docs', return_value=[])
+        docs.start()
+        self.addCleanup(docs.stop)
+        # audit rows are written by explicit flushes in the test thread
+        for attr, value in (('background', False), ('_queue', deque())):
+            patcher = patch.object(audit_writer, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='learner', password='pw')
+        token = Token.objects.create(user=self.user)
+        self.auth = {'Authorization': f'Token {token.key}'}
+
+    async def test_knowledge_view_requires_token(self):
+        response = await self.async_client.get('/api/knowledge/', {'q': 'gravity'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    @patch('client_user.utils.get_system_data', return_value={'query': 'gravity', 'results': []})
+    @patch('client_user.knowledge_sources.aget_wikipedia_summary', new_callable=AsyncMock)
+    async def test_knowledge_view_caches_and_logs(self, wiki, system_data):
+        wiki.return_value = 'Gravity is a fundamental interaction.'
+
+        first = await self.async_client.get(
+            '/api/knowledge/', {'q': 'gravity', 'session_id': 'room-1'}, headers=self.auth
+        )
+        second = await self.async_client.get(
+            '/api/knowledge/', {'q': 'gravity'}, headers=self.auth
+        )
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertTrue(first.json()['summary'].startswith('Gravity is'))
+        self.assertEqual(wiki.await_count, 1)
+        self.assertEqual(await InteractionHistory.objects.acount(), 0)
+        await sync_to_async(audit_writer.flush)()
+        types = [
+            i.metadata['type'] async for i in InteractionHistory.objects.order_by('id')
+        ]
+        self.assertEqual(types, ['knowledge_query', 'cached_knowledge'])
+
+    @patch('client_user.utils.get_system_data', return_value={'query': 'gravity', 'results': []})
+    @patch('client_user.knowledge_sources.aget_wikipedia_summary', new_callable=AsyncMock)
+    async def test_knowledge_lookups_leave_the_weekly_summary_alone(self, wiki, system_data):
+        wiki.return_value = 'Gravity is a fundamental interaction.'
+        await InteractionHistory.objects.acreate(
+            user=self.user, username='learner', agent_response='Gravity pulls.'
+        )
+        week = current_week()
+        content_hash = await sync_to_async(summary_content_hash)('learner', *week, 'llama2')
+
+        for _ in range(2):  # a miss, then a cache hit
+            await self.async_client.get('/api/knowledge/', {'q': 'gravity'}, headers=self.auth)
+        await sync_to_async(audit_writer.flush)()
+
+        self.assertEqual(await InteractionHistory.objects.acount(), 3)
+        self.assertEqual(
+            await sync_to_async(summary_content_hash)('learner', *week, 'llama2'), content_hash
+        )
+        prompt = await sync_to_async(history_prompt)('learner', *week, None)
+        self.assertNotIn('Gravity is a fundamental', prompt)
+
+    async def test_save_transcription(self):
+        response = await self.async_client.post(
+            '/api/save-transcriptions/',
+            {'agent_response': 'Hello there', 'username': 'learner'},
+            content_type='application/json',
+            headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['agent_response'], 'Hello there')
+        self.assertEqual(await InteractionHistory.objects.filter(user=self.user).acount(), 1)
+
+    async def test_save_transcription_invalid(self):
+        response = await self.async_client.post(
+            '/api/save-transcriptions/', {}, content_type='application/json',
+            headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('agent_response', response.json())
+
+    async def test_achievements(self):
+        response = await self.async_client.post(
+            '/api/achievements/',
+            {'title': 'First lesson', 'description': 'Finished lesson 1'},
+            content_type='application/json',
+            headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = await self.async_client.get('/api/achievements/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a['title'] for a in response.json()], ['First lesson'])
+        self.assertEqual(response.json()[0]['user'], self.user.id)
+
+    @patch('client_user.summary_jobs.summarize_with_llama2', return_value='Talked about gravity.')
+    async def test_generate_weekly_summary(self, summarize):
+        await InteractionHistory.objects.acreate(
+            user=self.user, username='learner', agent_response='Gravity pulls.'
+        )
+
+        queued = await self.async_client.get(
+            '/api/generate-weekly-summary/', {'username': 'learner'}
+        )
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(queued.json()['status'], 'pending')
+        summarize.assert_not_called()
+
+        await sync_to_async(summary_worker().run)(once=True)
+        response = await self.async_client.get('/api/generate-weekly-summary/learner/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['summary'], {'text': 'Talked about gravity.'})
+        self.assertEqual(summarize.call_count, 1)
+        self.assertEqual(await WeeklySummary.objects.acount(), 1)
+
+    async def test_generate_weekly_summary_without_history(self):
+        response = await self.async_client.get('/api/generate-weekly-summary/nobody/')
+        self.assertEqual(response.json(), {'message': 'No interactions found for the user.'})
+
+
+class AsyncWikipediaTests(SimpleTestCase):
+    async def test_lookups_share_one_pooled_client(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={'extract': f'About {request.url.path.split("/")[-1]}.'})
+
+        real_client, clients = httpx.AsyncClient, []
+
+        def client(**kwargs):
+            clients.append(real_client(transport=httpx.MockTransport(handler), **kwargs))
+            return clients[-1]
+
+        with patch.object(knowledge_sources.httpx, 'AsyncClient', client):
+            self.assertEqual(await knowledge_sources.aget_wikipedia_summary('Gravity'), 'About Gravity.')
+            self.assertEqual(await knowledge_sources.aget_wikipedia_summary('Light'), 'About Light.')
+
+        self.assertEqual(len(clients), 1)
+        self.assertFalse(clients[0].is_closed)
+        self.assertEqual(len(requests), 2)
+        self.assertTrue(all(r.headers['User-Agent'].endswith('/1.0') for r in requests))
+        await clients[0].aclose()
@@ -0,0 +1,108 @@
+import time
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from .audit import AuditWriter
+from .models import InteractionHistory, User
+
+
+def record(i, user=None):
+    return InteractionHistory(user=user, username='learner', agent_response=str(i), metadata={'i': i})
+
+
+class AuditWriterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.writer = AuditWriter(max_queue=5, batch_size=2, background=False)
+
+    def test_add_does_not_write(self):
+        with self.assertNumQueries(0):
+            self.writer.add(record(0, self.user))
+        self.assertEqual(self.writer.stats.queued, 1)
+
+    def test_flush_writes_in_batches(self):
+        for i in range(5):
+            self.writer.add(record(i, self.user))
+        # three inserts, then the rollups of the rows are marked dirty once
+        with self.assertNumQueries(5):
+            self.assertEqual(self.writer.flush(), 5)
+        self.assertEqual(
+            list(InteractionHistory.objects.order_by('id').values_list('agent_response', flat=True)),
+            ['0', '1', '2', '3', '4'],
+        )
+        self.assertEqual(self.writer.stats.to_dict(),
+                         {'queued': 0, 'written': 5, 'dropped': 0, 'rejected': 0,
+                          'failed_flushes': 0})
+
+    def test_full_queue_drops_oldest(self):
+        for i in range(7):
+            self.writer.add(record(i, self.user))
+        self.writer.flush()
+        self.assertEqual(self.writer.stats.dropped, 2)
+        self.assertEqual(InteractionHistory.objects.order_by('id').first().agent_response, '2')
+
+    def test_failed_batch_is_retried(self):
+        for i in range(3):
+            self.writer.add(record(i, self.user))
+        with patch.object(InteractionHistory.objects, 'bulk_create', side_effect=DatabaseError):
+            self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(self.writer.stats.queued, 3)
+        self.assertEqual(self.writer.stats.failed_flushes, 1)
+
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(InteractionHistory.objects.count(), 3)
+
+    def test_failing_batch_is_dropped_after_max_retries(self):
+        writer = AuditWriter(batch_size=2, max_retries=2, background=False)
+        for i in range(3):
+            writer.add(record(i, self.user))
+        with patch.object(InteractionHistory.objects, 'bulk_create', side_effect=DatabaseError):
+            writer.flush()
+            writer.flush()
+        self.assertEqual((writer.stats.queued, writer.stats.dropped), (1, 2))
+
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(InteractionHistory.objects.get().agent_response, '2')
+
+
+class AuditWriterIntegrityTests(TransactionTestCase):
+    # Foreign keys are checked at commit, which TestCase never reaches
+    def test_refused_rows_do_not_block_the_queue(self):
+        user = User.objects.create_user(username='learner', password='pw')
+        gone = User.objects.create_user(username='gone', password='pw')
+        gone_id = gone.id
+        gone.delete()
+        writer = AuditWriter(batch_size=4, background=False)
+        for i in range(6):
+            row = record(i, user)
+            if i in (1, 4):
+                row.user_id = gone_id  # queued before the user was deleted
+            writer.add(row)
+
+        self.assertEqual(writer.flush(), 4)
+        self.assertEqual(
+            list(InteractionHistory.objects.order_by('id').values_list('agent_response', flat=True)),
+            ['0', '2', '3', '5'],
+        )
+        self.assertEqual((writer.stats.queued, writer.stats.rejected, writer.stats.failed_flushes),
+                         (0, 2, 0))
+
+
+class AuditWriterThreadTests(SimpleTestCase):
+    @patch.object(InteractionHistory.objects, 'bulk_create')
+    def test_background_thread_flushes_and_close_drains(self, bulk_create):
+        writer = AuditWriter(batch_size=2, flush_interval=10)
+        writer.add(record(0))
+        writer.add(record(1))  # a full batch wakes the thread up
+        deadline = time.monotonic() + 2
+        while not bulk_create.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(bulk_create.call_count, 1)
+
+        writer.add(record(2))
+        writer.close()
+        self.assertEqual(bulk_create.call_count, 2)
+        self.assertEqual(writer.stats.written, 3)
+        self.assertFalse(writer._thread.is_alive())
@@ -0,0 +1,72 @@
+import json
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .models import InteractionHistory, User
+
+BULK_URL = '/api/save-transcriptions/bulk/'
+
+
+class InteractionHistoryBulkCreateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_json_array(self):
+        payload = [
+            {'agent_response': f'turn {i}', 'username': 'learner', 'session_id': 'room-1'}
+            for i in range(3)
+        ]
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        ids = [r['id'] for r in response.data['results']]
+        saved = InteractionHistory.objects.filter(user=self.user)
+        self.assertEqual(sorted(ids), sorted(saved.values_list('id', flat=True)))
+        self.assertEqual(set(saved.values_list('session_id', flat=True)), {'room-1'})
+
+    def test_ndjson_stream(self):
+        body = '\n'.join(
+            json.dumps({'agent_response': f'turn {i}', 'username': 'learner'})
+            for i in range(4)
+        ) + '\n'
+        response = self.client.post(
+            BULK_URL, body, content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(InteractionHistory.objects.count(), 4)
+
+    def test_per_item_results(self):
+        payload = [
+            {'agent_response': 'ok', 'username': 'learner'},
+            {'username': 'learner'},
+            {'agent_response': 'also ok'},
+        ]
+        response = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, ['created', 'invalid', 'created'])
+        self.assertIn('agent_response', response.data['results'][1]['errors'])
+        self.assertEqual(InteractionHistory.objects.count(), 2)
+
+    def test_rejects_non_list(self):
+        response = self.client.post(BULK_URL, {'agent_response': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_ndjson(self):
+        response = self.client.post(
+            BULK_URL, '{"agent_response": "x"}\n{oops\n',
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(InteractionHistory.objects.count(), 0)
+
+    def test_requires_token(self):
+        self.client.credentials()
+        response = self.client.post(BULK_URL, [], format='json')
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,331 @@
+import asyncio
+import tempfile
+import time
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from .cache import Entry, SemanticCache, TieredCache, _should_refresh_early, normalize_query
+from .embeddings import HashingEmbedder
+from .models import User
+from .test_async_views import LOCMEM_CACHES
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TieredCache(l1_size=2, l1_ttl=60, compress_min=100)
+        self.cache.clear()
+        self.get = async_to_sync(self.cache.aget)
+        self.set = async_to_sync(self.cache.aset)
+
+    def test_keys_are_hashed_from_the_normalized_query(self):
+        self.assertEqual(normalize_query('  What IS   gravity? '), 'what is gravity')
+        key = TieredCache.make_key('knowledge', 7, 'What is gravity?')
+        self.assertEqual(key, TieredCache.make_key('knowledge', 7, 'what is  gravity'))
+        self.assertNotEqual(key, TieredCache.make_key('knowledge', 8, 'what is gravity'))
+        self.assertEqual(len(TieredCache.make_key('knowledge', 7, 'x' * 5000)), len(key))
+        # queries sharing a long prefix no longer collide
+        self.assertNotEqual(
+            TieredCache.make_key('knowledge', 7, 'a' * 100 + 'b'),
+            TieredCache.make_key('knowledge', 7, 'a' * 100 + 'c'),
+        )
+
+    def test_large_payloads_are_compressed_in_l2(self):
+        small, large = {'summary': 'short'}, {'summary': 'gravity ' * 200}
+        self.set('small', small, 60)
+        self.set('large', large, 60)
+
+        self.assertEqual(caches['knowledge'].get('small')[:1], b'j')
+        self.assertEqual(caches['knowledge'].get('large')[:1], b'z')
+        self.assertLess(len(caches['knowledge'].get('large')), 200)
+        self.cache._l1.clear()
+        self.assertEqual(self.get('large'), large)
+        self.assertEqual(self.get('small'), small)
+
+    def test_l1_is_lru_and_falls_back_to_l2(self):
+        for key in ('a', 'b', 'c'):
+            self.set(key, {'v': key}, 60)
+        self.assertEqual(list(self.cache._l1), ['b', 'c'])
+
+        self.assertEqual(self.get('c'), {'v': 'c'})
+        self.assertEqual(self.get('a'), {'v': 'a'})
+        self.assertIsNone(self.get('missing'))
+
+        stats = self.cache.stats_dict()
+        self.assertEqual((stats['l1']['hits'], stats['l1']['misses']), (1, 2))
+        self.assertEqual((stats['l2']['hits'], stats['l2']['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+
+    def test_l1_entries_expire(self):
+        self.cache.l1_ttl = 0.05
+        self.set('a', {'v': 1}, 60)
+        time.sleep(0.06)
+        self.assertEqual(self.get('a'), {'v': 1})
+        self.assertEqual(self.cache.stats['l2'].hits, 1)
+
+
+def counting(delay=0.1, value='fresh', error=None):
+    async def compute():
+        compute.calls += 1
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return {'summary': value}
+    compute.calls = 0
+    return compute
+
+
+class StampedeMixin:
+    """Two TieredCache instances sharing L2 stand in for two worker processes"""
+
+    def setUp(self):
+        self.workers = [TieredCache(lease=2, poll_interval=0.01) for _ in range(2)]
+        self.workers[0].clear()
+
+    def burst(self, compute, n=20, timeout=60):
+        async def run():
+            return await asyncio.gather(*(
+                self.workers[i % 2].aget_or_compute('k', compute, timeout) for i in range(n)
+            ))
+        return async_to_sync(run)()
+
+    def test_burst_computes_once(self):
+        compute = counting()
+        results = self.burst(compute)
+
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual({r[0]['summary'] for r in results}, {'fresh'})
+        self.assertEqual(sum(not cached for _, cached in results), 1)
+        waited = sum(w.recompute_stats.waited for w in self.workers)
+        self.assertEqual(waited, 19)
+
+    def test_failed_computation_releases_the_lease(self):
+        with self.assertRaises(RuntimeError):
+            self.burst(counting(error=RuntimeError('upstream down')), n=1)
+        compute = counting()
+        self.burst(compute, n=4)
+        self.assertEqual(compute.calls, 1)
+
+    def test_expired_lease_is_taken_over(self):
+        holder, waiter = self.workers
+        waiter.lease = 0.2
+        self.assertTrue(async_to_sync(holder._acquire_lease)('k:lease', 'holder'))
+        time.sleep(0.25)
+
+        compute = counting(delay=0)
+        value, cached = async_to_sync(waiter.aget_or_compute)('k', compute, 60)
+        self.assertEqual((value, cached), ({'summary': 'fresh'}, False))
+        self.assertEqual(compute.calls, 1)
+
+    def test_early_refresh_keeps_serving_the_old_value(self):
+        worker = self.workers[0]
+        async_to_sync(worker.aset)('k', {'summary': 'old'}, 60, delta=1.0)
+        compute = counting(delay=0)
+
+        worker.beta = 0
+        self.assertEqual(async_to_sync(worker.aget_or_compute)('k', compute, 60)[0]['summary'], 'old')
+        self.assertEqual(compute.calls, 0)
+
+        worker.beta = 1e9  # always refresh early
+        value, cached = async_to_sync(worker.aget_or_compute)('k', compute, 60)
+        self.assertEqual((value['summary'], cached), ('fresh', False))
+        self.assertEqual(worker.recompute_stats.early, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LocMemStampedeTests(StampedeMixin, SimpleTestCase):
+    def test_expired_lease_is_taken_over(self):
+        # locmem leases expire through the cache timeout, which has a 1s granularity
+        self.workers[1].lease = 1
+        self.workers[0].lease = 1
+        holder, waiter = self.workers
+        self.assertTrue(async_to_sync(holder._acquire_lease)('k:lease', 'holder'))
+        value, cached = async_to_sync(waiter.aget_or_compute)('k', counting(delay=0), 60)
+        self.assertFalse(cached)
+        self.assertEqual(waiter.recompute_stats.lease_expired, 1)
+
+
+class FileStampedeTests(StampedeMixin, SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        caches_setting = override_settings(CACHES=dict(LOCMEM_CACHES, knowledge={
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tmp.name,
+        }))
+        caches_setting.enable()
+        self.addCleanup(caches_setting.disable)
+        super().setUp()
+
+    def test_expired_holder_does_not_release_the_new_lease(self):
+        stale, current = self.workers
+        current.lease = 0.2
+        self.assertTrue(async_to_sync(stale._acquire_lease)('k:lease', 'stale'))
+        time.sleep(0.25)
+        self.assertTrue(async_to_sync(current._acquire_lease)('k:lease', 'current'))
+
+        async_to_sync(stale._release_lease)('k:lease', 'stale')  # finished late
+        self.assertFalse(async_to_sync(stale._acquire_lease)('k:lease', 'third'))
+        async_to_sync(current._release_lease)('k:lease', 'current')
+        self.assertTrue(async_to_sync(stale._acquire_lease)('k:lease', 'third'))
+
+
+class XFetchTests(SimpleTestCase):
+    def test_probability_rises_near_expiry(self):
+        now = time.time()
+        far, near = Entry({}, 1.0, now + 100), Entry({}, 1.0, now + 0.5)
+        with patch('client_user.cache.random.random', return_value=0.5):
+            # -log(0.5) ~ 0.69s of headroom
+            self.assertFalse(_should_refresh_early(far, beta=1.0))
+            self.assertTrue(_should_refresh_early(near, beta=1.0))
+            self.assertFalse(_should_refresh_early(near, beta=0.5))
+            self.assertFalse(_should_refresh_early(Entry({}, 0.0, now + 0.1), beta=1.0))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@patch('client_user.knowledge_sources.search_internal_docs', new=lambda query: [])
+@patch('client_user.audit.audit_writer.background', new=False)
+class CacheStatsViewTests(TestCase):
+    def auth(self, **fields):
+        user = User.objects.create_user(password='pw', **fields)
+        return {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+
+    def test_staff_only(self):
+        response = self.client.get(
+            '/api/knowledge/cache-stats/', headers=self.auth(username='learner')
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @patch('client_user.utils.get_system_data', return_value={'results': []})
+    @patch('client_user.knowledge_sources.aget_wikipedia_summary', new_callable=AsyncMock)
+    def test_reports_tier_hit_ratios(self, wiki, system_data):
+        wiki.return_value = 'Gravity is a force.'
+        headers = self.auth(username='admin', is_staff=True)
+        from .cache import knowledge_cache
+        knowledge_cache.clear()
+
+        for _ in range(3):
+            self.client.get('/api/knowledge/', {'q': 'gravity'}, headers=headers)
+        stats = self.client.get('/api/knowledge/cache-stats/', headers=headers).json()
+
+        self.assertEqual(stats['l1']['hits'], 2)
+        self.assertEqual(stats['l1']['misses'], 1)
+        self.assertEqual(stats['l2']['misses'], 1)
+        self.assertEqual(stats['l2']['backend'], 'LocMemCache')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@patch('client_user.knowledge_sources.search_internal_docs', new=lambda query: [])
+@patch('client_user.audit.audit_writer.background', new=False)
+class KnowledgeViewStampedeTests(TestCase):
+    @patch('client_user.utils.get_system_data', return_value={'results': []})
+    @patch('client_user.knowledge_sources.aget_wikipedia_summary')
+    async def test_concurrent_misses_hit_upstream_once(self, wiki, system_data):
+        from .cache import knowledge_cache
+        knowledge_cache.clear()
+        user = await User.objects.acreate(username='learner')
+        token = await Token.objects.acreate(user=user)
+
+        async def slow_wikipedia(query, lang='en'):
+            await asyncio.sleep(0.2)
+            return 'Gravity is a force.'
+        wiki.side_effect = slow_wikipedia
+
+        responses = await asyncio.gather(*(
+            self.async_client.get(
+                '/api/knowledge/', {'q': 'gravity'},
+                headers={'Authorization': f'Token {token.key}'},
+            )
+            for _ in range(10)
+        ))
+
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(wiki.await_count, 1)
+
+
+class HashingEmbedderTests(SimpleTestCase):
+    def setUp(self):
+        self.embedder = HashingEmbedder()
+
+    def similarity(self, a, b):
+        return float(self.embedder.embed(a) @ self.embedder.embed(b))
+
+    def test_phrasings_of_one_question_match(self):
+        self.assertGreater(self.similarity('What is gravity?', 'can you explain gravity'), 0.99)
+        self.assertGreater(self.similarity("newton's laws of motion", 'explain newtons law of motion'), 0.99)
+
+    def test_different_topics_stay_apart(self):
+        self.assertLess(self.similarity('black holes', 'the black death'), 0.7)
+        self.assertLess(self.similarity('cell division', 'cell membrane'), 0.7)
+
+    def test_vectors_are_unit_length_and_stable(self):
+        vector = self.embedder.embed('photosynthesis')
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+        self.assertEqual(vector.dtype, np.float32)
+        self.assertTrue(np.array_equal(vector, HashingEmbedder().embed('photosynthesis')))
+        self.assertFalse(self.embedder.embed('what is it?').any())
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = SemanticCache(threshold=0.85, max_per_user=2, max_users=2)
+
+    def test_lookup_is_per_user_and_thresholded(self):
+        self.cache.add(1, 'what is gravity', 'k-gravity')
+        self.assertEqual(self.cache.lookup(1, 'explain gravity')[0], 'k-gravity')
+        self.assertIsNone(self.cache.lookup(2, 'explain gravity'))
+        self.assertIsNone(self.cache.lookup(1, 'gravitational waves'))
+
+    def test_own_key_is_excluded(self):
+        self.cache.add(1, 'what is gravity', 'k-gravity')
+        self.assertIsNone(self.cache.lookup(1, 'what is gravity', exclude='k-gravity'))
+        self.cache.add(1, 'explain gravity', 'k-explain')
+        self.assertEqual(self.cache.lookup(1, 'what is gravity', exclude='k-gravity')[0],
+                         'k-explain')
+
+    def test_ring_buffer_and_user_eviction(self):
+        for topic in ('gravity', 'volcanoes', 'earthquakes'):
+            self.cache.add(1, topic, topic)
+        self.assertIsNone(self.cache.lookup(1, 'gravity'))
+        self.assertEqual(self.cache.lookup(1, 'volcanoes')[0], 'volcanoes')
+
+        self.cache.add(2, 'gravity', 'g2')
+        self.cache.add(3, 'gravity', 'g3')
+        self.assertIsNone(self.cache.lookup(1, 'volcanoes'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, KNOWLEDGE_SEMANTIC_CACHE=True)
+@patch('client_user.knowledge_sources.search_internal_docs', new=lambda query: [])
+@patch('client_user.audit.audit_writer.background', new=False)
+class SemanticKnowledgeViewTests(TestCase):
+    @patch('client_user.utils.get_system_data', return_value={'results': []})
+    @patch('client_user.knowledge_sources.aget_wikipedia_summary', new_callable=AsyncMock)
+    def test_rephrased_question_is_served_from_cache(self, wiki, system_data):
+        from .cache import knowledge_cache, semantic_cache
+        knowledge_cache.clear()
+        semantic_cache.clear()
+        wiki.side_effect = lambda query, lang='en': f'About {query}.'
+        user = User.objects.create_user(username='learner', password='pw')
+        headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+
+        first = self.client.get('/api/knowledge/', {'q': 'What is gravity?'}, headers=headers)
+        second = self.client.get('/api/knowledge/', {'q': 'can you explain gravity'}, headers=headers)
+        other = self.client.get('/api/knowledge/', {'q': 'volcanoes'}, headers=headers)
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(wiki.await_count, 2)
+        self.assertNotEqual(other.json(), first.json())
+        self.assertEqual((semantic_cache.stats.hits, semantic_cache.stats.misses), (1, 2))
+
+        # the same question again is an exact hit, not a semantic one
+        self.client.get('/api/knowledge/', {'q': 'What is gravity?'}, headers=headers)
+        # a neighbour whose results were evicted is no hit either
+        knowledge_cache.clear()
+        semantic_cache.stats.hits = semantic_cache.stats.misses = 0
+        self.client.get('/api/knowledge/', {'q': 'please explain gravity'}, headers=headers)
+        self.assertEqual((semantic_cache.stats.hits, semantic_cache.stats.misses), (0, 1))
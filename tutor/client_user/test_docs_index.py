@@ -0,0 +1,233 @@
+import fcntl
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest.mock import Mock, call, patch
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from . import knowledge_sources
+from .docs_index import DocsIndex, tokenize
+from .docs_snapshot import DocsRefresher, DocsSnapshotStore
+
+DOCS = [
+    {
+        'title': 'Onboarding guide',
+        'content': 'Welcome aboard. This guide explains how to request a laptop and set up VPN access.',
+        'tags': ['hr', 'it'],
+        'source': 'confluence', 'url': 'https://wiki/onboarding', 'updated_at': '2025-01-01',
+    },
+    {
+        'title': 'VPN troubleshooting',
+        'content': 'If the VPN client fails to connect, restart it. VPN logs live in the support folder.',
+        'tags': ['it', 'vpn'],
+        'source': 'confluence', 'url': 'https://wiki/vpn', 'updated_at': '2025-02-01',
+    },
+    {
+        'title': 'Expense policy',
+        'content': 'Submit expenses within thirty days. ' + 'Receipts are required for every claim. ' * 5,
+        'tags': ['finance'],
+        'source': 'drive', 'url': 'https://drive/expenses', 'updated_at': '2025-03-01',
+    },
+]
+
+
+class DocsIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = DocsIndex(DOCS)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Don't panic, VPN-users!"), ['don', 't', 'panic', 'vpn', 'users'])
+
+    def test_title_and_tag_matches_rank_first(self):
+        results = self.index.search('vpn')
+        self.assertEqual([r['url'] for r in results], ['https://wiki/vpn', 'https://wiki/onboarding'])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_multi_term_query_matches_any_term(self):
+        results = self.index.search('laptop receipts')
+        self.assertEqual(
+            {r['url'] for r in results}, {'https://wiki/onboarding', 'https://drive/expenses'}
+        )
+
+    def test_rare_terms_outweigh_common_ones(self):
+        docs = [
+            dict(DOCS[0], content='the ' * 20 + 'end', url='common'),
+            dict(DOCS[0], content='the laptop', url='rare'),
+            dict(DOCS[0], content='the end', url='other'),
+        ]
+        results = DocsIndex(docs).search('the laptop')
+        self.assertEqual(results[0]['url'], 'rare')
+
+    def test_excerpt_is_cut_around_first_match(self):
+        result = self.index.search('support')[0]
+        self.assertTrue(result['excerpt'].startswith('...'))
+        self.assertIn('support folder', result['excerpt'])
+        self.assertEqual(result['last_updated'], '2025-02-01')
+
+    def test_limit_and_misses(self):
+        self.assertEqual(len(self.index.search('vpn', limit=1)), 1)
+        self.assertEqual(self.index.search('kubernetes'), [])
+        self.assertEqual(self.index.search(''), [])
+        self.assertEqual(DocsIndex([]).search('vpn'), [])
+
+
+class DocsSnapshotStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = DocsSnapshotStore(self.tmp.name, check_interval=0)
+
+    def test_saved_index_is_memory_mapped_and_equivalent(self):
+        self.store.publish(DOCS)
+        index = self.store.current()
+
+        self.assertIsInstance(index.doc_ids, np.memmap)
+        self.assertFalse(index.doc_ids.flags.writeable)
+        self.assertEqual(len(index), len(DOCS))
+        for query in ('vpn', 'laptop receipts', 'support', 'kubernetes'):
+            self.assertEqual(index.search(query), DocsIndex(DOCS).search(query))
+
+    def test_readers_switch_to_new_version(self):
+        reader = DocsSnapshotStore(self.tmp.name, check_interval=0)
+        self.assertIsNone(reader.current())
+
+        first = self.store.publish(DOCS[:1])
+        self.assertEqual(len(reader.current()), 1)
+        second = self.store.publish(DOCS)
+        self.assertEqual(len(reader.current()), 3)
+        self.assertNotEqual(first, second)
+        self.assertEqual(reader.current_version(), second)
+
+    def test_old_versions_are_pruned(self):
+        versions = [self.store.publish(DOCS) for _ in range(4)]
+        kept = sorted(d for d in os.listdir(self.tmp.name) if d.startswith('v'))
+        self.assertEqual(kept, versions[-2:])
+
+    def test_only_one_process_rebuilds(self):
+        build = Mock(return_value=(DOCS, {}))
+        with open(os.path.join(self.tmp.name, '.lock'), 'a') as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            self.assertFalse(self.store.rebuild(build))
+        build.assert_not_called()
+
+        self.assertTrue(self.store.rebuild(build, max_age=900))
+        self.assertTrue(self.store.rebuild(build, max_age=900))
+        self.assertEqual(build.call_count, 1)
+
+
+def edited(doc, **changes):
+    return dict(doc, **changes)
+
+
+class DocsRefresherTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = DocsSnapshotStore(tmp.name, check_interval=0)
+        self.fetch = Mock(return_value=DOCS)
+        self.refresher = DocsRefresher(self.store, self.fetch, interval=900)
+
+    def test_first_sync_is_full(self):
+        self.refresher.refresh()
+        self.fetch.assert_called_once_with(None)
+        self.assertEqual(len(self.store.current()), 3)
+        self.assertIn('full_sync_at', self.store.state())
+
+    def test_incremental_sync_merges_changed_docs(self):
+        self.refresher.refresh()
+        synced_at = self.store.state()['synced_at']
+        self.fetch.return_value = [
+            edited(DOCS[1], content='Reinstall the VPN client.', updated_at='2025-04-01'),
+            edited(DOCS[0], url='https://wiki/new', title='Parking', content='Parking permits.'),
+        ]
+
+        os.utime(os.path.join(self.store.directory, 'CURRENT'), (0, 0))
+        self.refresher.refresh()
+
+        self.assertEqual(self.fetch.call_args.args[0], datetime.fromisoformat(synced_at))
+        index = self.store.current()
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.search('reinstall')[0]['url'], 'https://wiki/vpn')
+        self.assertEqual(index.search('parking')[0]['url'], 'https://wiki/new')
+
+    def test_unchanged_docs_do_not_rebuild(self):
+        self.refresher.refresh()
+        version = self.store.current_version()
+        os.utime(os.path.join(self.store.directory, 'CURRENT'), (0, 0))
+
+        self.refresher.refresh()
+
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(self.store.current_version(), version)
+        self.assertLess(self.store.age(), 60)
+
+    def test_unchanged_datetime_stamps_do_not_rebuild(self):
+        stamped = [edited(doc, updated_at=datetime(2025, 1, day + 1, 9, 30, tzinfo=timezone.utc))
+                   for day, doc in enumerate(DOCS)]
+        self.fetch.return_value = stamped
+        self.refresher.refresh()
+        version = self.store.current_version()
+        os.utime(os.path.join(self.store.directory, 'CURRENT'), (0, 0))
+
+        self.refresher.refresh()
+        self.assertEqual(self.store.current_version(), version)
+
+        self.fetch.return_value = [edited(stamped[1], updated_at=datetime(2025, 4, 1, tzinfo=timezone.utc))]
+        os.utime(os.path.join(self.store.directory, 'CURRENT'), (0, 0))
+        self.refresher.refresh()
+        self.assertNotEqual(self.store.current_version(), version)
+
+    def test_full_sync_drops_deleted_docs(self):
+        self.refresher.refresh()
+        self.fetch.return_value = DOCS[:1]
+        self.refresher.refresh(full=True)
+        self.fetch.assert_called_with(None)
+        self.assertEqual(len(self.store.current()), 1)
+
+    def test_background_thread_syncs_stale_snapshot(self):
+        self.refresher.start()
+        self.addCleanup(self.refresher.stop)
+        self.assertTrue(self.refresher.synced.wait(5))
+        self.assertEqual(len(self.store.current()), 3)
+
+
+class SearchInternalDocsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(INTERNAL_DOCS_SNAPSHOT_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(lambda: knowledge_sources._docs_refreshers.pop(tmp.name).stop())
+
+    def test_requests_never_wait_for_a_sync(self):
+        def slow_fetch(since):
+            time.sleep(0.3)
+            return DOCS
+
+        with patch.object(knowledge_sources, '_fetch_all_internal_docs', side_effect=slow_fetch):
+            start = time.monotonic()
+            self.assertEqual(knowledge_sources.search_internal_docs('expenses'), [])
+            self.assertLess(time.monotonic() - start, 0.1)
+
+            refresher = knowledge_sources._docs_refresher()
+            self.assertTrue(refresher.synced.wait(5))
+            refresher.store.check_interval = 0
+            results = knowledge_sources.search_internal_docs('expenses')
+
+        self.assertEqual(results[0]['title'], 'Expense policy')
+
+    def test_refresh_cache_requests_a_full_sync(self):
+        with patch.object(knowledge_sources, '_fetch_all_internal_docs', return_value=DOCS) as fetch:
+            knowledge_sources.search_internal_docs('expenses')
+            refresher = knowledge_sources._docs_refresher()
+            self.assertTrue(refresher.synced.wait(5))
+            refresher.synced.clear()
+
+            knowledge_sources.search_internal_docs('expenses', refresh_cache=True)
+            self.assertTrue(refresher.synced.wait(5))
+
+        self.assertEqual(fetch.call_args_list, [call(None), call(None)])
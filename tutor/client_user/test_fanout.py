@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from .fanout import fan_out
+from .utils import get_system_data
+
+
+def slow(delay, value=None, error=None):
+    def call():
+        time.sleep(delay)
+        if error:
+            raise error
+        return value
+    return call
+
+
+def source(delay, *urls):
+    def search(query):
+        time.sleep(delay)
+        return {'results': [{'title': url, 'url': url, 'source': 'test'} for url in urls]}
+    return search
+
+
+class FanOutTests(SimpleTestCase):
+    def test_latency_tracks_slowest_source(self):
+        start = time.monotonic()
+        outcomes = fan_out(
+            {'a': slow(0.1, 1), 'b': slow(0.1, 2), 'c': slow(0.1, 3)}, deadline=1.0
+        )
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.25)
+        self.assertEqual([o.value for o in outcomes.values()], [1, 2, 3])
+        self.assertTrue(all(o.ok for o in outcomes.values()))
+
+    def test_global_deadline_returns_partial_results(self):
+        start = time.monotonic()
+        outcomes = fan_out({'fast': slow(0.01, 'x'), 'stuck': slow(1.0, 'y')}, deadline=0.1)
+
+        self.assertLess(time.monotonic() - start, 0.3)
+        self.assertEqual(outcomes['fast'].value, 'x')
+        self.assertEqual(outcomes['stuck'].status, 'timeout')
+
+    def test_per_source_deadline(self):
+        outcomes = fan_out(
+            {'a': slow(0.15, 'a'), 'b': slow(0.15, 'b')},
+            deadline=1.0,
+            source_deadlines={'b': 0.05},
+        )
+        self.assertEqual(outcomes['a'].status, 'ok')
+        self.assertEqual(outcomes['b'].status, 'timeout')
+
+    def test_errors_are_isolated(self):
+        outcomes = fan_out(
+            {'ok': slow(0, 'fine'), 'broken': slow(0, error=RuntimeError('boom'))},
+            deadline=1.0,
+        )
+        self.assertEqual(outcomes['ok'].value, 'fine')
+        self.assertEqual(outcomes['broken'].status, 'error')
+        self.assertEqual(outcomes['broken'].error, 'boom')
+
+    def test_hung_source_does_not_starve_later_calls(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        # more calls than the old shared pool had threads
+        for _ in range(20):
+            outcomes = fan_out(
+                {'hung': lambda: release.wait(10), 'healthy': slow(0, 'fine')}, deadline=0.05
+            )
+            self.assertEqual(outcomes['hung'].status, 'timeout')
+            self.assertEqual(outcomes['healthy'].value, 'fine')
+
+
+class GetSystemDataTests(SimpleTestCase):
+    @override_settings(KNOWLEDGE_FANOUT_DEADLINE=0.2, KNOWLEDGE_SOURCE_DEADLINES={})
+    def test_marks_timed_out_sources(self):
+        sources = {
+            'sharepoint': source(0.01, 'https://a', 'https://b'),
+            'salesforce': source(0.01, 'https://b', 'https://c'),
+            'azure_search': source(1.0, 'https://d'),
+        }
+        with patch('client_user.utils.get_knowledge_sources', return_value=sources):
+            start = time.monotonic()
+            data = get_system_data('gravity')
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([r['url'] for r in data['results']], ['https://a', 'https://b', 'https://c'])
+        self.assertEqual(data['sources_queried'], ['sharepoint', 'salesforce', 'azure_search'])
+        self.assertEqual(data['sources_timed_out'], ['azure_search'])
+        self.assertTrue(data['partial'])
+
+    def test_no_integrations(self):
+        with patch('client_user.utils.get_knowledge_sources', return_value={}):
+            data = get_system_data('gravity')
+        self.assertEqual(data['results'], [])
+        self.assertFalse(data['partial'])
+
+
+def wiki(delay, text):
+    def get_wikipedia_summary(query, lang='en'):
+        time.sleep(delay)
+        return text
+    return get_wikipedia_summary
+
+
+def docs(delay, *titles):
+    def search_internal_docs(query, refresh_cache=False):
+        time.sleep(delay)
+        return [{'title': t, 'excerpt': f'about {query}'} for t in titles]
+    return search_internal_docs
+
+
+@override_settings(KNOWLEDGE_SUMMARY_DEADLINE=1.0)
+class KnowledgeSummaryRaceTests(SimpleTestCase):
+    def summarize(self, wikipedia, internal_docs, **settings):
+        from .utils import get_knowledge_base_summary
+        with override_settings(**settings), \
+                patch('client_user.knowledge_sources.get_wikipedia_summary', wikipedia), \
+                patch('client_user.knowledge_sources.search_internal_docs', internal_docs):
+            start = time.monotonic()
+            summary = get_knowledge_base_summary('gravity')
+            return summary, time.monotonic() - start
+
+    def test_wikipedia_miss_does_not_serialize_internal_docs(self):
+        summary, elapsed = self.summarize(wiki(0.2, None), docs(0.2, 'Physics 101'))
+        self.assertEqual(summary, '- Physics 101: about gravity')
+        self.assertLess(elapsed, 0.35)
+
+    def test_preferred_source_wins_even_when_slower(self):
+        summary, _ = self.summarize(wiki(0.1, 'From Wikipedia'), docs(0, 'Physics 101'))
+        self.assertEqual(summary, 'From Wikipedia')
+
+    def test_preferred_answer_returns_without_waiting_for_the_other(self):
+        summary, elapsed = self.summarize(wiki(0, 'From Wikipedia'), docs(0.5, 'Physics 101'))
+        self.assertEqual(summary, 'From Wikipedia')
+        self.assertLess(elapsed, 0.3)
+
+    def test_internal_docs_precedence(self):
+        summary, _ = self.summarize(
+            wiki(0, 'From Wikipedia'), docs(0.1, 'Physics 101'),
+            KNOWLEDGE_SUMMARY_PRECEDENCE='internal_docs',
+        )
+        self.assertEqual(summary, '- Physics 101: about gravity')
+
+    def test_first_precedence(self):
+        summary, _ = self.summarize(
+            wiki(0.2, 'From Wikipedia'), docs(0, 'Physics 101'),
+            KNOWLEDGE_SUMMARY_PRECEDENCE='first',
+        )
+        self.assertEqual(summary, '- Physics 101: about gravity')
+
+    def test_deadline_uses_what_arrived(self):
+        summary, elapsed = self.summarize(
+            wiki(1.0, 'Too late'), docs(0, 'Physics 101'),
+            KNOWLEDGE_SUMMARY_DEADLINE=0.1,
+        )
+        self.assertEqual(summary, '- Physics 101: about gravity')
+        self.assertLess(elapsed, 0.3)
+
+    def test_async_variant_races_too(self):
+        from asgiref.sync import async_to_sync
+        from .utils import aget_knowledge_base_summary
+
+        async def awiki(query, lang='en'):
+            await asyncio.sleep(0.2)
+            return None
+
+        with patch('client_user.knowledge_sources.aget_wikipedia_summary', awiki), \
+                patch('client_user.knowledge_sources.search_internal_docs', docs(0.2, 'Physics 101')):
+            start = time.monotonic()
+            summary = async_to_sync(aget_knowledge_base_summary)('gravity')
+        self.assertEqual(summary, '- Physics 101: about gravity')
+        self.assertLess(time.monotonic() - start, 0.35)
@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+
+from benchmarks.fake_ollama import FakeOllama
+
+from .llm import LLMError, LLMStats, LLMTimeout, OllamaClient
+from .models import User
+from .test_streaming import use_fake_ollama
+from .utils import summarize_with_llama2
+
+
+class OllamaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.fake = FakeOllama(reply=lambda prompt: f'Summary of {prompt}').start()
+        self.addCleanup(self.fake.stop)
+
+    def make_client(self, **options):
+        client = OllamaClient(base_url=self.fake.url, model='tiny', backoff=0.01, **options)
+        self.addCleanup(client.close)
+        return client
+
+    def test_connections_are_pooled(self):
+        client = self.make_client()
+        for i in range(5):
+            self.assertEqual(client.generate(f'q{i}'), f'Summary of q{i}')
+        self.assertEqual(len(self.fake.connections), 1)
+        self.assertEqual(self.fake.requests[0]['keep_alive'], '30m')
+        self.assertEqual(client.stats.requests, 5)
+
+    def test_concurrency_is_bounded_and_queue_depth_measured(self):
+        self.fake.first_token_delay = 0.1
+        client = self.make_client(max_concurrency=2)
+        with ThreadPoolExecutor(6) as pool:
+            results = list(pool.map(client.generate, [f'q{i}' for i in range(6)]))
+
+        self.assertEqual(results, [f'Summary of q{i}' for i in range(6)])
+        self.assertEqual(self.fake.max_concurrent, 2)
+        stats = client.stats.to_dict()
+        self.assertGreaterEqual(stats['max_waiting'], 3)
+        self.assertGreater(stats['wait_seconds'], 0.2)
+        self.assertEqual((stats['in_flight'], stats['waiting']), (0, 0))
+
+    def test_retries_transient_failures(self):
+        self.fake.fail_next = 2
+        client = self.make_client()
+        self.assertEqual(client.generate('q'), 'Summary of q')
+        self.assertEqual(client.stats.retries, 2)
+        self.assertEqual(len(self.fake.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.fake.fail_next, self.fake.fail_status = 1, 400
+        client = self.make_client()
+        with self.assertRaisesRegex(LLMError, 'HTTP 400'):
+            client.generate('q')
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertEqual(client.stats.failures, 1)
+
+    def test_retries_stop_at_the_deadline(self):
+        self.fake.fail_next = 1000
+        client = self.make_client(retries=1000, deadline=0.3)
+        start = time.monotonic()
+        with self.assertRaises(LLMError):
+            client.generate('q')
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertGreater(client.stats.retries, 2)
+
+    def test_no_free_slot_before_the_deadline(self):
+        self.fake.first_token_delay = 0.5
+        client = self.make_client(max_concurrency=1)
+        busy = threading.Thread(target=client.generate, args=('long',))
+        busy.start()
+        time.sleep(0.1)
+        with self.assertRaises(LLMTimeout):
+            client.generate('q', deadline=0.1)
+        busy.join()
+        self.assertEqual(client.stats.timeouts, 1)
+        self.assertEqual(client.generate('q'), 'Summary of q')
+
+    def test_stream_retries_before_the_first_token(self):
+        self.fake.fail_next = 1
+        client = self.make_client()
+        self.assertEqual(list(client.stream('q')), ['Summary', ' of', ' q'])
+        self.assertEqual(client.stats.retries, 1)
+
+    async def test_closing_a_stream_frees_its_slot(self):
+        self.fake.token_delay = 0.05
+        client = self.make_client(max_concurrency=1)
+        tokens = client.astream('a long question')
+        self.assertEqual(await tokens.__anext__(), 'Summary')
+        await tokens.aclose()
+        self.assertEqual(client.stats.in_flight, 0)
+        self.assertEqual(await client.agenerate('q', deadline=0.5), 'Summary of q')
+
+    async def test_cancelling_a_stream_frees_its_slot(self):
+        self.fake.token_delay = 0.05
+        client = self.make_client(max_concurrency=1)
+        received = []
+
+        async def consume():
+            async for token in client.astream('a long question'):
+                received.append(token)
+
+        task = asyncio.create_task(consume())
+        while not received:
+            await asyncio.sleep(0.01)
+        task.cancel()  # e.g. the SSE client went away, next() is mid-read
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(client.stats.in_flight, 0)
+        self.assertEqual(await client.agenerate('q', deadline=0.5), 'Summary of q')
+
+    def test_warm_up_and_keepalive_pings(self):
+        client = self.make_client(keepalive_interval=0.05, keep_alive='1h')
+        self.assertTrue(client.warm_up())
+        self.assertEqual(self.fake.requests[0], {'model': 'tiny', 'prompt': '', 'keep_alive': '1h'})
+
+        client.generate('q')  # starts the pinger
+        time.sleep(0.3)
+        client.close()
+        self.assertGreaterEqual(client.stats.keepalive_pings, 3)
+        self.assertFalse(OllamaClient(base_url='http://127.0.0.1:9', connect_timeout=0.5).warm_up())
+
+
+class LLMStatsViewTests(TestCase):
+    def auth(self, **fields):
+        user = User.objects.create_user(password='pw', **fields)
+        return {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+
+    def test_staff_only(self):
+        response = self.client.get('/api/llm/stats/', headers=self.auth(username='learner'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_reports_the_shared_client(self):
+        fake = FakeOllama().start()
+        self.addCleanup(fake.stop)
+        use_fake_ollama(self, fake, _stats=LLMStats())
+        summarize_with_llama2('gravity')
+
+        stats = self.client.get('/api/llm/stats/',
+                                headers=self.auth(username='admin', is_staff=True)).json()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['in_flight'], 0)
@@ -0,0 +1,112 @@
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .models import InteractionHistory, User, WeeklySummary
+from .precompute import (
+    FAILED, SUMMARIZED, Checkpoint, RateLimiter, precompute_weekly_summaries,
+)
+from .summary_jobs import current_week
+from .test_summarization import FakeLLM
+
+WEEK = current_week()
+
+
+class PrecomputeTests(TestCase):
+    def setUp(self):
+        self.llm = FakeLLM()
+        patcher = patch('client_user.precompute.summarize_with_llama2', self.llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.checkpoint = Checkpoint(Path(tempfile.mkdtemp()) / 'weekly.jsonl', WEEK[0])
+        for name in ('ada', 'bob', 'cy'):
+            self.add(name, f'{name} learned about gravity.')
+
+    def add(self, username, text):
+        user, _ = User.objects.get_or_create(username=username)
+        return InteractionHistory.objects.create(user=user, username=username, agent_response=text)
+
+    def run_precompute(self, **options):
+        return precompute_weekly_summaries(*WEEK, self.checkpoint, processes=0, **options)
+
+    def test_summarizes_every_active_user_once(self):
+        stats = self.run_precompute()
+        self.assertEqual((stats.summarized, stats.unchanged, stats.failed), (3, 0, 0))
+        self.assertEqual(len(self.llm.prompts), 3)
+        summary = WeeklySummary.objects.get(username='bob', period_start=WEEK[0])
+        self.assertIn('bob learned about gravity.', summary.summary['text'])
+        self.assertFalse(self.checkpoint.path.exists())  # finished, nothing to resume
+
+        # Only users with new interactions are summarized again
+        self.add('cy', 'cy learned about orbits.')
+        stats = self.run_precompute()
+        self.assertEqual((stats.summarized, stats.unchanged), (1, 2))
+        self.assertEqual(len(self.llm.prompts), 4)
+        self.assertIn('cy learned about orbits.', self.llm.prompts[-1])
+
+    def test_interrupted_run_resumes(self):
+        stop = threading.Event()
+        stats = self.run_precompute(stop=stop, on_progress=lambda username, outcome: stop.set())
+        self.assertEqual(stats.summarized, 1)
+        self.assertTrue(self.checkpoint.path.exists())
+
+        # A summary saved by the first run but lost since is not rebuilt on resume
+        WeeklySummary.objects.all().delete()
+        stats = self.run_precompute()
+        self.assertEqual((stats.resumed, stats.summarized), (1, 2))
+        self.assertEqual(set(WeeklySummary.objects.values_list('username', flat=True)),
+                         {'bob', 'cy'})
+        self.assertFalse(self.checkpoint.path.exists())
+
+    def test_restart_ignores_earlier_progress(self):
+        self.checkpoint.start_run(resume=False)
+        self.checkpoint.record('ada', SUMMARIZED)
+        stats = self.run_precompute(resume=False)
+        self.assertEqual((stats.resumed, stats.summarized), (0, 3))
+
+    def test_failed_users_are_retried_on_resume(self):
+        with patch('client_user.precompute.generate_summary', side_effect=ConnectionError('down')):
+            stats = self.run_precompute()
+        self.assertEqual(stats.failed, 3)
+        self.assertEqual(self.checkpoint.load(), set())
+
+        stats = self.run_precompute()
+        self.assertEqual((stats.resumed, stats.summarized), (0, 3))
+
+    def test_checkpoint_of_another_week_is_ignored(self):
+        self.checkpoint.start_run(resume=False)
+        self.checkpoint.record('ada', SUMMARIZED)
+        self.checkpoint.record('bob', FAILED)
+        with open(self.checkpoint.path, 'a') as f:
+            f.write('{"week": "2026-')  # torn by a kill
+        self.assertEqual(self.checkpoint.load(), {'ada'})
+        self.assertEqual(Checkpoint(self.checkpoint.path, WEEK[1]).load(), set())
+
+    def test_rate_limit(self):
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.wait()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(self.run_precompute(rate=50).summarized, 3)
+
+    def test_command(self):
+        out = StringIO()
+        with patch('client_user.management.commands.precompute_weekly_summaries.ollama'):
+            call_command('precompute_weekly_summaries', '--processes', '0', '--rate', '0',
+                         '--checkpoint', str(self.checkpoint.path), stdout=out)
+        self.assertIn('summarized 3 users, 0 unchanged', out.getvalue())
+        self.assertEqual(WeeklySummary.objects.count(), 3)
+
+    def test_only_users_active_in_the_week(self):
+        User.objects.create(username='idle')
+        self.assertEqual(self.run_precompute().to_dict(), {
+            'summarized': 3, 'unchanged': 0, 'empty': 0, 'resumed': 0, 'failed': 0,
+        })
+        self.assertFalse(WeeklySummary.objects.filter(username='idle').exists())
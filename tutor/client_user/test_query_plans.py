@@ -0,0 +1,82 @@
+import re
+import unittest
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .models import InteractionHistory, User, WeeklySummary
+from .precompute import active_users
+from .summarization import period_interactions
+from .summary_jobs import cached_summary, current_week
+
+WEEK = current_week()
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "plans are read from SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTests(TestCase):
+    """
+    The hot queries must search an index on all of their conditions: a
+    SCAN, a condition missing from the index search (e.g. a date cast) or
+    a temporary sort fails the test
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        InteractionHistory.objects.create(user=self.user, username='learner', agent_response='Hi.')
+
+    def plans(self, run):
+        """EXPLAIN QUERY PLAN of every query `run` executes, by table"""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                table = re.search(r'FROM "(\w+)"', query['sql']).group(1)
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plans[table] = "\n".join(row[-1] for row in cursor.fetchall())
+        return plans
+
+    def assertIndexSearch(self, plan, table, conditions):
+        self.assertNotRegex(plan, rf'SCAN {table}\b')
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertRegex(plan, rf'SEARCH {table} USING (COVERING )?INDEX \w+ \({re.escape(conditions)}\)')
+
+    def test_period_history(self):
+        plans = self.plans(lambda: list(period_interactions('learner', *WEEK,
+                                                            fields=['agent_response'])))
+        self.assertIndexSearch(plans['client_user_interactionhistory'],
+                               'client_user_interactionhistory',
+                               'username=? AND timestamp>? AND timestamp<?')
+        self.assertIndexSearch(plans['client_user_interactionarchive'],
+                               'client_user_interactionarchive',
+                               'username=? AND last_timestamp>?')
+
+    def test_active_users(self):
+        plans = self.plans(lambda: active_users(*WEEK))
+        # No index starts with the timestamp: the usernames are read off the
+        # (username, timestamp) index alone, one row per username
+        plan = plans['client_user_interactionhistory']
+        self.assertRegex(plan, r'SCAN client_user_interactionhistory USING COVERING INDEX')
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('TEMP B-TREE', plans['client_user_interactionarchive'])
+
+    def test_summary_lookups(self):
+        plans = self.plans(lambda: cached_summary('learner', *WEEK))
+        # the history is not read, only the week's rollup version
+        self.assertEqual(set(plans), {'client_user_summaryofhistory', 'client_user_weeklysummary'})
+        self.assertIndexSearch(plans['client_user_summaryofhistory'], 'client_user_summaryofhistory',
+                               'username=? AND granularity=? AND period_start=?')
+        self.assertIndexSearch(plans['client_user_weeklysummary'],
+                               'client_user_weeklysummary', 'content_hash=?')
+
+        plan = WeeklySummary.objects.filter(
+            username='learner', period_start=WEEK[0], period_end=WEEK[1]
+        ).explain()
+        self.assertIndexSearch(plan, 'client_user_weeklysummary',
+                               'username=? AND period_start=? AND period_end=?')
+
+    def test_recent_interactions(self):
+        plans = self.plans(lambda: list(self.user.get_recent_interactions()))
+        self.assertIndexSearch(plans['client_user_interactionhistory'],
+                               'client_user_interactionhistory', 'user_id=?')
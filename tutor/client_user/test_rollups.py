@@ -0,0 +1,150 @@
+from collections import deque
+from datetime import date, datetime, time as dtime, timezone as dt_timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from .audit import audit_writer
+from .models import InteractionHistory, SummaryOfHistory, User
+from .rollups import DAY, MONTH, WEEK, RollupSummarizer, cover, mark_dirty, period_of
+from .test_summarization import FakeLLM
+
+MONDAY = date(2026, 10, 12)
+
+
+class PeriodTests(TestCase):
+    def test_period_of(self):
+        day = date(2026, 10, 14)
+        self.assertEqual(period_of(DAY, day), (day, day))
+        self.assertEqual(period_of(WEEK, day), (MONDAY, date(2026, 10, 18)))
+        self.assertEqual(period_of(MONTH, day), (date(2026, 10, 1), date(2026, 10, 31)))
+        self.assertEqual(period_of(MONTH, date(2028, 2, 3))[1], date(2028, 2, 29))
+
+    def test_cover(self):
+        self.assertEqual(cover(date(2026, 9, 29), date(2026, 11, 3)), [
+            (DAY, date(2026, 9, 29), date(2026, 9, 29)),
+            (DAY, date(2026, 9, 30), date(2026, 9, 30)),
+            (MONTH, date(2026, 10, 1), date(2026, 10, 31)),
+            (DAY, date(2026, 11, 1), date(2026, 11, 1)),
+            (DAY, date(2026, 11, 2), date(2026, 11, 2)),
+            (DAY, date(2026, 11, 3), date(2026, 11, 3)),
+        ])
+        self.assertEqual(
+            [g for g, _, _ in cover(date(2026, 10, 1), date(2026, 10, 31), (WEEK, DAY))],
+            [DAY] * 4 + [WEEK] * 3 + [DAY] * 6,
+        )
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.llm = FakeLLM()
+        self.rollups = RollupSummarizer(self.llm)
+
+    def add(self, day, text):
+        moment = datetime.combine(day, dtime(12), tzinfo=dt_timezone.utc)
+        with patch('django.utils.timezone.now', return_value=moment):
+            return InteractionHistory.objects.create(
+                user=self.user, username='learner', agent_response=text
+            )
+
+    def node(self, granularity, start):
+        return SummaryOfHistory.objects.get(
+            username='learner', granularity=granularity, period_start=start
+        )
+
+    def week(self):
+        return self.rollups.compose('learner', MONDAY, date(2026, 10, 18))
+
+    def test_saving_an_interaction_marks_its_nodes_dirty(self):
+        self.add(date(2026, 10, 14), 'Gravity pulls.')
+        nodes = SummaryOfHistory.objects.order_by('granularity')
+        self.assertEqual(
+            [(n.granularity, n.period_start, n.period_end, n.dirty) for n in nodes],
+            [(DAY, date(2026, 10, 14), date(2026, 10, 14), True),
+             (MONTH, date(2026, 10, 1), date(2026, 10, 31), True),
+             (WEEK, MONDAY, date(2026, 10, 18), True)],
+        )
+
+    def test_week_is_composed_from_day_rollups(self):
+        for day, text in ((12, 'Gravity pulls.'), (14, 'Orbits are falling.'), (16, 'Tides.')):
+            self.add(date(2026, 10, day), text)
+
+        summary = self.week()
+        self.assertEqual(len(self.llm.prompts), 4)  # three days and their merge
+        self.assertTrue(self.llm.prompts[-1].lstrip().startswith('The following are summaries'))
+        self.assertIn('Orbits are falling.', summary)
+        self.assertFalse(SummaryOfHistory.objects.filter(dirty=True, granularity=DAY).exists())
+
+        # served from the clean week node
+        self.assertEqual(self.rollups.refresh(self.node(WEEK, MONDAY)), summary)
+        self.assertEqual(len(self.llm.prompts), 4)
+
+    def test_late_interaction_regenerates_only_its_nodes(self):
+        for day in (12, 14, 16):
+            self.add(date(2026, 10, day), f'Lesson of the {day}th.')
+        self.add(date(2026, 10, 20), 'Next week.')
+        self.rollups.refresh_dirty()
+        calls = len(self.llm.prompts)
+
+        self.add(date(2026, 10, 14), 'A late note.')
+        self.assertEqual(
+            set(SummaryOfHistory.objects.filter(dirty=True).values_list('granularity', 'period_start')),
+            {(DAY, date(2026, 10, 14)), (WEEK, MONDAY), (MONTH, date(2026, 10, 1))},
+        )
+        summary = self.week()
+        new_prompts = self.llm.prompts[calls:]
+        self.assertEqual(len(new_prompts), 2)  # the day and the week merge
+        self.assertIn('A late note.', new_prompts[0])
+        self.assertIn('Lesson of the 12th.', summary)
+
+    def test_month_and_ranges_reuse_the_tree(self):
+        for day in (1, 12, 14, 30):
+            self.add(date(2026, 10, day), f'Lesson of October {day}.')
+        self.rollups.refresh_dirty()
+        raw_reads = sum(p.lstrip().startswith('Summarize the following') for p in self.llm.prompts)
+        self.assertEqual(raw_reads, 4)  # every day read once
+
+        month = self.node(MONTH, date(2026, 10, 1)).summary['text']
+        for day in (1, 12, 14, 30):
+            self.assertIn(f'Lesson of October {day}.', month)
+
+        calls = len(self.llm.prompts)
+        ranged = self.rollups.compose('learner', date(2026, 10, 10), date(2026, 10, 31))
+        self.assertEqual(len(self.llm.prompts), calls + 1)  # a single merge of clean nodes
+        self.assertNotIn('October 1.', ranged)
+        self.assertIsNone(self.rollups.compose('learner', date(2026, 11, 1), date(2026, 11, 30)))
+
+    def test_node_changed_while_building_stays_dirty(self):
+        interaction = self.add(date(2026, 10, 14), 'Gravity pulls.')
+
+        def racing_prompt(*args):
+            mark_dirty([interaction])  # saved while the day was being summarized
+            return 'prompt'
+
+        node = self.node(DAY, date(2026, 10, 14))
+        with patch('client_user.rollups.history_prompt', racing_prompt):
+            summary = self.rollups.refresh(node)
+        self.assertEqual(self.llm.prompts, ['prompt'])
+        node.refresh_from_db()
+        self.assertTrue(node.dirty)
+        self.assertEqual(node.summary, {'text': summary})
+
+    def test_bulk_inserts_mark_nodes_dirty(self):
+        row = InteractionHistory(user=self.user, username='learner', agent_response='queued')
+        with patch.object(audit_writer, 'background', False), \
+                patch.object(audit_writer, '_queue', deque()):
+            audit_writer.add(row)
+            audit_writer.flush()
+        self.assertEqual(SummaryOfHistory.objects.filter(dirty=True).count(), 3)
+
+    def test_command(self):
+        self.add(date(2026, 10, 14), 'Gravity pulls.')
+        out = StringIO()
+        with patch('client_user.management.commands.refresh_rollups.summarize_with_llama2',
+                   self.llm):
+            call_command('refresh_rollups', '--include-open', stdout=out)
+        self.assertIn('Rebuilt 3 rollup summaries', out.getvalue())
+        self.assertFalse(SummaryOfHistory.objects.filter(dirty=True).exists())
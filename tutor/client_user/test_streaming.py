@@ -0,0 +1,140 @@
+import json
+import time
+from datetime import datetime, time as dtime, timedelta, timezone as dt_timezone
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from benchmarks.fake_ollama import FakeOllama
+
+from .llm import ollama
+from .models import InteractionHistory, SummaryOfHistory, User, WeeklySummary
+from .summary_jobs import current_week, generate_summary
+from .utils import astream_llama2, summarize_with_llama2
+
+REPLY = ' '.join(f'word{i}' for i in range(30))
+
+
+def use_fake_ollama(test, fake, **attrs):
+    """Points the shared LLM client at `fake` for the duration of `test`"""
+    for attr, value in dict(attrs, base_url=fake.url, backoff=0.01).items():
+        patcher = patch.object(ollama, attr, value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def parse_events(chunks):
+    events = []
+    for chunk in chunks:
+        for block in chunk.decode().split('\n\n'):
+            if block:
+                event, data = block.split('\n')
+                events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class OllamaClientTests(SimpleTestCase):
+    def setUp(self):
+        self.ollama = FakeOllama(reply=lambda prompt: f'Summary of {prompt}').start()
+        self.addCleanup(self.ollama.stop)
+        use_fake_ollama(self, self.ollama, model='tiny')
+
+    def test_summarize(self):
+        self.assertEqual(summarize_with_llama2('gravity'), 'Summary of gravity')
+        self.assertEqual(self.ollama.requests[0],
+                         {'model': 'tiny', 'prompt': 'gravity', 'stream': False,
+                          'keep_alive': '30m'})
+
+    async def test_stream(self):
+        tokens = [token async for token in astream_llama2('gravity')]
+        self.assertEqual(tokens, ['Summary', ' of', ' gravity'])
+        self.assertTrue(self.ollama.requests[0]['stream'])
+
+
+class StreamWeeklySummaryTests(TestCase):
+    def setUp(self):
+        self.ollama = FakeOllama(reply=lambda prompt: REPLY,
+                                 first_token_delay=0.1, token_delay=0.05).start()
+        self.addCleanup(self.ollama.stop)
+        use_fake_ollama(self, self.ollama)
+        user = User.objects.create_user(username='learner', password='pw')
+        InteractionHistory.objects.create(user=user, username='learner',
+                                          agent_response='Gravity pulls.')
+
+    async def stream(self, username='learner'):
+        response = await self.async_client.get(f'/api/generate-weekly-summary/{username}/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        start = time.perf_counter()
+        chunks, times = [], []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk)
+            times.append(time.perf_counter() - start)
+        return parse_events(chunks), times
+
+    async def test_tokens_are_relayed_as_generated(self):
+        events, times = await self.stream()
+
+        tokens = [data['text'] for event, data in events if event == 'token']
+        self.assertEqual(''.join(tokens), REPLY)
+        self.assertEqual(len(tokens), 30)
+        # first token after the prompt evaluation, not after the whole completion
+        self.assertLess(times[0], 0.6)
+        self.assertGreater(times[-1], 1.4)
+        self.assertIn('Gravity pulls.', self.ollama.requests[0]['prompt'])
+
+        event, data = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(data['summary'], {'text': REPLY})
+        saved = await WeeklySummary.objects.aget(username='learner')
+        self.assertEqual(saved.summary, {'text': REPLY})
+
+        again, _ = await self.stream()
+        self.assertEqual([event for event, _ in again], ['done'])
+        self.assertEqual(len(self.ollama.requests), 1)
+
+    async def test_new_interaction_regenerates(self):
+        await self.stream()
+        user = await User.objects.aget(username='learner')
+        await InteractionHistory.objects.acreate(user=user, username='learner',
+                                                 agent_response='Orbits are falling.')
+        events, _ = await self.stream()
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(len(self.ollama.requests), 2)
+        self.assertIn('Orbits are falling.', self.ollama.requests[1]['prompt'])
+        self.assertEqual(await WeeklySummary.objects.acount(), 1)
+
+    async def test_streams_the_merge_of_the_day_rollups(self):
+        start, end = current_week()
+        other = start + timedelta(days=1) if timezone.localdate() == start else start
+        user = await User.objects.aget(username='learner')
+        moment = datetime.combine(other, dtime(12), tzinfo=dt_timezone.utc)
+        with patch('django.utils.timezone.now', return_value=moment):
+            await InteractionHistory.objects.acreate(user=user, username='learner',
+                                                     agent_response='Orbits are falling.')
+
+        events, _ = await self.stream()
+        self.assertEqual(events[-1][0], 'done')
+        # the two days are summarized first, then only their merge is streamed
+        self.assertEqual([request['stream'] for request in self.ollama.requests],
+                         [False, False, True])
+        merge = self.ollama.requests[-1]['prompt']
+        self.assertTrue(merge.lstrip().startswith('The following are summaries'))
+        self.assertFalse(await SummaryOfHistory.objects.filter(dirty=True, granularity='day').aexists())
+
+        # the streamed merge is the week rollup the queued job path serves
+        await WeeklySummary.objects.all().adelete()
+        summary = await sync_to_async(generate_summary)('learner', start, end)
+        self.assertEqual(summary.summary, events[-1][1]['summary'])
+        self.assertEqual(len(self.ollama.requests), 3)
+
+    async def test_no_history(self):
+        events, _ = await self.stream('nobody')
+        self.assertEqual(events, [('error', {'error': 'No interactions found for the user.'})])
+
+    async def test_llm_failure(self):
+        self.ollama.stop()
+        events, _ = await self.stream()
+        self.assertEqual(events, [('error', {'error': 'Summary generation failed'})])
+        self.assertFalse(await WeeklySummary.objects.aexists())
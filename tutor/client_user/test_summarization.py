@@ -0,0 +1,116 @@
+import threading
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .models import InteractionHistory, User
+from .summarization import MapReduceSummarizer, count_tokens, summarize_history
+from .summary_jobs import current_week
+
+
+class FakeLLM:
+    """Answers 'S[<the text of the prompt>]' and records the prompts"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.prompts = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return f"S[{prompt}]"
+
+
+def map_prompt(chunk):
+    return f"map:{chunk}"
+
+
+def reduce_prompt(summaries):
+    return f"reduce:{summaries}"
+
+
+class MapReduceSummarizerTests(SimpleTestCase):
+    def test_chunks_respect_the_budget_and_order(self):
+        summarizer = MapReduceSummarizer(FakeLLM(), chunk_tokens=10)
+        texts = ['a' * 12, 'b' * 12, 'c' * 100, '', 'd' * 8]
+        chunks = list(summarizer.chunks(texts))
+
+        self.assertTrue(all(count_tokens(c) <= 12 for c in chunks))
+        self.assertEqual(''.join(chunks).replace('\n', ''), ''.join(texts))
+        self.assertEqual(chunks[0], 'a' * 12 + '\n' + 'b' * 12)
+
+    def test_short_history_is_one_call(self):
+        llm = FakeLLM()
+        summary = MapReduceSummarizer(llm).run(['one', 'two'], map_prompt, reduce_prompt)
+        self.assertEqual(summary, 'S[map:one\ntwo]')
+        self.assertEqual(len(llm.prompts), 1)
+        self.assertIsNone(MapReduceSummarizer(llm).run([], map_prompt, reduce_prompt))
+
+    def test_long_history_stays_within_budget(self):
+        llm = FakeLLM()
+        texts = (f'interaction {i:04d} ' + 'x' * 40 for i in range(2000))
+        summary = MapReduceSummarizer(
+            lambda prompt: llm(prompt)[:60], chunk_tokens=100
+        ).run(texts, map_prompt, reduce_prompt)
+
+        self.assertTrue(summary.startswith('S[reduce:'))
+        budget = 100 + count_tokens('reduce:') + 1
+        self.assertLessEqual(max(count_tokens(p) for p in llm.prompts), budget)
+        map_prompts = [p for p in llm.prompts if p.startswith('map:')]
+        self.assertEqual(len(map_prompts), 334)  # 6 texts of 15 tokens per chunk
+        self.assertLess(len(llm.prompts) - len(map_prompts), 334)
+
+    def test_merges_keep_order(self):
+        llm = FakeLLM()
+        texts = [f'<{i}>' for i in range(20)]
+        # every text is its own chunk and two summaries fill a merge
+        summary = MapReduceSummarizer(llm, chunk_tokens=6, concurrency=3).run(
+            texts, lambda chunk: chunk, lambda summaries: summaries
+        )
+        positions = [summary.index(f'<{i}>') for i in range(20)]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_chunks_are_summarized_concurrently(self):
+        llm = FakeLLM(delay=0.05)
+        texts = ['word ' * 20 for _ in range(8)]
+        start = time.perf_counter()
+        MapReduceSummarizer(llm, chunk_tokens=30, concurrency=4).run(
+            texts, map_prompt, lambda summaries: 'r'
+        )
+        self.assertEqual(llm.max_running, 4)
+        self.assertLess(time.perf_counter() - start, 8 * 0.05)
+
+    def test_llm_error_propagates(self):
+        def fail(prompt):
+            raise ConnectionError('ollama down')
+
+        with self.assertRaises(ConnectionError):
+            MapReduceSummarizer(fail, chunk_tokens=5).run(['a' * 40] * 5, map_prompt, reduce_prompt)
+
+
+class SummarizeHistoryTests(TestCase):
+    @override_settings(SUMMARY_CHUNK_TOKENS=50)
+    def test_summarizes_the_period_in_chunks(self):
+        user = User.objects.create_user(username='learner', password='pw')
+        InteractionHistory.objects.bulk_create([
+            InteractionHistory(user=user, username='learner', agent_response=f'fact {i} ' * 10)
+            for i in range(10)
+        ])
+        InteractionHistory.objects.create(user=user, username='other', agent_response='secret')
+        llm = FakeLLM()
+
+        summary = summarize_history('learner', *current_week(), llm)
+
+        self.assertIn("from the user 'learner'", llm.prompts[0])
+        self.assertGreater(len(llm.prompts), 2)
+        self.assertTrue(all('secret' not in p for p in llm.prompts))
+        self.assertIn('Combine them', summary)
+        self.assertIsNone(summarize_history('nobody', *current_week(), llm))
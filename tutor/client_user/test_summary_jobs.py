@@ -0,0 +1,204 @@
+import asyncio
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .llm import ollama
+from .models import InteractionHistory, SummaryJob, User, WeeklySummary
+from .rollups import summary_content_hash
+from .summary_jobs import SummaryWorker, current_week, enqueue_summary, generate_summary
+
+WEEK = current_week()
+
+
+@patch('client_user.summary_jobs.summarize_with_llama2', return_value='Talked about gravity.')
+class SummaryJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        InteractionHistory.objects.create(
+            user=self.user, username='learner', agent_response='Gravity pulls.'
+        )
+        self.worker = SummaryWorker(name='test', retry_delay=60)
+
+    def test_current_week(self, summarize):
+        self.assertEqual(current_week(date(2026, 10, 18)), (date(2026, 10, 12), date(2026, 10, 18)))
+        self.assertEqual(current_week(date(2026, 10, 12))[0], date(2026, 10, 12))
+
+    def test_enqueue_deduplicates_active_jobs(self, summarize):
+        job, created = enqueue_summary('learner', *WEEK)
+        again, created_again = enqueue_summary('learner', *WEEK)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(again.id, job.id)
+        self.assertTrue(enqueue_summary('other', *WEEK)[1])
+
+        SummaryJob.objects.filter(id=job.id).update(status=SummaryJob.FAILED)
+        self.assertNotEqual(enqueue_summary('learner', *WEEK)[0].id, job.id)
+
+    def test_worker_runs_job(self, summarize):
+        job, _ = enqueue_summary('learner', *WEEK)
+        self.assertEqual(self.worker.run(once=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, SummaryJob.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.result.summary, {'text': 'Talked about gravity.'})
+        self.assertIn('Gravity pulls.', summarize.call_args[0][0])
+        self.assertIsNone(self.worker.claim())
+
+    def test_job_without_history_has_no_result(self, summarize):
+        job, _ = enqueue_summary('nobody', *WEEK)
+        self.worker.run(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, SummaryJob.DONE)
+        self.assertIsNone(job.result)
+        summarize.assert_not_called()
+
+    def test_failures_back_off_then_fail(self, summarize):
+        summarize.side_effect = ConnectionError('ollama down')
+        job, _ = enqueue_summary('learner', *WEEK)
+
+        self.worker.run(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (SummaryJob.PENDING, 1))
+        self.assertEqual(job.error, 'ollama down')
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=50))
+        self.assertIsNone(self.worker.claim())  # still backing off
+
+        for attempt in (2, 3):
+            SummaryJob.objects.filter(id=job.id).update(run_after=timezone.now())
+            self.worker.run(once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (SummaryJob.FAILED, 3))
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(WeeklySummary.objects.exists())
+
+    def test_job_of_dead_worker_is_reclaimed(self, summarize):
+        job, _ = enqueue_summary('learner', *WEEK)
+        dead = SummaryWorker(name='dead', lease=60)
+        self.assertEqual(dead.claim().id, job.id)
+        self.assertIsNone(self.worker.claim())  # lease still held
+
+        SummaryJob.objects.filter(id=job.id).update(
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(self.worker.run(once=True), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (SummaryJob.DONE, 'test', 2))
+        # the dead worker can no longer complete the job it lost
+        self.assertFalse(dead._finish(job, status=SummaryJob.FAILED))
+
+    def test_command(self, summarize):
+        enqueue_summary('learner', *WEEK)
+        out = StringIO()
+        call_command('run_summary_worker', '--once', stdout=out)
+        self.assertIn('Ran 1 summary jobs', out.getvalue())
+        self.assertTrue(WeeklySummary.objects.filter(username='learner').exists())
+
+
+@patch('client_user.summary_jobs.summarize_with_llama2', return_value='Talked about gravity.')
+class SummaryJobViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='learner', password='pw')
+        InteractionHistory.objects.create(
+            user=user, username='learner', agent_response='Gravity pulls.'
+        )
+
+    async def test_concurrent_requests_share_one_job(self, summarize):
+        responses = await asyncio.gather(*[
+            self.async_client.get('/api/generate-weekly-summary/learner/') for _ in range(5)
+        ])
+        self.assertEqual({r.status_code for r in responses}, {202})
+        self.assertEqual(len({r.json()['job_id'] for r in responses}), 1)
+        self.assertEqual(await SummaryJob.objects.acount(), 1)
+        self.assertEqual(
+            responses[0].json()['status_url'], f"/api/summary-jobs/{responses[0].json()['job_id']}/"
+        )
+
+    async def test_status_long_poll(self, summarize):
+        queued = await self.async_client.get('/api/generate-weekly-summary/learner/')
+        url = queued.json()['status_url']
+
+        pending = await self.async_client.get(url)
+        self.assertEqual(pending.json()['status'], 'pending')
+        self.assertIsNone(pending.json()['result'])
+
+        async def run_worker():
+            await asyncio.sleep(0.3)
+            await sync_to_async(SummaryWorker(name='test').run)(once=True)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        done, _ = await asyncio.gather(self.async_client.get(url, {'wait': 10}), run_worker())
+        self.assertLess(loop.time() - start, 5)
+        self.assertEqual(done.json()['status'], 'done')
+        self.assertEqual(done.json()['result']['summary'], {'text': 'Talked about gravity.'})
+
+    async def test_status_errors(self, summarize):
+        self.assertEqual((await self.async_client.get('/api/summary-jobs/999/')).status_code, 404)
+        queued = await self.async_client.get('/api/generate-weekly-summary/learner/')
+        for wait in ('soon', 'nan', 'inf', '-inf'):
+            response = await self.async_client.get(queued.json()['status_url'], {'wait': wait})
+            self.assertEqual(response.status_code, 400, wait)
+        # Negative waits are clamped to an immediate answer
+        response = await self.async_client.get(queued.json()['status_url'], {'wait': -5})
+        self.assertEqual(response.json()['status'], SummaryJob.PENDING)
+
+
+@patch('client_user.summary_jobs.summarize_with_llama2', return_value='Talked about gravity.')
+class SummaryCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner', password='pw')
+        self.add('Gravity pulls.')
+
+    def add(self, text):
+        return InteractionHistory.objects.create(
+            user=self.user, username='learner', agent_response=text
+        )
+
+    def test_content_hash(self, summarize):
+        content_hash = summary_content_hash('learner', *WEEK, 'llama2')
+        self.assertEqual(len(content_hash), 64)
+        self.assertEqual(summary_content_hash('learner', *WEEK, 'llama2'), content_hash)
+        self.assertNotEqual(summary_content_hash('learner', *WEEK, 'mistral'), content_hash)
+        self.assertIsNone(summary_content_hash('nobody', *WEEK, 'llama2'))
+
+        with self.settings(SUMMARY_CHUNK_TOKENS=500):
+            self.assertNotEqual(summary_content_hash('learner', *WEEK, 'llama2'), content_hash)
+        self.add('Orbits are falling.')
+        self.assertNotEqual(summary_content_hash('learner', *WEEK, 'llama2'), content_hash)
+
+    def test_matching_summary_is_served_without_reading_history(self, summarize):
+        summary = generate_summary('learner', *WEEK)
+        self.assertEqual(summary.content_hash, summary_content_hash('learner', *WEEK, ollama.model))
+        self.assertEqual(summarize.call_count, 1)
+
+        with patch('client_user.summary_jobs.summarize_range') as summarize_range, \
+                self.assertNumQueries(2):  # the rollup versions, then the summary
+            self.assertEqual(generate_summary('learner', *WEEK), summary)
+        summarize_range.assert_not_called()
+
+    def test_added_interaction_invalidates_the_summary(self, summarize):
+        first = generate_summary('learner', *WEEK)
+        self.add('Orbits are falling.')
+        summarize.return_value = 'Talked about gravity and orbits.'
+
+        second = generate_summary('learner', *WEEK)
+        self.assertEqual(second.id, first.id)  # regenerated in place
+        self.assertEqual(second.summary, {'text': 'Talked about gravity and orbits.'})
+        self.assertNotEqual(second.content_hash, first.content_hash)
+        self.assertEqual(WeeklySummary.objects.count(), 1)
+
+    async def test_view_serves_only_a_current_summary(self, summarize):
+        await sync_to_async(generate_summary)('learner', *WEEK)
+        response = await self.async_client.get('/api/generate-weekly-summary/learner/')
+        self.assertEqual(response.status_code, 200)
+
+        await sync_to_async(self.add)('Orbits are falling.')
+        response = await self.async_client.get('/api/generate-weekly-summary/learner/')
+        self.assertEqual(response.status_code, 202)
@@ -0,0 +1,127 @@
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from . import knowledge_sources
+from .docs_snapshot import DocsSnapshotStore
+from .embeddings import HashingEmbedder
+from .test_docs_index import DOCS
+from .utils import get_knowledge_sources
+from .vector_index import VectorIndex, chunk_text
+
+
+def clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def from_vectors(vectors, **options):
+    n = len(vectors)
+    docs = [{'title': str(i), 'content': 'x', 'source': 's', 'url': str(i)} for i in range(n)]
+    zeros = np.zeros(n, dtype=np.int32)
+    return VectorIndex(vectors, np.arange(n, dtype=np.int32), zeros, zeros, docs, **options)
+
+
+class ChunkTextTests(SimpleTestCase):
+    def test_overlapping_windows(self):
+        text = ' '.join(f'w{i}' for i in range(10))
+        chunks = [text[s:e] for s, e in chunk_text(text, size=4, overlap=1)]
+        self.assertEqual(chunks, ['w0 w1 w2 w3', 'w3 w4 w5 w6', 'w6 w7 w8 w9'])
+        self.assertEqual(chunk_text('   '), [])
+        self.assertEqual(chunk_text('one two', size=4), [(0, 7)])
+
+
+class VectorIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.embedder = HashingEmbedder()
+        self.index = VectorIndex.build(DOCS, self.embedder, chunk_size=8, chunk_overlap=2)
+
+    def test_search_ranks_documents_by_best_chunk(self):
+        results = self.index.search(self.embedder.embed('vpn client restart'), limit=2)
+        self.assertEqual(results[0]['url'], 'https://wiki/vpn')
+        self.assertEqual(len({r['url'] for r in results}), len(results))
+        self.assertIn('VPN', results[0]['excerpt'])
+        self.assertEqual(self.index.search(self.embedder.embed('what is it?')), [])
+
+    def test_batched_queries_match_single_ones(self):
+        queries = self.embedder.embed_batch(['vpn', 'expenses receipts', 'laptop'])
+        ids, scores = self.index.top_k(queries, k=3)
+        for i, query in enumerate(queries):
+            single_ids, single_scores = self.index.top_k(query, k=3)
+            np.testing.assert_array_equal(ids[i], single_ids[0])
+            np.testing.assert_allclose(scores[i], single_scores[0], rtol=1e-6)
+
+    def test_save_and_mmap_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.index.save(tmp)
+            loaded = VectorIndex.load(tmp, DOCS)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            query = self.embedder.embed('expenses')
+            self.assertEqual(loaded.search(query), self.index.search(query))
+
+    def test_ivf_probing_every_list_is_exact(self):
+        vectors = clustered(2000)
+        queries = clustered(20, seed=1)
+        exact_ids, _ = from_vectors(vectors).top_k(queries, k=10)
+        ivf = from_vectors(vectors, ivf_lists=16, nprobe=16)
+        ivf_ids, _ = ivf.top_k(queries, k=10)
+
+        self.assertTrue(ivf.ivf)
+        self.assertEqual(int(ivf.list_ptr[-1]), 2000)
+        # ids refer to reordered rows, compare through the chunk's document
+        self.assertEqual(
+            [sorted(ivf.chunk_doc[row]) for row in ivf_ids],
+            [sorted(row) for row in exact_ids],
+        )
+
+    def test_ivf_and_int8_keep_recall(self):
+        vectors = clustered(5000)
+        queries = clustered(50, seed=1)
+        exact_ids, _ = from_vectors(vectors).top_k(queries, k=10)
+        for options in ({'ivf_lists': 32, 'nprobe': 8}, {'int8': True}):
+            index = from_vectors(vectors, **options)
+            ids, _ = index.top_k(queries, k=10)
+            recall = np.mean([
+                len(set(index.chunk_doc[row]) & set(truth)) / 10
+                for row, truth in zip(ids, exact_ids)
+            ])
+            self.assertGreater(recall, 0.9, options)
+
+
+class VectorSourceTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+    def test_snapshot_holds_the_vector_index(self):
+        store = DocsSnapshotStore(self.tmp, check_interval=0, vector_options={'int8': True})
+        self.assertIsNone(store.current_vectors())
+        store.publish(DOCS)
+        vectors = store.current_vectors()
+        self.assertEqual(vectors.vectors.dtype, np.int8)
+        self.assertEqual(
+            vectors.search(HashingEmbedder().embed('receipts'))[0]['url'], 'https://drive/expenses'
+        )
+
+    def test_registered_as_knowledge_source(self):
+        with override_settings(INTERNAL_DOCS_SNAPSHOT_DIR=self.tmp):
+            self.addCleanup(lambda: knowledge_sources._docs_refreshers.pop(self.tmp).stop())
+            with patch.object(knowledge_sources, '_fetch_all_internal_docs', return_value=DOCS):
+                self.assertIs(
+                    get_knowledge_sources()['internal_docs_vectors'],
+                    knowledge_sources.search_internal_vectors,
+                )
+                refresher = knowledge_sources._docs_refresher()
+                self.assertTrue(refresher.synced.wait(5))
+                refresher.store.check_interval = 0
+                results = knowledge_sources.search_internal_vectors('vpn troubleshooting')['results']
+        self.assertEqual(results[0]['url'], 'https://wiki/vpn')
+
+        with override_settings(INTERNAL_DOCS_VECTORS=False):
+            self.assertNotIn('internal_docs_vectors', get_knowledge_sources())
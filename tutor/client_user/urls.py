@@ -6,9 +6,14 @@ from .views import (
     get_current_user,
     LogoutView, 
     knowledge_view,
+    knowledge_cache_stats,
+    llm_stats,
     UserAchievementView,
     InteractionHistoryCreateView,
+    InteractionHistoryBulkCreateView,
     generate_weekly_summary,
+    summary_job_status,
+    stream_weekly_summary,
 )
 
 router = DefaultRouter()
@@ -18,11 +23,17 @@ urlpatterns = [
     path('api/auth/login/', user_login),
     path('api/auth/register/', user_register),
     path('api/knowledge/', knowledge_view),
+    path('api/knowledge/cache-stats/', knowledge_cache_stats),
+    path('api/llm/stats/', llm_stats),
     path('api/auth/user/', get_current_user),
     path('api/auth/logout/', LogoutView.as_view()),
     path('api/achievements/', UserAchievementView.as_view(), name='user_achievements'),
     path('api/save-transcriptions/', InteractionHistoryCreateView.as_view()),
+    path('api/save-transcriptions/bulk/', InteractionHistoryBulkCreateView.as_view()),
     path('api/generate-weekly-summary/', generate_weekly_summary),
+    path('api/generate-weekly-summary/<str:username>/', generate_weekly_summary),
+    path('api/generate-weekly-summary/<str:username>/stream/', stream_weekly_summary),
+    path('api/summary-jobs/<int:job_id>/', summary_job_status),
 ]
 
 # Include router URLs
@@ -2,53 +2,168 @@
 
 from .models import User
 from .models import User, UserAchievement, InteractionHistory
+from django.conf import settings
 from django.db.models import Q
+from functools import partial
+from asgiref.sync import sync_to_async
+import asyncio
 import logging
-import requests
+
+from .llm import ollama
 
 logger = logging.getLogger(__name__)
 
 
 def summarize_with_llama2(prompt):
-    url = "http://localhost:11434/api/generate"  # Ollama endpoint
-    data = {
-        "model": "llama2",
-        "prompt": prompt,
-        "stream": False  # Set to True if you want streamed output
-    }
-    response = requests.post(url, json=data)
-    return response.json()['response']
+    """Completion of `prompt` by the Ollama model (pooled, concurrency-limited client)"""
+    return ollama.generate(prompt)
+
+
+async def asummarize_with_llama2(prompt):
+    """Async variant of summarize_with_llama2 for async views"""
+    return await ollama.agenerate(prompt)
+
+
+async def astream_llama2(prompt):
+    """
+    Streamed variant of asummarize_with_llama2
+    Yields:
+        str: The completion, piece by piece as Ollama generates it
+    """
+    async for token in ollama.astream(prompt):
+        yield token
+
+
+KNOWLEDGE_SUMMARY_SOURCES = ('wikipedia', 'internal_docs')
+
+
+def _pick_summary(answers: dict, precedence: str, final: bool = False):
+    """
+    Applies the KNOWLEDGE_SUMMARY_PRECEDENCE policy to the answers so far
+    Args:
+        answers: Source name -> summary ('' when the source found nothing),
+            in arrival order; sources still running are absent
+        precedence: 'wikipedia', 'internal_docs' or 'first' (first non-empty
+            answer wins)
+        final: No more answers will arrive (all done or deadline passed)
+    Returns:
+        str|None: Chosen summary ('' if none), or None to keep waiting
+    """
+    if precedence == 'first':
+        order = list(answers)
+    else:
+        order = [precedence] + [s for s in KNOWLEDGE_SUMMARY_SOURCES if s != precedence]
+    for name in order:
+        if name not in answers:
+            if final:
+                continue
+            return None  # a preferred source may still answer
+        if answers[name]:
+            return answers[name]
+    if final or len(answers) == len(KNOWLEDGE_SUMMARY_SOURCES):
+        return ''
+    return None
 
+def _wikipedia_summary(query: str) -> str:
+    from .knowledge_sources import get_wikipedia_summary
+    return (get_wikipedia_summary(query) or '')[:500]  # Limit length
+
+async def _awikipedia_summary(query: str) -> str:
+    from .knowledge_sources import aget_wikipedia_summary
+    return (await aget_wikipedia_summary(query) or '')[:500]  # Limit length
+
+def _internal_docs_summary(query: str) -> str:
+    from .knowledge_sources import search_internal_docs
+    return "\n".join([f"- {res['title']}: {res['excerpt']}"
+                      for res in search_internal_docs(query)[:3]])
 
 def get_knowledge_base_summary(query: str) -> str:
     """
     Core knowledge retrieval from your domain data sources
+    
+    Wikipedia and the internal docs are queried concurrently; the answer is
+    chosen by KNOWLEDGE_SUMMARY_PRECEDENCE as soon as it is decided, or
+    from whatever arrived within KNOWLEDGE_SUMMARY_DEADLINE.
     Args:
         query: User's search query
     Returns:
         str: Generated summary (empty string if no results)
     """
     try:
-        # Example implementation - replace with your actual knowledge base logic
-        from .knowledge_sources import get_wikipedia_summary, search_internal_docs
-        
-        # Try Wikipedia first
-        wiki_summary = get_wikipedia_summary(query)
-        if wiki_summary:
-            return wiki_summary[:500]  # Limit length
-            
-        # Fall back to internal docs
-        internal_results = search_internal_docs(query)
-        if internal_results:
-            return "\n".join([f"- {res['title']}: {res['excerpt']}" 
-                           for res in internal_results[:3]])
-            
-        return "No information found"
+        from .fanout import ERROR, OK, fan_out
+
+        precedence = getattr(settings, 'KNOWLEDGE_SUMMARY_PRECEDENCE', 'wikipedia')
+
+        def answers(results):
+            return {
+                name: (r.value or '') if r.status == OK else ''
+                for name, r in results.items() if r.status in (OK, ERROR)
+            }
+
+        outcomes = fan_out(
+            {
+                'wikipedia': partial(_wikipedia_summary, query),
+                'internal_docs': partial(_internal_docs_summary, query),
+            },
+            deadline=getattr(settings, 'KNOWLEDGE_SUMMARY_DEADLINE', 2.0),
+            stop_when=lambda results: _pick_summary(answers(results), precedence) is not None,
+        )
+        return _pick_summary(answers(outcomes), precedence, final=True) or "No information found"
         
     except Exception as e:
         logger.error(f"Knowledge base query failed: {str(e)}", exc_info=True)
         return "Temporary knowledge service unavailable"
 
+async def aget_knowledge_base_summary(query: str) -> str:
+    """
+    Async variant of get_knowledge_base_summary, used by async views
+    Args:
+        query: User's search query
+    Returns:
+        str: Generated summary (empty string if no results)
+    """
+    try:
+        precedence = getattr(settings, 'KNOWLEDGE_SUMMARY_PRECEDENCE', 'wikipedia')
+        deadline = getattr(settings, 'KNOWLEDGE_SUMMARY_DEADLINE', 2.0)
+        tasks = {
+            asyncio.ensure_future(_awikipedia_summary(query)): 'wikipedia',
+            # in-process search, keep it off the event loop
+            asyncio.ensure_future(
+                sync_to_async(_internal_docs_summary, thread_sensitive=False)(query)
+            ): 'internal_docs',
+        }
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + deadline
+        answers = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(0.0, deadline_at - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    logger.warning(f"Knowledge summary deadline passed for: {query}")
+                    break
+                for task in done:
+                    if task.exception() is not None:
+                        logger.error(f"Knowledge source '{tasks[task]}' failed: {task.exception()}")
+                        answers[tasks[task]] = ''
+                    else:
+                        answers[tasks[task]] = task.result()
+                if _pick_summary(answers, precedence) is not None:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return _pick_summary(answers, precedence, final=True) or "No information found"
+
+    except Exception as e:
+        logger.error(f"Knowledge base query failed: {str(e)}", exc_info=True)
+        return "Temporary knowledge service unavailable"
+
 def filter_for_user(base_data: dict, user: User) -> dict:
     """
     Filters and ranks data based on user's profile and history
@@ -97,9 +212,41 @@ def filter_for_user(base_data: dict, user: User) -> dict:
         logger.error(f"User filtering failed: {str(e)}", exc_info=True)
         return base_data  # Return unfiltered on failure
 
+def get_knowledge_sources() -> dict:
+    """
+    Knowledge systems queried by get_system_data
+    Returns:
+        dict: Source name -> callable(query) returning {"results": [...]}
+    """
+    sources = {}
+    try:
+        from .integrations import (
+            search_sharepoint,
+            query_salesforce_knowledge,
+            get_azure_search_results
+        )
+        sources.update({
+            "sharepoint": search_sharepoint,
+            "salesforce": query_salesforce_knowledge,
+            "azure_search": get_azure_search_results,
+        })
+    except ImportError:
+        logger.warning("No knowledge integrations configured")
+
+    if getattr(settings, 'INTERNAL_DOCS_VECTORS', True):
+        from .knowledge_sources import search_internal_vectors
+        sources["internal_docs_vectors"] = search_internal_vectors
+
+    return sources
+
 def get_system_data(query: str) -> dict:
     """
     Retrieves structured knowledge data from all available systems
+    
+    All sources are queried concurrently. The call returns once every source
+    answered or KNOWLEDGE_FANOUT_DEADLINE passed (sources may have tighter
+    limits in KNOWLEDGE_SOURCE_DEADLINES); slow sources are listed in
+    "sources_timed_out" and the results of the others are returned.
     Args:
         query: Search query
     Returns:
@@ -113,37 +260,44 @@ def get_system_data(query: str) -> dict:
                     "tags": ["..."],
                     "complexity": 1-3
                 }
-            ]
+            ],
+            "sources_queried": ["sharepoint", ...],
+            "sources_timed_out": [...],
+            "sources_failed": [...],
+            "partial": false
         }
     """
     try:
-        from .integrations import (
-            search_sharepoint,
-            query_salesforce_knowledge,
-            get_azure_search_results
+        from .fanout import fan_out
+
+        sources = get_knowledge_sources()
+        outcomes = fan_out(
+            {name: partial(search, query) for name, search in sources.items()},
+            deadline=getattr(settings, 'KNOWLEDGE_FANOUT_DEADLINE', 3.0),
+            source_deadlines=getattr(settings, 'KNOWLEDGE_SOURCE_DEADLINES', {}),
         )
         
-        # Parallelize these calls in production using threading/celery
-        sources = [
-            search_sharepoint(query),
-            query_salesforce_knowledge(query),
-            get_azure_search_results(query)
-        ]
-        
         # Combine and deduplicate results
         combined = []
         seen_urls = set()
         
-        for source in sources:
-            for item in source.get('results', []):
+        for outcome in outcomes.values():
+            if not outcome.ok:
+                continue
+            for item in (outcome.value or {}).get('results', []):
                 if item['url'] not in seen_urls:
                     combined.append(item)
                     seen_urls.add(item['url'])
         
+        timed_out = [o.name for o in outcomes.values() if o.status == 'timeout']
+        failed = [o.name for o in outcomes.values() if o.status == 'error']
         return {
             "query": query,
             "results": combined[:20],  # Limit to top 20
-            "sources_queried": [s['source'] for s in sources]
+            "sources_queried": list(outcomes),
+            "sources_timed_out": timed_out,
+            "sources_failed": failed,
+            "partial": bool(timed_out or failed),
         }
         
     except Exception as e:
@@ -159,6 +313,11 @@ def get_personalized_knowledge_summary(query: str, user: User) -> str:
     base_summary = get_knowledge_base_summary(query)  # Your existing function
     return f"{base_summary} (Personalized for {user.username}'s preferences)"
     
+async def aget_personalized_knowledge_summary(query: str, user: User) -> str:
+    """Async variant of get_personalized_knowledge_summary"""
+    base_summary = await aget_knowledge_base_summary(query)
+    return f"{base_summary} (Personalized for {user.username}'s preferences)"
+
 def get_relevant_user_data(query: str, user: User) -> dict:
     """Filter data based on user's history and achievements"""
     base_data = get_system_data(query)  # Your existing function
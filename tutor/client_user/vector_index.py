@@ -0,0 +1,229 @@
+# Dense retrieval over the internal docs corpus
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embeddings import HashingEmbedder
+
+_WORD_RE = re.compile(r"\S+")
+
+# Rows scored per matrix product, bounds the temporary score matrix
+_BLOCK_ROWS = 65536
+
+
+def chunk_text(text: str, size: int = 120, overlap: int = 30) -> List[Tuple[int, int]]:
+    """
+    Splits `text` into overlapping windows of `size` words
+    Returns:
+        list: (start, end) character offsets of each chunk
+    """
+    words = [m.span() for m in _WORD_RE.finditer(text)]
+    if not words:
+        return []
+    step = max(1, size - overlap)
+    chunks = []
+    for i in range(0, len(words), step):
+        window = words[i:i + size]
+        chunks.append((window[0][0], window[-1][1]))
+        if i + size >= len(words):
+            break
+    return chunks
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10,
+            sample: int = 65536, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids (unit length) trained on a sample of `vectors`"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1, norms))
+    return centroids
+
+
+class VectorIndex:
+    """
+    Brute-force (or IVF) cosine top-k over embedded document chunks
+
+    Chunk embeddings are unit-length rows of one contiguous float32 matrix,
+    scored with blocked matrix products; queries can be batched. Chunk i
+    belongs to document `chunk_doc[i]` and spans
+    `chunk_start[i]:chunk_end[i]` of its content.
+
+    For large corpora `ivf_lists` > 0 partitions the rows by spherical
+    k-means (rows reordered so every list is contiguous) and a query only
+    scans the `nprobe` lists whose centroids are closest. `int8` stores the
+    rows scalar-quantized (4x smaller, approximate scores).
+
+    Like DocsIndex every field is a numpy array; `save` / `load` round-trip
+    them through .npy files and `load` memory-maps them.
+    """
+
+    _ARRAYS = ('vectors', 'scale', 'chunk_doc', 'chunk_start', 'chunk_end',
+               'centroids', 'list_ptr')
+
+    def __init__(self, vectors: np.ndarray, chunk_doc: np.ndarray, chunk_start: np.ndarray,
+                 chunk_end: np.ndarray, docs: Sequence[Dict], ivf_lists: int = 0,
+                 int8: bool = False, nprobe: int = 8):
+        self.docs = docs
+        self.nprobe = nprobe
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.centroids = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        self.list_ptr = np.zeros(1, dtype=np.int64)
+        if ivf_lists and len(vectors) > ivf_lists:
+            self.centroids = _kmeans(vectors, ivf_lists)
+            assign = np.concatenate([
+                np.argmax(vectors[i:i + _BLOCK_ROWS] @ self.centroids.T, axis=1)
+                for i in range(0, len(vectors), _BLOCK_ROWS)
+            ])
+            order = np.argsort(assign, kind='stable')
+            vectors, chunk_doc, chunk_start, chunk_end = (
+                vectors[order], chunk_doc[order], chunk_start[order], chunk_end[order]
+            )
+            self.list_ptr = np.zeros(ivf_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assign, minlength=ivf_lists), out=self.list_ptr[1:])
+
+        if int8:
+            self.scale = np.array([max(float(np.abs(vectors).max(initial=0)), 1e-9) / 127],
+                                  dtype=np.float32)
+            self.vectors = np.round(vectors / self.scale[0]).astype(np.int8)
+        else:
+            self.scale = np.ones(1, dtype=np.float32)
+            self.vectors = vectors
+        self.chunk_doc = np.asarray(chunk_doc, dtype=np.int32)
+        self.chunk_start = np.asarray(chunk_start, dtype=np.int32)
+        self.chunk_end = np.asarray(chunk_end, dtype=np.int32)
+
+    @classmethod
+    def build(cls, docs: Sequence[Dict], embedder: Optional[HashingEmbedder] = None,
+              chunk_size: int = 120, chunk_overlap: int = 30, **options) -> 'VectorIndex':
+        """Chunks and embeds the content of `docs` (title prepended to every chunk)"""
+        embedder = embedder or HashingEmbedder()
+        chunk_doc, chunk_start, chunk_end, texts = [], [], [], []
+        for doc_id in range(len(docs)):
+            doc = docs[doc_id]
+            content = doc.get('content', '')
+            for start, end in chunk_text(content, chunk_size, chunk_overlap):
+                chunk_doc.append(doc_id)
+                chunk_start.append(start)
+                chunk_end.append(end)
+                texts.append(f"{doc.get('title', '')}\n{content[start:end]}")
+        return cls(
+            embedder.embed_batch(texts).reshape(len(texts), embedder.dim),
+            np.array(chunk_doc, dtype=np.int32),
+            np.array(chunk_start, dtype=np.int32),
+            np.array(chunk_end, dtype=np.int32),
+            docs, **options,
+        )
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def ivf(self) -> bool:
+        return len(self.centroids) > 0
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'nprobe': self.nprobe, 'chunks': len(self)}, f)
+
+    @classmethod
+    def load(cls, directory: str, docs: Sequence[Dict],
+             mmap_mode: Optional[str] = 'r') -> 'VectorIndex':
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        index.docs = docs
+        index.nprobe = meta['nprobe']
+        for name in cls._ARRAYS:
+            setattr(index, name, np.load(os.path.join(directory, f'{name}.npy'),
+                                         mmap_mode=mmap_mode))
+        return index
+
+    def _score(self, rows: slice, queries: np.ndarray) -> np.ndarray:
+        block = self.vectors[rows]
+        if block.dtype == np.int8:
+            return (block.astype(np.float32) @ queries.T).T * self.scale[0]
+        return (block @ queries.T).T
+
+    def _candidates(self, query: np.ndarray) -> List[slice]:
+        if not self.ivf:
+            return [slice(i, min(i + _BLOCK_ROWS, len(self)))
+                    for i in range(0, len(self), _BLOCK_ROWS)]
+        nprobe = min(self.nprobe, len(self.centroids))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return [slice(int(self.list_ptr[i]), int(self.list_ptr[i + 1])) for i in lists]
+
+    def top_k(self, queries: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest chunks of each query vector
+        Args:
+            queries: (m, dim) unit-length query embeddings
+            k: Chunks per query
+        Returns:
+            tuple: (m, k) chunk ids and scores, best first; -1 / -inf pad
+            when fewer chunks were scanned
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if not len(self):
+            return ids, scores
+
+        if self.ivf:
+            groups = [([q], self._candidates(queries[q])) for q in range(len(queries))]
+        else:
+            groups = [(list(range(len(queries))), self._candidates(queries[0]))]
+        for members, ranges in groups:
+            for rows in ranges:
+                if rows.stop <= rows.start:
+                    continue
+                block = self._score(rows, queries[members])
+                block_ids = np.arange(rows.start, rows.stop)
+                for i, q in enumerate(members):
+                    merged_ids = np.concatenate([ids[q], block_ids])
+                    merged = np.concatenate([scores[q], block[i]])
+                    best = np.argpartition(-merged, k - 1)[:k] if len(merged) > k else np.arange(len(merged))
+                    best = best[np.argsort(-merged[best], kind='stable')]
+                    ids[q], scores[q] = merged_ids[best], merged[best]
+        return ids, scores
+
+    def search(self, query_vector: np.ndarray, limit: int = 10) -> List[Dict]:
+        """
+        Best chunk of each of the `limit` most similar documents
+        Returns:
+            list: Results with title, excerpt (the chunk), score and doc metadata
+        """
+        ids, scores = self.top_k(query_vector, k=limit * 4)
+        results, seen = [], set()
+        for chunk, score in zip(ids[0], scores[0]):
+            if chunk < 0 or score <= 0:
+                break
+            doc_id = int(self.chunk_doc[chunk])
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            doc = self.docs[doc_id]
+            results.append({
+                'title': doc['title'],
+                'excerpt': doc.get('content', '')[self.chunk_start[chunk]:self.chunk_end[chunk]],
+                'score': round(float(score), 4),
+                'source': doc['source'],
+                'url': doc['url'],
+                'last_updated': doc.get('updated_at', ''),
+            })
+            if len(results) == limit:
+                break
+        return results
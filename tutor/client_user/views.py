@@ -2,12 +2,12 @@ import json
 import logging
 from django.contrib.auth import authenticate, login
 from django.views.decorators.csrf import csrf_exempt
-from django.core.cache import cache
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 
 from rest_framework import status, viewsets, permissions
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.authentication import TokenAuthentication, SessionAuthentication
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
@@ -16,7 +16,7 @@ from rest_framework.views import APIView
 
 from .models import User, InteractionHistory, UserAchievement
 from .serializers import UserAchievementSerializer
-from .utils import get_personalized_knowledge_summary, get_relevant_user_data
+from .utils import aget_personalized_knowledge_summary, get_relevant_user_data
 
 from .models import UserAchievement
 # views.py
@@ -29,102 +29,291 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import InteractionHistory, WeeklySummary
-from .serializers import InteractionHistorySerializer, WeeklySummarySerializer
+from .models import InteractionHistory, WeeklySummary, SummaryJob
+from .serializers import InteractionHistorySerializer, WeeklySummarySerializer, SummaryJobSerializer
+from .serializers import InteractionHistoryBulkSerializer
+from .parsers import NDJSONParser
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 import logging
 
 logger = logging.getLogger(__name__)
 
-from datetime import timedelta
-from django.utils import timezone
-from .utils import summarize_with_llama2
+import asyncio
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.http import require_GET
+from .authentication import async_token_required
+from .audit import audit_writer
+from .cache import knowledge_cache, semantic_cache
+from .llm import ollama
+from .rollups import mark_dirty, range_prompt
+from .summary_jobs import cached_summary, current_week, enqueue_summary
+from .utils import astream_llama2, summarize_with_llama2
+
+
+def _json_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
 
-@api_view(['GET'])
-def generate_weekly_summary(request, username):
-    today = timezone.now().date()
-    weekday = today.weekday()  # Monday = 0, Sunday = 6
+@require_GET
+async def generate_weekly_summary(request, username=None):
+    """
+    Returns the user's summary of the current week if one was built from
+    exactly its current interactions, otherwise queues its generation (run
+    by run_summary_worker) and answers 202 with the job to poll at
+    api/summary-jobs/<job_id>/
+    """
+    username = username or request.GET.get('username')
+    if not username:
+        return JsonResponse(
+            {"error": "Query parameter 'username' is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    # Go back to the most recent Monday
-    start_date = today - timedelta(days=weekday)
-    # End date is the upcoming Sunday
-    end_date = start_date + timedelta(days=6)
+    start_date, end_date = current_week()
 
-    # Check if already summarized
-    summary_exists = WeeklySummary.objects.filter(
-        username=username,
-        period_start=start_date,
-        period_end=end_date
-    ).first()
+    # Check if already summarized; a summary of an older set of
+    # interactions no longer matches the content hash
+    summary_exists, content_hash = await sync_to_async(cached_summary)(
+        username, start_date, end_date
+    )
+    if content_hash is None:
+        return JsonResponse({"message": "No interactions found for the user."})
 
     if summary_exists:
         serializer = WeeklySummarySerializer(summary_exists)
-        return Response(serializer.data)
-
-    # Collect history
-    interactions = InteractionHistory.objects.filter(
-        username=username,
-        timestamp__date__range=[start_date, end_date]
-    ).order_by('timestamp')
-
-    if not interactions.exists():
-        return Response({"message": "No interactions found for the user."})
-
-    all_responses = "\n".join([i.agent_response for i in interactions])
-    prompt = f"""
-    Summarize the following agent responses from the user '{username}' between {start_date} and {end_date}:
-
-    {all_responses}
-
-    Provide a concise summary of the key points and topics discussed.
+        return JsonResponse(serializer.data)
+
+    # The LLM call runs in a worker process; concurrent requests for the
+    # same user and week share one job
+    job, created = await sync_to_async(enqueue_summary)(username, start_date, end_date)
+    if created:
+        logger.info(f"Queued summary job {job.id} for {username}")
+    data = SummaryJobSerializer(job).data
+    data["status_url"] = f"/api/summary-jobs/{job.id}/"
+    return JsonResponse(data, status=status.HTTP_202_ACCEPTED)
+
+# How often a long-polling status request re-reads its job
+SUMMARY_JOB_CHECK_INTERVAL = 0.25  # seconds
+
+@require_GET
+async def summary_job_status(request, job_id):
+    """
+    Status of a summary job, with the summary once it is done
+    Query parameters:
+        wait: Long-poll, hold the response up to this many seconds (capped
+            by SUMMARY_JOB_MAX_WAIT) until the job is done or failed
     """
+    try:
+        wait = float(request.GET.get('wait', 0))
+        if not math.isfinite(wait):
+            raise ValueError(wait)
+    except ValueError:
+        return JsonResponse(
+            {"error": "Query parameter 'wait' must be a number of seconds"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    summary_text = summarize_with_llama2(prompt)
+    wait = min(max(wait, 0), getattr(settings, 'SUMMARY_JOB_MAX_WAIT', 30))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        job = await SummaryJob.objects.select_related('result').filter(id=job_id).afirst()
+        if job is None:
+            return JsonResponse({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+        remaining = deadline - loop.time()
+        if job.status not in SummaryJob.ACTIVE or remaining <= 0:
+            break
+        await asyncio.sleep(min(SUMMARY_JOB_CHECK_INTERVAL, remaining))
+
+    data = SummaryJobSerializer(job).data
+    if job.status == SummaryJob.DONE and job.result is None:
+        data["message"] = "No interactions found for the user."
+    return JsonResponse(data)
+
+def _sse(event, data):
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+@require_GET
+async def stream_weekly_summary(request, username):
+    """
+    Server-sent events variant of generate_weekly_summary: the summary of
+    the current week is relayed as the LLM generates it, then saved
+    Events:
+        token: {"text": ...} the next piece of the summary
+        done: the saved WeeklySummary (sent alone if it already existed)
+        error: {"error": ...}
+    """
+    start_date, end_date = current_week()
 
-    # Save to DB
-    weekly_summary = WeeklySummary.objects.create(
-        username=username,
-        period_start=start_date,
-        period_end=end_date,
-        summary_text=summary_text
-    )
+    async def events():
+        existing, content_hash = await sync_to_async(cached_summary)(
+            username, start_date, end_date
+        )
+        if existing:
+            yield _sse("done", WeeklySummarySerializer(existing).data)
+            return
+        if content_hash is None:
+            yield _sse("error", {"error": "No interactions found for the user."})
+            return
+
+        # Built from the day rollups like the queued jobs, so both store the
+        # same summary under the content hash; only the final call is streamed
+        try:
+            prompt, finish = await sync_to_async(range_prompt)(
+                username, start_date, end_date, summarize_with_llama2
+            )
+            parts = []
+            if prompt is not None:
+                async for token in astream_llama2(prompt):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+            text = await sync_to_async(finish)("".join(parts) if prompt is not None else None)
+        except Exception as e:
+            logger.error(f"Streaming summary for {username} failed: {str(e)}", exc_info=True)
+            yield _sse("error", {"error": "Summary generation failed"})
+            return
+        if text is None:
+            yield _sse("error", {"error": "No interactions found for the user."})
+            return
+        if prompt is None:
+            yield _sse("token", {"text": text})  # nothing left to generate
+
+        weekly_summary, _ = await WeeklySummary.objects.aupdate_or_create(
+            username=username,
+            period_start=start_date,
+            period_end=end_date,
+            defaults={"summary": {"text": text}, "content_hash": content_hash}
+        )
+        yield _sse("done", WeeklySummarySerializer(weekly_summary).data)
 
-    serializer = WeeklySummarySerializer(weekly_summary)
-    return Response(serializer.data)
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+    return response
 
-class InteractionHistoryCreateView(APIView):
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
+@method_decorator(async_token_required, name='dispatch')
+class InteractionHistoryCreateView(View):
+    http_method_names = ['post', 'options']
 
-    def post(self, request):
-        logger.debug("Incoming POST data: %s", request.data)
+    async def post(self, request):
+        data = _json_body(request)
+        logger.debug("Incoming POST data: %s", data)
         logger.debug("Authenticated user: %s", request.user)
 
-        serializer = InteractionHistorySerializer(data=request.data, context={'request': request})
-        #print(request.data)
+        serializer = InteractionHistorySerializer(data=data, context={'request': request})
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            interaction = await InteractionHistory.objects.acreate(
+                user=request.user, **serializer.validated_data
+            )
             logger.debug("Interaction history saved successfully.")
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return JsonResponse(
+                InteractionHistorySerializer(interaction).data,
+                status=status.HTTP_201_CREATED
+            )
         else:
             logger.error("Serializer validation failed: %s", serializer.errors)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserAchievementView(APIView):
+class InteractionHistoryBulkCreateView(APIView):
+    """
+    Saves many interactions in one request.
+
+    Accepts a JSON array (or {"interactions": [...]}) or an NDJSON stream.
+    Every item is validated, the valid ones are written with batched
+    bulk_create inside a single transaction and the response carries one
+    result per item, in request order.
+    """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NDJSONParser]
+    batch_size = 500
+    max_items = 5000
 
     def post(self, request):
-        serializer = UserAchievementSerializer(data=request.data, context={'request': request})
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('interactions')
+        if not isinstance(items, list):
+            return Response(
+                {"error": "Expected a list of interactions"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_items:
+            return Response(
+                {"error": f"At most {self.max_items} interactions per request"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        results = []
+        pending = []
+        item_serializer = InteractionHistoryBulkSerializer()
+        for index, item in enumerate(items):
+            try:
+                validated = item_serializer.run_validation(item)
+            except ValidationError as exc:
+                results.append({"index": index, "status": "invalid", "errors": exc.detail})
+                continue
+            result = {"index": index, "status": "created"}
+            results.append(result)
+            pending.append((result, InteractionHistory(user=request.user, **validated)))
+
+        with transaction.atomic():
+            created = InteractionHistory.objects.bulk_create(
+                [obj for _, obj in pending], batch_size=self.batch_size
+            )
+        for (result, _), obj in zip(pending, created):
+            result["id"] = obj.pk
+        # bulk_create sends no post_save
+        mark_dirty(created)
+
+        failed = len(items) - len(created)
+        if failed:
+            logger.error("Bulk interaction upload rejected %d of %d items", failed, len(items))
+        if not created and failed:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(
+            {"created": len(created), "failed": failed, "results": results},
+            status=response_status
+        )
+
+
+@method_decorator(async_token_required, name='dispatch')
+class UserAchievementView(View):
+    http_method_names = ['get', 'post', 'options']
+
+    async def post(self, request):
+        serializer = UserAchievementSerializer(data=_json_body(request), context={'request': request})
         if serializer.is_valid():
-            achievement = serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            achievement = await UserAchievement.objects.acreate(
+                user=request.user, **serializer.validated_data
+            )
+            return JsonResponse(
+                UserAchievementSerializer(achievement).data,
+                status=status.HTTP_201_CREATED
+            )
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def get(self, request):
-        achievements = UserAchievement.objects.filter(user=request.user)
+    async def get(self, request):
+        achievements = [
+            achievement async for achievement in UserAchievement.objects.filter(user=request.user)
+        ]
         serializer = UserAchievementSerializer(achievements, many=True)
-        return Response(serializer.data)
+        return JsonResponse(serializer.data, safe=False)
 
 class LogoutView(APIView):
     authentication_classes = [TokenAuthentication]
@@ -209,68 +398,118 @@ def get_current_user(request):
     return response
 
 
-@api_view(['GET'])
-@authentication_classes([TokenAuthentication])
-@permission_classes([IsAuthenticated])
-def knowledge_view(request):
+@require_GET
+@async_token_required
+async def knowledge_view(request):
     query = request.GET.get('q', '').strip()
     user = request.user
     
     # Validate query
     if not query:
-        return Response(
+        return JsonResponse(
             {"error": "Query parameter 'q' is required"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Generate cache key with user context
-    cache_key = f"knowledge_{user.id}_{query[:100]}"  # Limit query length in key
+    # Generate cache key with user context, hashed from the normalized query
+    cache_key = knowledge_cache.make_key("knowledge", user.id, query)
     
-    # Check cache
-    if cached := cache.get(cache_key):
+    async def compute():
+        # Get personalized knowledge results; the upstream lookups run concurrently
+        summary, data, user_context = await asyncio.gather(
+            aget_personalized_knowledge_summary(query, user),
+            sync_to_async(get_relevant_user_data, thread_sensitive=False)(query, user),
+            sync_to_async(user.get_persona_context)(),  # Include user's personal context
+        )
+        return {
+            "summary": summary,
+            "data": data,
+            "user_context": user_context
+        }
+
+    try:
+        # Optionally reuse the results of a differently phrased earlier
+        # question of this user
+        results, similar = None, None
+        if getattr(settings, 'KNOWLEDGE_SEMANTIC_CACHE', False):
+            similar = semantic_cache.lookup(user.id, query, exclude=cache_key)
+            if similar:
+                # None when the neighbour's results were evicted meanwhile
+                results = await knowledge_cache.aget(similar[0])
+            semantic_cache.record(results is not None)
+        if results is not None:
+            cached = True
+        else:
+            similar = None
+            # Check cache (in-process LRU, then the shared tier); on a miss only
+            # one request computes the results, concurrent ones wait for them.
+            # Cache for 1 hour (3600 seconds)
+            results, cached = await knowledge_cache.aget_or_compute(cache_key, compute, 3600)
+            if getattr(settings, 'KNOWLEDGE_SEMANTIC_CACHE', False):
+                semantic_cache.add(user.id, query, cache_key)
+    except Exception as e:
+        logger.error(f"Knowledge query failed: {str(e)}", exc_info=True)
+        return JsonResponse(
+            {"error": "Failed to process knowledge request"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    # Audit records are written behind the response, in batches, so a cache
+    # hit never touches the database. They carry no username: they are not
+    # part of the conversation the weekly summaries are built from.
+    if cached:
         logger.debug(f"Cache hit for {cache_key}")
         # Log the cached knowledge access
-        InteractionHistory.objects.create(
+        audit_writer.add(InteractionHistory(
             user=user,
             session_id=request.GET.get('session_id', ''),
-            input_text=f"Cached knowledge query: {query}",
             agent_response="",
-            metadata={"type": "cached_knowledge", "query": query}
-        )
-        return Response(cached)
-    
-    try:
-        # Get personalized knowledge results
-        results = {
-            "summary": get_personalized_knowledge_summary(query, user),
-            "data": get_relevant_user_data(query, user),
-            "user_context": user.get_persona_context()  # Include user's personal context
-        }
-        
-        # Cache for 1 hour (3600 seconds)
-        cache.set(cache_key, results, 3600)
-        
+            metadata={
+                "type": "cached_knowledge",
+                "query": query,
+                **({"similarity": round(similar[1], 4)} if similar else {})
+            }
+        ))
+    else:
         # Log the new knowledge query
-        InteractionHistory.objects.create(
+        audit_writer.add(InteractionHistory(
             user=user,
             session_id=request.GET.get('session_id', ''),
-            input_text=f"New knowledge query: {query}",
             agent_response=results["summary"][:200],  # Store first 200 chars
             metadata={
                 "type": "knowledge_query",
                 "query": query,
                 "cache_key": cache_key
             }
+        ))
+
+    return JsonResponse(results)
+
+@require_GET
+@async_token_required
+async def knowledge_cache_stats(request):
+    """Hit ratios of each knowledge cache tier, for this worker process (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse(
+            {"error": "Staff access required"},
+            status=status.HTTP_403_FORBIDDEN
         )
-        
-        return Response(results)
-        
-    except Exception as e:
-        logger.error(f"Knowledge query failed: {str(e)}", exc_info=True)
-        return Response(
-            {"error": "Failed to process knowledge request"},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+    return JsonResponse(dict(
+        knowledge_cache.stats_dict(),
+        semantic=dict(semantic_cache.stats.to_dict(),
+                      enabled=getattr(settings, 'KNOWLEDGE_SEMANTIC_CACHE', False)),
+    ))
+
+@require_GET
+@async_token_required
+async def llm_stats(request):
+    """Queue depth and request counters of this worker's LLM client (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse(
+            {"error": "Staff access required"},
+            status=status.HTTP_403_FORBIDDEN
         )
+    return JsonResponse(ollama.stats.to_dict())
 
 def user_login_ok(request):
     username = request.data.get('username')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +27,39 @@ SECRET_KEY = 'django-insecure-qvl$%g#o4i)i+7n(29y-92=j3pmq43md+j-)aub(cj(awlh^(g
 DEBUG = True
 
 ALLOWED_HOSTS = ['*']
+APP_NAME = 'tutor'  # used in the User-Agent of outbound knowledge requests
+
+# Knowledge sources are queried concurrently by get_system_data; slower
+# sources are reported as timed out and the partial results are returned.
+KNOWLEDGE_FANOUT_DEADLINE = 3.0  # seconds, for the whole fan-out
+KNOWLEDGE_SOURCE_DEADLINES = {}  # e.g. {'salesforce': 1.5}
+# Threads per source; a hung source cannot hold more than these
+KNOWLEDGE_FANOUT_WORKERS_PER_SOURCE = 4
+
+# Wikipedia and the internal docs are raced for the knowledge summary.
+# 'wikipedia' / 'internal_docs' prefer that source when it has an answer,
+# 'first' takes the first non-empty answer.
+KNOWLEDGE_SUMMARY_PRECEDENCE = 'wikipedia'
+KNOWLEDGE_SUMMARY_DEADLINE = 2.0  # seconds
+# Connection pool of the async Wikipedia client
+WIKIPEDIA_MAX_CONNECTIONS = 20
+WIKIPEDIA_MAX_KEEPALIVE = 10
+
+# Versioned snapshots of the internal docs search index, memory-mapped by
+# every worker process; must be on a filesystem shared by all workers.
+INTERNAL_DOCS_SNAPSHOT_DIR = BASE_DIR / 'var' / 'docs_index'
+# A background thread re-syncs it incrementally (docs updated since the last
+# sync) and does a full sync, which also drops deleted docs, once a day.
+INTERNAL_DOCS_REFRESH_INTERVAL = 900  # seconds
+INTERNAL_DOCS_FULL_SYNC_INTERVAL = 86400  # seconds
+# Each snapshot also holds embedded chunks of the docs for dense retrieval,
+# queried by get_system_data as the 'internal_docs_vectors' source. Exact
+# brute-force search by default; for large corpora set IVF lists (about
+# sqrt(chunks)) and optionally int8 vectors, both trade recall for speed.
+INTERNAL_DOCS_VECTORS = True
+INTERNAL_DOCS_IVF_LISTS = 0
+INTERNAL_DOCS_IVF_PROBES = 8
+INTERNAL_DOCS_INT8_VECTORS = False
 AUTH_USER_MODEL = 'client_user.User'
 
 
@@ -115,9 +149,90 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Several processes write (summary workers, the precompute pool):
+        # take the write lock when a transaction starts, so a read-then-write
+        # transaction waits for it instead of failing with "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
+# knowledge_view results are cached in an in-process LRU in front of the
+# shared 'knowledge' alias (client_user/cache.py). It uses files on local
+# disk, or Redis when REDIS_URL is set.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'knowledge': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'knowledge',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+KNOWLEDGE_CACHE_L1_SIZE = 256  # entries per process
+KNOWLEDGE_CACHE_L1_TTL = 60  # seconds
+KNOWLEDGE_CACHE_COMPRESS_MIN = 1024  # bytes of JSON
+# On a miss one request recomputes under a lease, the others wait for it;
+# hot entries are refreshed early with a probability scaled by beta (0 = off).
+KNOWLEDGE_CACHE_LEASE = 10  # seconds
+KNOWLEDGE_CACHE_EARLY_BETA = 1.0
+# Optional: also answer from the cached results of an earlier, similarly
+# phrased query of the same user (cosine similarity of hashed embeddings).
+KNOWLEDGE_SEMANTIC_CACHE = False
+KNOWLEDGE_SEMANTIC_THRESHOLD = 0.85
+KNOWLEDGE_SEMANTIC_MAX_PER_USER = 256  # recent queries kept per user
+
+# knowledge_view audit rows are queued in memory and bulk inserted by a
+# background thread; the oldest are dropped when the queue is full.
+AUDIT_QUEUE_SIZE = 10000  # rows per process
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 1.0  # seconds
+AUDIT_MAX_RETRIES = 5  # failed flushes of a batch before it is dropped
+
+# Ollama server and model used for summaries (client_user/llm.py). Each
+# process runs at most OLLAMA_MAX_CONCURRENCY generations, the rest queue;
+# the model is kept loaded for OLLAMA_KEEP_ALIVE and re-pinged every
+# OLLAMA_KEEPALIVE_INTERVAL seconds (0 = never). Failed calls are retried
+# until OLLAMA_DEADLINE seconds, queueing included.
+OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+OLLAMA_MODEL = 'llama2'
+OLLAMA_MAX_CONCURRENCY = 2
+OLLAMA_KEEP_ALIVE = '30m'
+OLLAMA_KEEPALIVE_INTERVAL = 600  # seconds
+OLLAMA_TIMEOUT = 300  # seconds between two bytes of the answer
+OLLAMA_DEADLINE = 600  # seconds
+OLLAMA_RETRIES = 3
+
+# Weekly summaries are generated by `manage.py run_summary_worker` from the
+# SummaryJob table; a job whose worker died is picked up again after its
+# lease, failures are retried with exponential backoff.
+SUMMARY_JOB_LEASE = 600  # seconds
+SUMMARY_JOB_MAX_ATTEMPTS = 3
+SUMMARY_JOB_RETRY_DELAY = 30  # seconds, doubled on each retry
+SUMMARY_JOB_POLL_INTERVAL = 1.0  # seconds
+SUMMARY_JOB_MAX_WAIT = 30  # seconds a status request may long-poll
+# Long histories are summarized in chunks of at most SUMMARY_CHUNK_TOKENS
+# (well inside the model's context), up to SUMMARY_MAP_CONCURRENCY at a time,
+# and the partial summaries are merged in a tree under the same budget.
+SUMMARY_CHUNK_TOKENS = 2000
+SUMMARY_MAP_CONCURRENCY = 4
+# `manage.py precompute_weekly_summaries` (nightly) builds every active
+# user's summary in a process pool, its LLM requests capped at
+# SUMMARY_PRECOMPUTE_RATE per second overall (0 = no limit); an interrupted
+# run resumes from its progress file in SUMMARY_PRECOMPUTE_DIR.
+SUMMARY_PRECOMPUTE_PROCESSES = 4
+SUMMARY_PRECOMPUTE_RATE = 2.0  # requests per second
+SUMMARY_PRECOMPUTE_DIR = BASE_DIR / 'var' / 'precompute'
+# `manage.py archive_interactions` (monthly) moves the InteractionHistory
+# rows of older months into compressed InteractionArchive blobs, a blob per
+# user and month of at most INTERACTION_ARCHIVE_BATCH rows; history reads
+# merge them back in, so the table only holds the recent months.
+INTERACTION_ARCHIVE_AFTER_MONTHS = 3  # besides the current one
+INTERACTION_ARCHIVE_BATCH = 5000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators